@@ -0,0 +1,12 @@
+from fastapi import APIRouter
+from fastapi.responses import Response
+
+from core.metrics import REGISTRY, CONTENT_TYPE_LATEST
+
+router = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Возвращает метрики сервиса в формате Prometheus"""
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE_LATEST)
@@ -1,13 +1,78 @@
-from fastapi import APIRouter, Query, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, Query, HTTPException, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
 import os
-from datetime import datetime
-from typing import Optional, List
+from datetime import date, datetime
+from typing import Dict, Optional, List
 
-from models.models import Group, DayOfWeek, Classroom, Teacher, Template
+from pydantic import BaseModel, Field
+
+from tortoise.queryset import QuerySet
+
+from core.config import settings
+from core.database import use_read_replica
+from core.http_cache import NEXT_AFTER_ID_HEADER, conditional_json
+from core.response_cache import REFERENCE_CACHE
+from core.preload import import_module
+from models.models import Group, DayOfWeek, Classroom, Teacher, Template, TemplateInventory, TemplateVersion
+from services.output_manager import OUTPUT_MANAGER
 from services.report_service import ReportService
+from services.zip_stream import ZIP_MEDIA_TYPE, content_disposition
+
+# Все эндпоинты модуля только читают данные и обслуживаются репликой
+router = APIRouter(dependencies=[Depends(use_read_replica)])
+
+
+def after_id_query():
+    return Query(None, ge=0, description="Вернуть записи с ID больше указанного (keyset-пагинация)")
+
+
+def limit_query(default: Optional[int] = None):
+    return Query(default, ge=1, le=settings.LIST_MAX_PAGE_SIZE, description="Размер страницы")
+
+
+def page_size(after_id: Optional[int], limit: Optional[int]) -> Optional[int]:
+    """
+    Возвращает размер страницы списка или None, если клиент не запрашивал пагинацию.
+
+    Без after_id и limit список отдается целиком, как до введения пагинации,
+    чтобы не обрезать ответ клиентам, которые не знают о курсоре.
+    """
+    if limit is None and after_id is not None:
+        return settings.LIST_PAGE_SIZE
+    return limit
+
+
+async def fetch_page(queryset: QuerySet, fields: List[str], after_id: Optional[int],
+                     limit: Optional[int]) -> List[dict]:
+    """
+    Возвращает страницу записей, упорядоченных по ID, с выборкой только нужных колонок
+
+    Args:
+        queryset: Исходный запрос
+        fields: Возвращаемые колонки
+        after_id: ID последней записи предыдущей страницы
+        limit: Размер страницы (None — все записи)
+
+    Returns:
+        Список словарей с колонками fields
+    """
+    if after_id is not None:
+        queryset = queryset.filter(id__gt=after_id)
+    queryset = queryset.order_by('id')
+    if limit is not None:
+        queryset = queryset.limit(limit)
+
+    return await queryset.values(*fields)
+
+
+def next_after_id(page: List[dict], limit: Optional[int]) -> Optional[int]:
+    """Возвращает курсор следующей страницы или None, если страница последняя"""
+    return page[-1]["id"] if limit is not None and len(page) == limit else None
+
 
-router = APIRouter()
+def cursor_headers(cursor: Optional[int]) -> Dict[str, str]:
+    """Возвращает заголовок с курсором следующей страницы (пустой для последней страницы)"""
+    return {NEXT_AFTER_ID_HEADER: str(cursor)} if cursor is not None else {}
 
 
 @router.get("/officesvc/report")
@@ -22,6 +87,7 @@ async def create_report(
         ticket_number: Optional[int] = Query(None, description="Номер билета (для экзаменационных билетов)"),
         day_of_week: Optional[str] = Query(None, description="День недели (для расписания)"),
         group_id_2: Optional[int] = Query(None, description="ID второй группы (для загруженности аудиторий)"),
+        strict: bool = Query(False, description="Вернуть 400, если не указаны обязательные параметры шаблона"),
         download: bool = Query(False, description="Скачать файл напрямую")
 ):
     """
@@ -71,11 +137,13 @@ async def create_report(
         start_date=parsed_start_date,
         ticket_number=ticket_number,
         day_of_week=day_of_week,
-        group_id_2=group_id_2
+        group_id_2=group_id_2,
+        strict=strict
     )
 
     # Если запрошено скачивание, возвращаем файл
     if download and os.path.exists(result["file_path"]):
+        OUTPUT_MANAGER.touch(os.path.basename(result["file_path"]))
         return FileResponse(
             path=result["file_path"],
             filename=os.path.basename(result["file_path"]),
@@ -85,127 +153,465 @@ async def create_report(
     # Иначе возвращаем информацию о файле
     return result
 
+@router.get("/officesvc/exam_tickets")
+async def create_exam_ticket_set(
+        template_id: int = Query(..., description="ID шаблона билета"),
+        discipline_id: int = Query(..., description="ID дисциплины"),
+        tickets: int = Query(30, ge=1, le=500, description="Количество билетов"),
+        questions_per_ticket: int = Query(3, ge=1, le=3, description="Количество вопросов в билете (в шаблоне 3 места)"),
+        seed: Optional[int] = Query(None, description="Начальное значение распределения вопросов (для воспроизводимости)"),
+        format: str = Query("docx", pattern="^(docx|zip)$", description="docx — один документ, zip — архив билетов"),
+        stream: bool = Query(False, description="Отдавать zip-архив потоком по мере генерации билетов (только format=zip)"),
+        download: bool = Query(False, description="Скачать файл напрямую")
+):
+    """
+    Генерирует полный набор экзаменационных билетов за один запрос.
+
+    Вопросы дисциплины равномерно распределяются по билетам без повторов внутри билета.
+    Пример: /officesvc/exam_tickets?template_id=9&discipline_id=1&tickets=30&seed=42
+    """
+    if stream:
+        if format != "zip":
+            raise HTTPException(status_code=400, detail="Потоковая выдача поддерживается только для format=zip")
+
+        filename, chunks = await ReportService.stream_exam_ticket_set(
+            template_id=template_id,
+            discipline_id=discipline_id,
+            tickets=tickets,
+            questions_per_ticket=questions_per_ticket,
+            seed=seed
+        )
+        return StreamingResponse(chunks, media_type=ZIP_MEDIA_TYPE,
+                                 headers={"Content-Disposition": content_disposition(filename)})
+
+    result = await ReportService.generate_exam_ticket_set(
+        template_id=template_id,
+        discipline_id=discipline_id,
+        tickets=tickets,
+        questions_per_ticket=questions_per_ticket,
+        seed=seed,
+        output_format=format
+    )
+
+    if download and os.path.exists(result["file_path"]):
+        OUTPUT_MANAGER.touch(os.path.basename(result["file_path"]))
+        return FileResponse(
+            path=result["file_path"],
+            filename=os.path.basename(result["file_path"]),
+            media_type="application/zip" if format == "zip" else "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+        )
+
+    return result
+
+class ReportParams(BaseModel):
+    """Параметры генерации одного документа (как у /officesvc/report)"""
+    group_id: Optional[int] = None
+    student_id: Optional[int] = None
+    teacher_id: Optional[int] = None
+    discipline_id: Optional[int] = None
+    classroom_id: Optional[int] = None
+    start_date: Optional[date] = None
+    ticket_number: Optional[int] = None
+    day_of_week: Optional[DayOfWeek] = None
+    group_id_2: Optional[int] = None
+
+    def to_params(self) -> dict:
+        """Преобразует параметры к виду, который ожидают обработчики шаблонов"""
+        params = self.model_dump()
+        if self.start_date:
+            params['start_date'] = datetime.combine(self.start_date, datetime.min.time())
+        if self.day_of_week:
+            params['day_of_week'] = self.day_of_week.value
+        return params
+
+
+class MergeRequest(BaseModel):
+    template_id: int = Field(..., description="ID DOCX-шаблона")
+    entries: List[ReportParams] = Field(..., min_length=1, max_length=settings.MERGE_MAX_ENTRIES,
+                                        description="Наборы параметров, по одному на раздел документа")
+    download: bool = Field(False, description="Скачать файл напрямую")
+
+
+class BatchItem(ReportParams):
+    template_id: int = Field(..., description="ID шаблона")
+
+
+class BatchRequest(BaseModel):
+    items: List[BatchItem] = Field(..., min_length=1, max_length=settings.BATCH_MAX_ITEMS,
+                                   description="Документы пакета")
+
+
+@router.post("/officesvc/merge")
+async def merge_documents(request: MergeRequest):
+    """
+    Заполняет DOCX-шаблон по каждому набору параметров и объединяет результаты
+    в один документ с разрывами разделов.
+
+    Пример тела запроса:
+    {"template_id": 14, "entries": [{"student_id": 1, "teacher_id": 1}, {"student_id": 2, "teacher_id": 1}]}
+    """
+    entries = [entry.to_params() for entry in request.entries]
+
+    result = await ReportService.merge_documents(request.template_id, entries)
+
+    if request.download and os.path.exists(result["file_path"]):
+        OUTPUT_MANAGER.touch(os.path.basename(result["file_path"]))
+        return FileResponse(
+            path=result["file_path"],
+            filename=os.path.basename(result["file_path"]),
+            media_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+        )
+
+    return result
+
+
+@router.post("/officesvc/batch")
+async def create_batch(request: BatchRequest):
+    """
+    Генерирует пакет документов и отдает zip-архив потоком: каждый документ
+    передается клиенту сразу после генерации, пока следующие еще рендерятся.
+
+    Пример тела запроса:
+    {"items": [{"template_id": 14, "student_id": 1}, {"template_id": 9, "group_id": 1, "discipline_id": 1}]}
+    """
+    chunks = await ReportService.stream_batch([item.to_params() for item in request.items])
+
+    return StreamingResponse(chunks, media_type=ZIP_MEDIA_TYPE,
+                             headers={"Content-Disposition": content_disposition("documents.zip")})
+
+
+@router.get("/officesvc/output/stats")
+async def output_stats():
+    """Возвращает статистику каталога сгенерированных файлов"""
+    return OUTPUT_MANAGER.stats()
+
+
 @router.get("/officesvc/templates", response_model=List[dict])
-async def list_templates():
+async def list_templates(request: Request):
     """Возвращает список доступных шаблонов"""
-    templates = await Template.all()
-    return [
-        {
-            "id": template.id,
+    async def produce():
+        return await Template.all().order_by('id').values("id", "name", "file_type", "description")
+
+    return await conditional_json(request, [Template._meta.db_table], produce, REFERENCE_CACHE)
+
+
+@router.get("/officesvc/templates/{template_id}/placeholders")
+async def template_placeholders(template_id: int, request: Request):
+    """
+    Возвращает плейсхолдеры шаблона и параметры, необходимые для генерации
+
+    Данные берутся из инвентаризации, сохраненной при импорте шаблонов.
+    """
+    async def produce():
+        template = await Template.get_or_none(id=template_id)
+        if template is None:
+            raise HTTPException(status_code=404, detail=f"Шаблон с ID {template_id} не найден")
+
+        try:
+            inventory_module = import_module("services.template_inventory")
+            inventory = await inventory_module.inventory_for(template, settings.TEMPLATE_DIR)
+        except Exception as e:
+            raise ReportService.http_error(e)
+
+        return {
+            "template_id": template.id,
             "name": template.name,
             "file_type": template.file_type,
-            "description": template.description
+            "template_type": inventory.template_type,
+            "required_params": inventory.required_params,
+            "optional_params": inventory.optional_params,
+            "highlighted": inventory.highlighted,
+            "keys": inventory.keys,
+            "codes": inventory.codes,
+            "markers": inventory.markers,
+            "content_hash": inventory.content_hash,
         }
-        for template in templates
-    ]
+
+    return await conditional_json(
+        request,
+        [Template._meta.db_table, TemplateInventory._meta.db_table],
+        produce,
+        REFERENCE_CACHE
+    )
+
+
+@router.get("/officesvc/templates/{template_id}/versions", response_model=List[dict])
+async def template_versions(template_id: int, request: Request):
+    """Возвращает версии шаблона (по хэшу содержимого), начиная с последней"""
+    async def produce():
+        if not await Template.exists(id=template_id):
+            raise HTTPException(status_code=404, detail=f"Шаблон с ID {template_id} не найден")
+
+        versions = await TemplateVersion.filter(template_id=template_id).order_by('-version').values(
+            "version", "content_hash", "created_at"
+        )
+        return [{**version, "created_at": version["created_at"].isoformat()} for version in versions]
+
+    return await conditional_json(request, [TemplateVersion._meta.db_table], produce, REFERENCE_CACHE)
 
 
 @router.get("/officesvc/teachers", response_model=List[dict])
-async def list_teachers():
-    """Возвращает список преподавателей"""
-    teachers = await Teacher.all()
-    return [
-        {
-            "id": teacher.id,
-            "full_name": teacher.full_name,
-            "email": teacher.email
-        }
-        for teacher in teachers
-    ]
+async def list_teachers(request: Request, after_id: Optional[int] = after_id_query(),
+                        limit: Optional[int] = limit_query()):
+    """Возвращает список преподавателей; курсор следующей страницы — в заголовке X-Next-After-Id"""
+    limit = page_size(after_id, limit)
+
+    async def produce():
+        return await fetch_page(Teacher.all(), ["id", "full_name", "email"], after_id, limit)
+
+    return await conditional_json(request, [Teacher._meta.db_table], produce,
+                                  headers=lambda teachers: cursor_headers(next_after_id(teachers, limit)))
 
 
 @router.get("/officesvc/classrooms", response_model=List[dict])
-async def list_classrooms():
-    """Возвращает список аудиторий"""
-    classrooms = await Classroom.all()
-    return [
-        {
-            "id": classroom.id,
-            "name": classroom.name,
-            "capacity": classroom.capacity
-        }
-        for classroom in classrooms
-    ]
+async def list_classrooms(request: Request, after_id: Optional[int] = after_id_query(),
+                          limit: Optional[int] = limit_query()):
+    """Возвращает список аудиторий; курсор следующей страницы — в заголовке X-Next-After-Id"""
+    limit = page_size(after_id, limit)
+
+    async def produce():
+        return await fetch_page(Classroom.all(), ["id", "name", "capacity"], after_id, limit)
+
+    return await conditional_json(request, [Classroom._meta.db_table], produce, REFERENCE_CACHE,
+                                  headers=lambda classrooms: cursor_headers(next_after_id(classrooms, limit)))
 
 
 @router.get("/officesvc/days", response_model=List[str])
-async def list_days():
+async def list_days(request: Request):
     """Возвращает список доступных дней недели"""
-    return [day.value for day in DayOfWeek]
+    async def produce():
+        return [day.value for day in DayOfWeek]
+
+    return await conditional_json(request, [], produce, REFERENCE_CACHE)
 
 
 @router.get("/officesvc/groups", response_model=List[dict])
-async def list_groups():
-    """Возвращает список доступных групп"""
-    groups = await Group.all()
-    return [
-        {
-            "id": group.id,
-            "code": group.code,
-            "course": group.course
-        }
-        for group in groups
-    ]
+async def list_groups(request: Request, after_id: Optional[int] = after_id_query(),
+                      limit: Optional[int] = limit_query()):
+    """Возвращает список доступных групп; курсор следующей страницы — в заголовке X-Next-After-Id"""
+    limit = page_size(after_id, limit)
+
+    async def produce():
+        return await fetch_page(Group.all(), ["id", "code", "course"], after_id, limit)
+
+    return await conditional_json(request, [Group._meta.db_table], produce, REFERENCE_CACHE,
+                                  headers=lambda groups: cursor_headers(next_after_id(groups, limit)))
 
 
 @router.get("/officesvc/students")
-async def list_students(group_id: Optional[int] = Query(None, description="ID группы для фильтрации")):
-    """Возвращает список студентов, опционально фильтруя по группе"""
+async def list_students(
+        response: Response,
+        group_id: Optional[int] = Query(None, description="ID группы для фильтрации"),
+        name_prefix: Optional[str] = Query(None, min_length=1, description="Начало ФИО студента"),
+        after_id: Optional[int] = after_id_query(),
+        limit: Optional[int] = limit_query()
+):
+    """Возвращает список студентов, опционально фильтруя по группе и началу ФИО"""
     from models.models import Student
 
+    limit = page_size(after_id, limit)
+
+    queryset = Student.all()
     if group_id:
-        students = await Student.filter(group_id=group_id)
-    else:
-        students = await Student.all()
+        queryset = queryset.filter(group_id=group_id)
+    if name_prefix:
+        queryset = queryset.filter(full_name__istartswith=name_prefix)
+
+    students = await fetch_page(queryset, ["id", "full_name", "email", "group_id"], after_id, limit)
+    cursor = next_after_id(students, limit)
+    response.headers.update(cursor_headers(cursor))
 
     return {
-        "students": [
-            {
-                "id": student.id,
-                "full_name": student.full_name,
-                "email": student.email,
-                "group_id": student.group_id
-            }
-            for student in students
-        ]
+        "students": students,
+        "next_after_id": cursor
     }
 
 
-@router.get("/officesvc/teachers")
-async def list_teachers():
-    """Возвращает список преподавателей"""
-    from models.models import Teacher
+@router.get("/officesvc/search")
+async def search(
+        request: Request,
+        q: str = Query(..., min_length=1, max_length=200, description="Строка поиска: ФИО, email или код группы"),
+        types: Optional[str] = Query(None, description="Типы записей через запятую: student, teacher, group"),
+        limit: int = Query(20, ge=1, le=100, description="Максимальное количество результатов")
+):
+    """
+    Ищет студентов, преподавателей и группы по началу слов (с нечетким поиском
+    по триграммам при опечатках) в индексе, хранящемся в памяти
 
-    teachers = await Teacher.all()
-    return {
-        "teachers": [
-            {
-                "id": teacher.id,
-                "full_name": teacher.full_name,
-                "email": teacher.email
-            }
-            for teacher in teachers
-        ]
-    }
+    Примеры запросов:
+    - /officesvc/search?q=иванов
+    - /officesvc/search?q=кмбо-05&types=group
+    """
+    from services.search_index import SEARCH_KINDS, SEARCH_SERVICE, SEARCH_TABLES
+
+    kinds = SEARCH_KINDS
+    if types:
+        kinds = tuple(kind.strip() for kind in types.split(",") if kind.strip())
+        unknown = set(kinds) - set(SEARCH_KINDS)
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Неизвестные типы записей: {', '.join(sorted(unknown))}. "
+                       f"Допустимые значения: {', '.join(SEARCH_KINDS)}"
+            )
+
+    async def produce():
+        return {"query": q, "results": await SEARCH_SERVICE.search(q, kinds, limit)}
+
+    # Пока индекс перестраивается, результаты берутся из прежнего индекса и не должны получить новый ETag
+    return await conditional_json(request, SEARCH_TABLES, produce, stale=SEARCH_SERVICE.is_stale)
+
+
+@router.get("/officesvc/fulltext")
+async def fulltext_search(
+        request: Request,
+        q: str = Query(..., min_length=1, max_length=500, description="Слова для поиска"),
+        types: Optional[str] = Query(None, description="Типы записей через запятую: exam_question, literature"),
+        discipline_id: Optional[int] = Query(None, description="ID дисциплины"),
+        offset: int = Query(0, ge=0, description="Количество пропускаемых результатов"),
+        limit: int = Query(20, ge=1, le=100, description="Размер страницы")
+):
+    """
+    Полнотекстовый поиск по вопросам к экзамену и литературе всех дисциплин
+    с ранжированием по релевантности
+
+    Примеры запросов:
+    - /officesvc/fulltext?q=сортировка массивов
+    - /officesvc/fulltext?q=Кнут&types=literature
+    """
+    from models.models import Discipline, ExamQuestion, Literature
+    from services.fulltext_search import FULLTEXT_KINDS, FullTextSearchService
+
+    kinds = FULLTEXT_KINDS
+    if types:
+        kinds = tuple(kind.strip() for kind in types.split(",") if kind.strip())
+        unknown = set(kinds) - set(FULLTEXT_KINDS)
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Неизвестные типы записей: {', '.join(sorted(unknown))}. "
+                       f"Допустимые значения: {', '.join(FULLTEXT_KINDS)}"
+            )
+
+    async def produce():
+        results = await FullTextSearchService().search(q, kinds, discipline_id, limit, offset)
+        return {
+            "query": q,
+            "results": results,
+            "next_offset": offset + limit if len(results) == limit else None
+        }
+
+    return await conditional_json(
+        request,
+        [model._meta.db_table for model in (ExamQuestion, Literature, Discipline)],
+        produce
+    )
 
 
 @router.get("/officesvc/disciplines")
-async def list_disciplines():
+async def list_disciplines(request: Request, after_id: Optional[int] = after_id_query(),
+                           limit: Optional[int] = limit_query()):
     """Возвращает список дисциплин"""
     from models.models import Discipline
 
-    disciplines = await Discipline.all()
-    return {
-        "disciplines": [
-            {
-                "id": discipline.id,
-                "name": discipline.name,
-                "education_level": discipline.education_level,
-                "department": discipline.department,
-                "hours_lecture": discipline.hours_lecture,
-                "hours_practice": discipline.hours_practice,
-                "hours_lab": discipline.hours_lab
-            }
-            for discipline in disciplines
-        ]
-    }
\ No newline at end of file
+    limit = page_size(after_id, limit)
+
+    async def produce():
+        disciplines = await fetch_page(
+            Discipline.all(),
+            ["id", "name", "education_level", "department", "hours_lecture", "hours_practice", "hours_lab"],
+            after_id,
+            limit
+        )
+
+        return {
+            "disciplines": disciplines,
+            "next_after_id": next_after_id(disciplines, limit)
+        }
+
+    return await conditional_json(request, [Discipline._meta.db_table], produce, REFERENCE_CACHE,
+                                  headers=lambda data: cursor_headers(data["next_after_id"]))
+
+
+@router.get("/officesvc/analytics/grades")
+async def grade_analytics(
+        request: Request,
+        group_id: Optional[int] = Query(None, description="ID группы"),
+        discipline_id: Optional[int] = Query(None, description="ID дисциплины"),
+        offset: int = Query(0, ge=0, description="Количество пропускаемых строк"),
+        limit: int = limit_query(settings.LIST_PAGE_SIZE)
+):
+    """
+    Возвращает итоги студентов по дисциплинам: сумму и средний балл, количество сданных
+    контрольных работ и место в группе. Вычисляется одним агрегирующим запросом к БД.
+
+    Примеры запросов:
+    - /officesvc/analytics/grades?group_id=1&discipline_id=1
+    - /officesvc/analytics/grades?discipline_id=1
+    """
+    from models.models import ControlWork, Discipline, Grade, Student
+    from services.analytics_service import GradeAnalyticsService
+
+    async def produce():
+        rows = await GradeAnalyticsService().grade_summary(group_id, discipline_id, limit, offset)
+        return {
+            "students": rows,
+            "next_offset": offset + limit if len(rows) == limit else None
+        }
+
+    return await conditional_json(
+        request,
+        [model._meta.db_table for model in (Grade, ControlWork, Student, Group, Discipline)],
+        produce
+    )
+
+
+def export_format_query():
+    return Query("csv", pattern="^(csv|ndjson)$", description="Формат выгрузки: csv или ndjson (строка JSON на запись)")
+
+
+@router.get("/officesvc/export/grades")
+async def export_grades(
+        group_id: Optional[int] = Query(None, description="ID группы"),
+        discipline_id: Optional[int] = Query(None, description="ID дисциплины"),
+        student_id: Optional[int] = Query(None, description="ID студента"),
+        format: str = export_format_query()
+):
+    """
+    Выгружает оценки потоком (строка на оценку) прямо из курсора БД: память не зависит
+    от объема, первые байты приходят сразу. Без фильтров выгружаются все оценки.
+
+    Примеры запросов:
+    - /officesvc/export/grades?group_id=1&discipline_id=1
+    - /officesvc/export/grades?format=ndjson
+    """
+    from services.export_service import EXPORT_MEDIA_TYPES, GRADE_COLUMNS, ExportService, encode_rows
+
+    rows = ExportService().grades(group_id, discipline_id, student_id)
+    return StreamingResponse(encode_rows(rows, GRADE_COLUMNS, format, "grades"),
+                             media_type=EXPORT_MEDIA_TYPES[format],
+                             headers={"Content-Disposition": content_disposition(f"grades.{format}")})
+
+
+@router.get("/officesvc/export/schedule")
+async def export_schedule(
+        group_id: Optional[int] = Query(None, description="ID группы"),
+        teacher_id: Optional[int] = Query(None, description="ID преподавателя"),
+        classroom_id: Optional[int] = Query(None, description="ID аудитории"),
+        day_of_week: Optional[DayOfWeek] = Query(None, description="День недели"),
+        format: str = export_format_query()
+):
+    """
+    Выгружает расписание потоком (строка на занятие) прямо из курсора БД.
+    Без фильтров выгружается все расписание.
+
+    Примеры запросов:
+    - /officesvc/export/schedule?teacher_id=1
+    - /officesvc/export/schedule?group_id=1&day_of_week=Понедельник&format=ndjson
+    """
+    from services.export_service import EXPORT_MEDIA_TYPES, SCHEDULE_COLUMNS, ExportService, encode_rows
+
+    rows = ExportService().schedule(group_id, teacher_id, classroom_id, day_of_week.value if day_of_week else None)
+    return StreamingResponse(encode_rows(rows, SCHEDULE_COLUMNS, format, "schedule"),
+                             media_type=EXPORT_MEDIA_TYPES[format],
+                             headers={"Content-Disposition": content_disposition(f"schedule.{format}")})
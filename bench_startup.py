@@ -0,0 +1,86 @@
+"""
+Замер времени холодного старта приложения.
+
+Каждый замер выполняется в отдельном процессе интерпретатора: измеряется
+время импорта main (создание приложения) и, с флагом --lifespan, время
+выполнения lifespan до начала обработки запросов (нужна доступная БД).
+
+Примеры:
+    python bench_startup.py
+    python bench_startup.py --modes off lazy --runs 10 --lifespan
+    python bench_startup.py --importtime off
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+MEASURE_SCRIPT = """
+import asyncio, json, sys, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+result = {"import": imported - started}
+if "--lifespan" in sys.argv:
+    async def run():
+        async with main.lifespan(main.app):
+            result["lifespan"] = time.perf_counter() - imported
+    asyncio.run(run())
+heavy = ("docx", "openpyxl", "lxml", "fastadmin")
+result["loaded"] = [name for name in heavy if name in sys.modules]
+print(json.dumps(result))
+"""
+
+
+def run_once(mode: str, lifespan: bool) -> dict:
+    env = dict(os.environ, ADMIN_MODE=mode, PRELOAD_DOCUMENT_LIBRARIES="false")
+    args = [sys.executable, "-c", MEASURE_SCRIPT] + (["--lifespan"] if lifespan else [])
+    output = subprocess.run(args, env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def print_importtime(mode: str, top: int) -> None:
+    """Выводит модули с наибольшим суммарным временем импорта (python -X importtime)"""
+    env = dict(os.environ, ADMIN_MODE=mode)
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                            env=env, capture_output=True, text=True, check=True).stderr
+
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative_us), int(self_us), name.strip()))
+
+    rows.sort(reverse=True)
+    print(f"ADMIN_MODE={mode}: {'cumulative, мс':>15} {'self, мс':>10}  модуль")
+    for cumulative_us, self_us, name in rows[:top]:
+        print(f"{'':>14} {cumulative_us / 1000:15.1f} {self_us / 1000:10.1f}  {name}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Замер времени старта сервиса")
+    parser.add_argument("--modes", nargs="+", default=["off", "lazy", "eager"], help="Режимы ADMIN_MODE")
+    parser.add_argument("--runs", type=int, default=5, help="Количество запусков на режим")
+    parser.add_argument("--lifespan", action="store_true", help="Замерять также lifespan (нужна БД)")
+    parser.add_argument("--importtime", metavar="MODE", help="Показать самые долгие импорты для режима")
+    parser.add_argument("--top", type=int, default=15, help="Количество модулей для --importtime")
+    args = parser.parse_args()
+
+    if args.importtime:
+        print_importtime(args.importtime, args.top)
+        return
+
+    for mode in args.modes:
+        results = [run_once(mode, args.lifespan) for _ in range(args.runs)]
+        line = f"ADMIN_MODE={mode:<6} import: медиана {statistics.median(r['import'] for r in results) * 1000:7.1f} мс"
+        if args.lifespan:
+            line += f", lifespan: медиана {statistics.median(r['lifespan'] for r in results) * 1000:7.1f} мс"
+        line += f", загружены: {', '.join(results[-1]['loaded']) or '-'}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Подключение административной панели.
+
+Режим задается настройкой ADMIN_MODE:
+- "eager" — fastadmin импортируется при старте приложения;
+- "lazy" — fastadmin импортируется при первом запросе к /admin;
+- "off" — админка не подключается (например, в воркерах, обслуживающих только отчеты).
+"""
+import asyncio
+import threading
+from typing import Optional
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from models.models import AdminUser
+
+ADMIN_MODES = ("eager", "lazy", "off")
+
+
+def load_admin_app() -> ASGIApp:
+    """Регистрирует модели в fastadmin и возвращает его ASGI-приложение"""
+    import models.admin  # noqa: F401 — регистрирует модели
+    from fastadmin import fastapi_app
+
+    return fastapi_app
+
+
+class LazyAdminApp:
+    """ASGI-приложение, загружающее fastadmin при первом обращении"""
+
+    def __init__(self):
+        self._app: Optional[ASGIApp] = None
+        self._lock = threading.Lock()
+
+    def _get_app(self) -> ASGIApp:
+        if self._app is None:
+            with self._lock:
+                if self._app is None:
+                    self._app = load_admin_app()
+        return self._app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await self._get_app()(scope, receive, send)
+
+
+def create_admin_app(mode: str) -> Optional[ASGIApp]:
+    """
+    Возвращает приложение админки для монтирования
+
+    Args:
+        mode: Режим подключения (eager, lazy, off)
+
+    Returns:
+        ASGI-приложение или None, если админка отключена
+
+    Raises:
+        ValueError: Если режим не поддерживается
+    """
+    if mode not in ADMIN_MODES:
+        raise ValueError(f"Неподдерживаемый режим админки: {mode}")
+
+    if mode == "off":
+        return None
+    if mode == "eager":
+        return load_admin_app()
+    return LazyAdminApp()
+
+
+async def ensure_admin_user() -> None:
+    """Создает администратора по умолчанию, если его нет"""
+    user = await AdminUser.get_or_none(username='admin')
+
+    if not user:
+        user = AdminUser(username='admin', is_superuser=True)
+        # Хэширование bcrypt занимает сотни миллисекунд — выполняется вне цикла событий
+        await asyncio.to_thread(user.set_password, 'adminpassword')
+        await user.save()
@@ -0,0 +1,161 @@
+"""
+Ограничение количества одновременных генераций документов (admission control).
+
+Генерация выполняется, только если занято меньше ADMISSION_MAX_CONCURRENT
+слотов. Остальные запросы ждут в очереди в порядке поступления; если очередь
+заполнена (ADMISSION_MAX_QUEUE) или ожидание превысило ADMISSION_QUEUE_TIMEOUT,
+запрос отклоняется, и клиент получает 503 с заголовком Retry-After. Так число
+разобранных в памяти документов ограничено, а при всплеске нагрузки задержка
+остальных запросов не растет бесконечно.
+"""
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque
+
+from core.config import settings
+from core.metrics import ADMISSION_ACTIVE, ADMISSION_QUEUE_DEPTH, ADMISSION_REJECTED, ADMISSION_WAIT_SECONDS
+
+
+class AdmissionRejected(Exception):
+    """Запрос не допущен к генерации: сервис перегружен"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"Сервис перегружен, повторите запрос через {retry_after} с")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Семафор с ограниченной очередью ожидания.
+
+    Освободившийся слот передается первому ожидающему напрямую, поэтому
+    новые запросы не обгоняют очередь.
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int, queue_timeout: float, retry_after: int):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self._active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_concurrent > 0
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for waiter in self._waiters if not waiter.done())
+
+    def _reject(self, reason: str) -> AdmissionRejected:
+        ADMISSION_REJECTED.inc(reason=reason)
+        return AdmissionRejected(reason, self.retry_after)
+
+    def check(self) -> None:
+        """
+        Проверяет, что очередь не заполнена (перед началом потоковой выдачи)
+
+        Raises:
+            AdmissionRejected: Если очередь заполнена
+        """
+        if self.enabled and self._active >= self.max_concurrent and self.queue_depth >= self.max_queue:
+            raise self._reject("queue_full")
+
+    async def acquire(self, bounded: bool = True) -> None:
+        """
+        Занимает слот генерации, при необходимости дожидаясь его в очереди
+
+        Args:
+            bounded: Учитывать ограничения очереди. Документы уже допущенной потоковой
+                выдачи ждут слот без ограничений, чтобы не обрывать архив
+
+        Raises:
+            AdmissionRejected: Если очередь заполнена или время ожидания истекло
+        """
+        if not self.enabled:
+            return
+
+        if self._active < self.max_concurrent and not self.queue_depth:
+            self._active += 1
+            return
+
+        if bounded and self.queue_depth >= self.max_queue:
+            raise self._reject("queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout if bounded else None)
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                # Слот передан в момент истечения времени ожидания
+                return
+            raise self._reject("timeout")
+        except asyncio.CancelledError:
+            # Слот мог быть передан одновременно с отменой ожидания — возвращаем его
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if waiter in self._waiters and waiter.done():
+                self._waiters.remove(waiter)
+            ADMISSION_WAIT_SECONDS.observe(time.perf_counter() - started)
+
+    def try_acquire(self, headroom: int = 0) -> bool:
+        """
+        Занимает слот без ожидания, только если сервис простаивает (фоновые задачи с низким приоритетом)
+
+        Args:
+            headroom: Сколько слотов должно остаться свободными для запросов пользователей
+
+        Returns:
+            True, если слот занят; False — есть ожидающие запросы или мало свободных слотов
+        """
+        if not self.enabled:
+            return True
+        if self.queue_depth or self._active + headroom >= self.max_concurrent:
+            return False
+        self._active += 1
+        return True
+
+    def release(self) -> None:
+        """Освобождает слот, передавая его первому ожидающему"""
+        if not self.enabled:
+            return
+
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # Слот переходит к ожидающему, счетчик занятых не меняется
+                waiter.set_result(None)
+                return
+        self._active -= 1
+
+    @asynccontextmanager
+    async def slot(self, bounded: bool = True):
+        """Выполняет блок, заняв слот генерации"""
+        await self.acquire(bounded)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+ADMISSION = AdmissionController(
+    settings.ADMISSION_MAX_CONCURRENT,
+    settings.ADMISSION_MAX_QUEUE,
+    settings.ADMISSION_QUEUE_TIMEOUT,
+    settings.ADMISSION_RETRY_AFTER
+)
+
+ADMISSION_ACTIVE.set_function(lambda: ADMISSION.active)
+ADMISSION_QUEUE_DEPTH.set_function(lambda: ADMISSION.queue_depth)
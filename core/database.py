@@ -1,14 +1,121 @@
+import contextvars
+from contextlib import contextmanager
+from typing import Iterable, Iterator
+
 from tortoise import Tortoise
+from tortoise.backends.base.config_generator import expand_db_url
 from core.config import settings
+from core.table_versions import changed_within
+
+POSTGRES_ENGINES = ("tortoise.backends.asyncpg", "tortoise.backends.psycopg")
+
+# Признак того, что запросы на чтение текущей задачи нужно направлять в соединение "replica"
+_read_replica_enabled: contextvars.ContextVar[bool] = contextvars.ContextVar("read_replica_enabled", default=False)
+
+
+def connection_config(db_url: str, min_size: int, max_size: int, read_only: bool = False) -> dict:
+    """
+    Формирует настройки подключения Tortoise с параметрами пула
+
+    Args:
+        db_url: URL базы данных
+        min_size: Минимальный размер пула
+        max_size: Максимальный размер пула
+        read_only: Открывать транзакции только на чтение
+
+    Returns:
+        Словарь настроек подключения
+    """
+    config = expand_db_url(db_url)
+
+    if config["engine"] in POSTGRES_ENGINES:
+        credentials = config["credentials"]
+        # Параметры, явно указанные в URL, имеют приоритет
+        credentials.setdefault("minsize", min_size)
+        credentials.setdefault("maxsize", max_size)
+        credentials.setdefault("max_inactive_connection_lifetime", settings.DB_MAX_INACTIVE_CONNECTION_LIFETIME)
+        credentials.setdefault("statement_cache_size", settings.DB_STATEMENT_CACHE_SIZE)
+        credentials.setdefault("max_cached_statement_lifetime", settings.DB_MAX_CACHED_STATEMENT_LIFETIME)
+
+        if read_only:
+            server_settings = dict(credentials.get("server_settings") or {})
+            server_settings.setdefault("default_transaction_read_only", "on")
+            credentials["server_settings"] = server_settings
+
+    return config
+
+
+class ReadReplicaRouter:
+    """
+    Направляет чтение в соединение "replica" для запросов, отмеченных
+    use_read_replica(), а запись всегда — в основное соединение
+    """
+
+    def db_for_read(self, model):
+        return "replica" if _read_replica_enabled.get() else "default"
+
+    def db_for_write(self, model):
+        return "default"
+
+
+async def use_read_replica() -> None:
+    """
+    Зависимость FastAPI: запросы на чтение в рамках HTTP-запроса
+    выполняются через соединение "replica"
+    """
+    _read_replica_enabled.set(True)
+
+
+@contextmanager
+def use_primary() -> Iterator[None]:
+    """Направляет запросы на чтение текущей задачи в основное соединение на время блока"""
+    token = _read_replica_enabled.set(False)
+    try:
+        yield
+    finally:
+        _read_replica_enabled.reset(token)
+
+
+def replica_may_lag(tables: Iterable[str]) -> bool:
+    """
+    Проверяет, может ли реплика еще не содержать последних изменений таблиц
+
+    Версия таблицы обновляется сразу после записи в основную базу, а реплика применяет
+    изменение с задержкой. Данные, прочитанные с реплики в этом окне, нельзя сохранять
+    под новой версией.
+
+    Args:
+        tables: Таблицы, от которых зависят данные
+
+    Returns:
+        True, если какая-либо таблица менялась в пределах REPLICA_LAG_WINDOW
+    """
+    if not settings.DATABASE_READ_URL or not settings.REPLICA_LAG_WINDOW:
+        return False
+    return changed_within(tables, settings.REPLICA_LAG_WINDOW)
+
 
 TORTOISE_ORM = {
-    "connections": {"default": settings.DATABASE_URL},
+    "connections": {
+        "default": connection_config(
+            settings.DATABASE_URL,
+            settings.DB_POOL_MIN_SIZE,
+            settings.DB_POOL_MAX_SIZE,
+        ),
+        "replica": connection_config(
+            settings.DATABASE_READ_URL or settings.DATABASE_URL,
+            settings.DB_READ_POOL_MIN_SIZE,
+            settings.DB_READ_POOL_MAX_SIZE,
+            read_only=True,
+        ),
+    },
     "apps": {
         "models": {
             "models": ["models.models", "aerich.models"],
             "default_connection": "default",
         },
     },
+    "routers": ["core.database.ReadReplicaRouter"],
     "use_tz": False,
 }
 
@@ -25,4 +132,3 @@ async def init_db():
 async def close_db():
     """Закрытие соединения с базой данных"""
     await Tortoise.close_connections()
-    
\ No newline at end of file
@@ -0,0 +1,55 @@
+"""
+Пул потоков для блокирующих операций рендеринга (чтение и сохранение документов)
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable
+
+from core.config import settings
+from core.metrics import EXECUTOR_QUEUE_DEPTH
+
+_executor = ThreadPoolExecutor(max_workers=settings.RENDER_WORKERS, thread_name_prefix="render")
+_pending_lock = threading.Lock()
+_pending = 0
+
+
+def queue_depth() -> int:
+    """Возвращает количество задач, еще не взятых в работу потоками пула"""
+    return _pending
+
+
+def _run_task(func: Callable[[], Any]) -> Any:
+    global _pending
+    with _pending_lock:
+        _pending -= 1
+    return func()
+
+
+async def run_blocking(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """
+    Выполняет блокирующую функцию в пуле рендеринга, не блокируя цикл событий
+
+    Args:
+        func: Вызываемая функция
+        *args: Позиционные аргументы функции
+        **kwargs: Именованные аргументы функции
+
+    Returns:
+        Результат функции
+    """
+    global _pending
+    with _pending_lock:
+        _pending += 1
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, _run_task, partial(func, *args, **kwargs))
+
+
+def shutdown() -> None:
+    """Останавливает пул потоков"""
+    _executor.shutdown(wait=False, cancel_futures=True)
+
+
+EXECUTOR_QUEUE_DEPTH.set_function(queue_depth)
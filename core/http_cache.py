@@ -0,0 +1,161 @@
+"""
+Условные GET-запросы: ETag и ответы 304 Not Modified
+"""
+import hashlib
+import json
+import os
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+
+from core.database import replica_may_lag, use_primary
+from core.response_cache import ResponseCache
+from core.table_versions import versions_token
+
+CACHE_CONTROL = "no-cache"
+
+# Курсор следующей страницы списочных эндпоинтов
+NEXT_AFTER_ID_HEADER = "X-Next-After-Id"
+
+
+def make_etag(*parts: Any) -> str:
+    """Формирует сильный ETag из частей ключа"""
+    digest = hashlib.sha1("\x1f".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    Проверяет заголовок If-None-Match (слабое сравнение по RFC 7232)
+
+    Args:
+        if_none_match: Значение заголовка If-None-Match
+        etag: Текущий ETag ресурса
+
+    Returns:
+        True, если клиент уже имеет актуальную версию
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+
+def request_key(request: Request) -> Tuple[str, Tuple[Tuple[str, str], ...]]:
+    """Нормализованный ключ запроса: путь и отсортированные параметры"""
+    return request.url.path, tuple(sorted(request.query_params.multi_items()))
+
+
+def encode_json(data: Any) -> bytes:
+    return json.dumps(jsonable_encoder(data), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+async def conditional_json(request: Request, tables: Iterable[str],
+                           producer: Callable[[], Awaitable[Any]],
+                           cache: Optional[ResponseCache] = None,
+                           headers: Optional[Callable[[Any], Dict[str, str]]] = None,
+                           stale: Optional[Callable[[], bool]] = None) -> Response:
+    """
+    Возвращает JSON-ответ с ETag, вычисленным по версиям таблиц.
+
+    Если If-None-Match совпадает с текущим ETag, возвращается 304
+    без обращения к базе данных. Если передан кэш, готовое тело ответа
+    берется из него и сохраняется в него после сериализации.
+
+    В течение REPLICA_LAG_WINDOW после изменения таблиц реплика может еще
+    отдавать старые данные: ответ читается из основного соединения, не
+    кэшируется и отдается без ETag, чтобы старое тело не закрепилось под
+    новой версией (запросы SQL, явно выполняемые через "replica", в это окно
+    могут вернуть старые данные).
+
+    Args:
+        request: HTTP-запрос
+        tables: Таблицы, от которых зависит ответ
+        producer: Корутина, формирующая данные ответа
+        cache: Кэш ответов (опционально)
+        headers: Функция, возвращающая дополнительные заголовки ответа по его данным
+            (опционально; заголовки кэшируются вместе с телом)
+        stale: Функция, возвращающая True, если producer сейчас отдаст данные старше
+            текущих версий таблиц (опционально; такой ответ отдается без ETag и не кэшируется)
+
+    Returns:
+        Ответ 200 с телом или 304
+    """
+    tables = tuple(tables)
+    key = request_key(request)
+
+    # Версии читаются до запроса к БД: при параллельной записи ETag окажется
+    # устаревшим, и клиент просто получит полный ответ при следующем запросе
+    versions = versions_token(*tables)
+    etag = make_etag(*key, versions)
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag)
+
+    if (stale and stale()) or replica_may_lag(tables):
+        with use_primary():
+            data = await producer()
+        return Response(content=encode_json(data), media_type="application/json",
+                        headers={**(headers(data) if headers else {}), "Cache-Control": "no-store"})
+
+    cached = cache.get(key, versions) if cache else None
+    if cached is not None:
+        body, extra_headers = cached.body, cached.headers
+    else:
+        data = await producer()
+        body = encode_json(data)
+        extra_headers = headers(data) if headers else {}
+        if cache:
+            cache.put(key, body, tables, versions, extra_headers)
+
+    return Response(content=body, media_type="application/json",
+                    headers={**extra_headers, "ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+
+class OutputStaticFiles(StaticFiles):
+    """
+    Раздача сгенерированных файлов с ETag по версии файла.
+
+    ETag строится по inode, mtime и размеру из уже полученного stat: файл не читается,
+    а любая перезапись (в т.ч. атомарная заменой) меняет хотя бы одно из значений.
+    Функция on_access (опционально) вызывается с именем файла при каждой отдаче.
+    """
+
+    def __init__(self, *args, on_access: Optional[Callable[[str], None]] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.on_access = on_access
+
+    @staticmethod
+    def _file_etag(stat_result: os.stat_result) -> str:
+        return f'"{stat_result.st_ino:x}-{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200) -> Response:
+        if self.on_access:
+            self.on_access(os.path.basename(full_path))
+
+        etag = self._file_etag(stat_result)
+        response = FileResponse(full_path, status_code=status_code, stat_result=stat_result,
+                                headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+        # If-None-Match имеет приоритет над If-Modified-Since
+        request_headers = Headers(scope=scope)
+        if "if-none-match" in request_headers:
+            if etag_matches(request_headers["if-none-match"], etag):
+                return not_modified(etag)
+            return response
+
+        if self.is_not_modified(response.headers, request_headers):
+            return not_modified(etag)
+        return response
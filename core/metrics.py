@@ -0,0 +1,472 @@
+"""
+Реестр метрик в формате Prometheus без внешних зависимостей.
+
+В многопроцессном режиме (несколько воркеров uvicorn) каждый процесс
+периодически сбрасывает снимок своих метрик в общий каталог, а эндпоинт
+/metrics объединяет снимки всех процессов.
+"""
+import asyncio
+import contextvars
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from core.config import settings
+
+CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, math.inf)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    return repr(float(value))
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    parts = []
+    for name, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{name}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+class _Metric:
+    """Базовый класс метрики с набором меток"""
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 registry: Optional["MetricsRegistry"] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], Any] = {}
+        (registry or REGISTRY).register(self)
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Метрика {self.name} ожидает метки {self.labelnames}, получено {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def state(self) -> Dict[str, Any]:
+        """Возвращает сериализуемое состояние метрики для снимка"""
+        with self._lock:
+            return {json.dumps(key, ensure_ascii=False): value for key, value in self._values.items()}
+
+
+class Counter(_Metric):
+    """Монотонно возрастающий счетчик"""
+
+    type_name = "counter"
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    """
+    Текущее значение величины.
+
+    multiprocess_mode определяет объединение значений процессов:
+    "sum" — сумма по живым процессам, "max" — максимум по живым процессам.
+    """
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 registry: Optional["MetricsRegistry"] = None, multiprocess_mode: str = "sum"):
+        super().__init__(name, documentation, labelnames, registry)
+        if multiprocess_mode not in ("sum", "max"):
+            raise ValueError(f"Неподдерживаемый режим объединения: {multiprocess_mode}")
+        self.multiprocess_mode = multiprocess_mode
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """Значение метрики без меток будет вычисляться при каждом сборе"""
+        self._function = function
+
+    @contextmanager
+    def track_inprogress(self, **labels):
+        """Увеличивает значение на время выполнения блока"""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def state(self) -> Dict[str, Any]:
+        if self._function is not None:
+            try:
+                self.set(self._function())
+            except Exception:
+                pass
+        return super().state()
+
+
+class Histogram(_Metric):
+    """Распределение наблюдаемых значений по корзинам"""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 registry: Optional["MetricsRegistry"] = None, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        buckets = sorted(float(b) for b in buckets)
+        if not buckets or buckets[-1] != math.inf:
+            buckets.append(math.inf)
+        self.buckets = tuple(buckets)
+        super().__init__(name, documentation, labelnames, registry)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Счетчики корзин (не накопительные), затем сумма и количество
+                state = [0.0] * len(self.buckets) + [0.0, 0.0]
+                self._values[key] = state
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Замеряет длительность выполнения блока"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def state(self) -> Dict[str, Any]:
+        with self._lock:
+            return {json.dumps(key, ensure_ascii=False): list(value) for key, value in self._values.items()}
+
+
+class MetricsRegistry:
+    """
+    Реестр метрик процесса.
+
+    Если задан multiprocess_dir, снимки состояния всех процессов сохраняются
+    в этот каталог и объединяются при формировании ответа.
+    """
+
+    def __init__(self, multiprocess_dir: Optional[str] = None):
+        self._metrics: Dict[str, _Metric] = {}
+        self.multiprocess_dir = multiprocess_dir or None
+
+    def register(self, metric: _Metric) -> None:
+        if metric.name in self._metrics:
+            raise ValueError(f"Метрика {metric.name} уже зарегистрирована")
+        self._metrics[metric.name] = metric
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Возвращает состояние всех метрик текущего процесса"""
+        return {name: metric.state() for name, metric in self._metrics.items()}
+
+    def _snapshot_path(self, pid: int) -> str:
+        return os.path.join(self.multiprocess_dir, f"metrics_{pid}.json")
+
+    def write_snapshot(self) -> None:
+        """Атомарно сохраняет снимок метрик текущего процесса в общий каталог"""
+        if not self.multiprocess_dir:
+            return
+
+        os.makedirs(self.multiprocess_dir, exist_ok=True)
+        path = self._snapshot_path(os.getpid())
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def _read_snapshots(self) -> List[Tuple[bool, Dict[str, Dict[str, Any]]]]:
+        """Возвращает пары (процесс жив, снимок) для всех процессов"""
+        own_pid = os.getpid()
+        snapshots = [(True, self.snapshot())]
+
+        if not self.multiprocess_dir or not os.path.isdir(self.multiprocess_dir):
+            return snapshots
+
+        for entry in os.scandir(self.multiprocess_dir):
+            if not (entry.name.startswith("metrics_") and entry.name.endswith(".json")):
+                continue
+            try:
+                pid = int(entry.name[len("metrics_"):-len(".json")])
+            except ValueError:
+                continue
+            if pid == own_pid:
+                continue
+            try:
+                with open(entry.path, encoding="utf-8") as f:
+                    snapshots.append((_pid_alive(pid), json.load(f)))
+            except (OSError, ValueError):
+                continue
+
+        return snapshots
+
+    def collect(self) -> Dict[str, Dict[Tuple[str, ...], Any]]:
+        """Объединяет значения метрик всех процессов"""
+        merged: Dict[str, Dict[Tuple[str, ...], Any]] = {name: {} for name in self._metrics}
+
+        for alive, snapshot in self._read_snapshots():
+            for name, values in snapshot.items():
+                metric = self._metrics.get(name)
+                if metric is None:
+                    continue
+                # Текущие значения завершившихся процессов больше не актуальны
+                if isinstance(metric, Gauge) and not alive:
+                    continue
+
+                target = merged[name]
+                for raw_key, value in values.items():
+                    key = tuple(json.loads(raw_key))
+                    if key not in target:
+                        target[key] = list(value) if isinstance(value, list) else value
+                    elif isinstance(metric, Histogram):
+                        target[key] = [a + b for a, b in zip(target[key], value)]
+                    elif isinstance(metric, Gauge) and metric.multiprocess_mode == "max":
+                        target[key] = max(target[key], value)
+                    else:
+                        target[key] += value
+
+        return merged
+
+    def render(self) -> str:
+        """Формирует ответ в текстовом формате экспозиции Prometheus"""
+        merged = self.collect()
+        lines = []
+
+        for name, metric in self._metrics.items():
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.type_name}")
+
+            for key, value in sorted(merged[name].items()):
+                labels = dict(zip(metric.labelnames, key))
+
+                if isinstance(metric, Histogram):
+                    cumulative = 0.0
+                    for bound, count in zip(metric.buckets, value):
+                        cumulative += count
+                        bucket_labels = {**labels, "le": _format_value(bound)}
+                        lines.append(f"{name}_bucket{_format_labels(bucket_labels)} {_format_value(cumulative)}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(value[-2])}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {_format_value(value[-1])}")
+                else:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+REGISTRY = MetricsRegistry(settings.METRICS_MULTIPROCESS_DIR)
+
+
+async def run_snapshot_writer(interval: float) -> None:
+    """Фоновая задача, периодически сбрасывающая снимок метрик процесса"""
+    while True:
+        try:
+            await asyncio.to_thread(REGISTRY.write_snapshot)
+        except OSError:
+            pass
+        await asyncio.sleep(interval)
+
+
+# Метрики сервиса
+
+REPORT_GENERATION_SECONDS = Histogram(
+    "report_generation_seconds",
+    "Время генерации документа по шаблону, секунды",
+    ("template_type",),
+)
+
+REPORT_GENERATIONS_IN_PROGRESS = Gauge(
+    "report_generations_in_progress",
+    "Количество документов, генерируемых в данный момент",
+)
+
+REPORT_REQUESTS_COALESCED = Counter(
+    "report_requests_coalesced_total",
+    "Запросы отчета, дождавшиеся уже выполняющейся генерации с теми же параметрами",
+)
+
+CACHE_REQUESTS = Counter(
+    "cache_requests_total",
+    "Обращения к кэшам сервиса по результату (hit/miss)",
+    ("cache", "result"),
+)
+
+DB_QUERIES = Counter(
+    "db_queries_total",
+    "Количество выполненных запросов к базе данных",
+)
+
+DB_QUERIES_PER_REQUEST = Histogram(
+    "db_queries_per_request",
+    "Количество запросов к базе данных на один HTTP-запрос",
+    ("route",),
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500, math.inf),
+)
+
+EXECUTOR_QUEUE_DEPTH = Gauge(
+    "render_executor_queue_depth",
+    "Количество задач, ожидающих свободного потока в пуле рендеринга",
+)
+
+ADMISSION_ACTIVE = Gauge(
+    "admission_active",
+    "Количество занятых слотов генерации",
+)
+
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "admission_queue_depth",
+    "Количество запросов, ожидающих слот генерации",
+)
+
+ADMISSION_REJECTED = Counter(
+    "admission_rejected_total",
+    "Запросы, отклоненные с кодом 503 из-за перегрузки (queue_full — очередь заполнена, timeout — истекло ожидание)",
+    ("reason",),
+)
+
+ADMISSION_WAIT_SECONDS = Histogram(
+    "admission_wait_seconds",
+    "Время ожидания слота генерации в очереди, секунды",
+)
+
+JOURNAL_PATCHES = Counter(
+    "journal_patches_total",
+    "Точечные обновления сохраненных журналов оценок (patched, unchanged, invalidated, failed)",
+    ("result",),
+)
+
+PREWARM_REPORTS = Counter(
+    "prewarm_reports_total",
+    "Отчеты фонового прогрева (generated, failed, deferred — проход отложен из-за нагрузки)",
+    ("result",),
+)
+
+EXPORT_ROWS = Counter(
+    "export_rows_total",
+    "Строки, отданные потоковой выгрузкой CSV/NDJSON (grades, schedule)",
+    ("export",),
+)
+
+OUTPUT_DIR_BYTES = Gauge(
+    "output_dir_bytes",
+    "Суммарный размер сгенерированных файлов в OUTPUT_DIR, байты",
+    multiprocess_mode="max",
+)
+
+
+# Подсчет запросов к базе данных в рамках HTTP-запроса
+
+class _QueryCounter:
+    __slots__ = ("count",)
+
+    def __init__(self):
+        self.count = 0
+
+
+_current_query_counter: contextvars.ContextVar[Optional[_QueryCounter]] = contextvars.ContextVar(
+    "current_query_counter", default=None
+)
+
+_DB_CLIENT_METHODS = ("execute_query", "execute_query_dict", "execute_insert", "execute_many", "execute_script")
+
+
+def _count_query() -> None:
+    DB_QUERIES.inc()
+    counter = _current_query_counter.get()
+    if counter is not None:
+        counter.count += 1
+
+
+def instrument_db_client(client: Any) -> None:
+    """
+    Оборачивает методы выполнения запросов класса клиента Tortoise,
+    чтобы считать запросы к базе данных
+
+    Args:
+        client: Подключение Tortoise (BaseDBAsyncClient)
+    """
+    client_class = type(client)
+    if getattr(client_class, "_metrics_instrumented", False):
+        return
+
+    for method_name in _DB_CLIENT_METHODS:
+        method = getattr(client_class, method_name, None)
+        if method is None:
+            continue
+
+        def make_wrapper(original):
+            async def wrapper(self, *args, **kwargs):
+                _count_query()
+                return await original(self, *args, **kwargs)
+
+            wrapper.__name__ = original.__name__
+            wrapper.__doc__ = original.__doc__
+            return wrapper
+
+        setattr(client_class, method_name, make_wrapper(method))
+
+    client_class._metrics_instrumented = True
+
+
+class MetricsMiddleware:
+    """ASGI middleware, учитывающий количество запросов к БД на HTTP-запрос"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        counter = _QueryCounter()
+        token = _current_query_counter.set(counter)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current_query_counter.reset(token)
+            route = scope.get("route")
+            DB_QUERIES_PER_REQUEST.observe(counter.count, route=getattr(route, "path", "unmatched"))
@@ -0,0 +1,64 @@
+"""
+Фоновая загрузка тяжелых модулей.
+
+python-docx, openpyxl и lxml нужны только для генерации документов, поэтому
+при старте они не импортируются, а загружаются в отдельном потоке уже после
+того, как приложение начало принимать запросы.
+
+Пакеты с циклическими импортами (python-docx) нельзя импортировать
+одновременно из двух потоков, поэтому код, обрабатывающий запросы, должен
+загружать эти модули через import_module, а не инструкцией import.
+"""
+import importlib
+import threading
+import time
+from types import ModuleType
+from typing import Dict, Iterable
+
+PRELOAD_MODULES = (
+    "lxml.etree",
+    "docx",
+    "openpyxl",
+    "services.docx_service",
+    "services.xlsx_service",
+)
+
+# Время импорта каждого модуля при последней предзагрузке, секунды
+PRELOAD_TIMINGS: Dict[str, float] = {}
+
+_import_lock = threading.RLock()
+
+
+def import_module(name: str) -> ModuleType:
+    """
+    Импортирует модуль, не пересекаясь с фоновой предзагрузкой
+
+    Args:
+        name: Имя модуля
+
+    Returns:
+        Загруженный модуль
+    """
+    with _import_lock:
+        return importlib.import_module(name)
+
+
+def preload_modules(modules: Iterable[str] = PRELOAD_MODULES) -> Dict[str, float]:
+    """
+    Импортирует модули и замеряет время их загрузки
+
+    Args:
+        modules: Имена модулей
+
+    Returns:
+        Словарь {имя модуля: время импорта в секундах}
+    """
+    for name in modules:
+        started = time.perf_counter()
+        try:
+            import_module(name)
+        except ImportError:
+            continue
+        PRELOAD_TIMINGS[name] = time.perf_counter() - started
+
+    return dict(PRELOAD_TIMINGS)
@@ -0,0 +1,90 @@
+"""
+Кэш готовых HTTP-ответов для справочных эндпоинтов.
+
+Ответ сериализуется один раз и хранится в виде байтов. Запись становится
+недействительной по истечении TTL, при изменении версии любой из таблиц,
+от которых она зависит (в том числе в другом воркере), и сразу при записи
+модели в текущем процессе.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterable, Optional, Tuple
+
+from core.config import settings
+from core.metrics import CACHE_REQUESTS
+from core.table_versions import TRACKED_MODELS, subscribe
+
+
+class CachedResponse:
+    """Запись кэша: тело ответа, дополнительные заголовки и условия актуальности"""
+
+    __slots__ = ("body", "headers", "tables", "versions", "expires_at")
+
+    def __init__(self, body: bytes, headers: Dict[str, str], tables: Tuple[str, ...], versions: str,
+                 expires_at: float):
+        self.body = body
+        self.headers = headers
+        self.tables = tables
+        self.versions = versions
+        self.expires_at = expires_at
+
+
+class ResponseCache:
+    """LRU-кэш ответов с TTL и инвалидацией по версиям таблиц"""
+
+    def __init__(self, name: str, ttl: float, max_entries: int):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, CachedResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, versions: str) -> Optional[CachedResponse]:
+        """
+        Возвращает запись, если она актуальна
+
+        Args:
+            key: Ключ запроса
+            versions: Текущие версии таблиц, от которых зависит ответ
+
+        Returns:
+            Запись с телом и заголовками ответа или None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry.versions != versions or entry.expires_at <= time.monotonic()):
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+
+        CACHE_REQUESTS.inc(cache=self.name, result="hit" if entry is not None else "miss")
+        return entry
+
+    def put(self, key: Hashable, body: bytes, tables: Iterable[str], versions: str,
+            headers: Optional[Dict[str, str]] = None) -> None:
+        """Сохраняет тело ответа и его дополнительные заголовки"""
+        entry = CachedResponse(body, headers or {}, tuple(tables), versions, time.monotonic() + self.ttl)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, table: str) -> None:
+        """Удаляет записи, зависящие от таблицы"""
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if table in entry.tables]
+            for key in stale:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+REFERENCE_CACHE = ResponseCache("reference", settings.REFERENCE_CACHE_TTL, settings.REFERENCE_CACHE_MAX_ENTRIES)
+
+for _model in TRACKED_MODELS:
+    subscribe(_model._meta.db_table, REFERENCE_CACHE.invalidate)
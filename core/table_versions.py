@@ -0,0 +1,147 @@
+"""
+Счетчики версий таблиц, общие для всех воркеров.
+
+Версия таблицы — это файл в каталоге RUNTIME_DIR/table_versions, который
+атомарно перезаписывается при каждом сохранении или удалении записи через ORM.
+Чтение версии — один вызов stat, без обращения к базе данных, поэтому версии
+можно использовать для ETag и проверки актуальности кэшей.
+
+Массовые операции (QuerySet.update, QuerySet.delete, bulk_create), каскадное
+удаление на стороне СУБД и изменения в обход ORM сигналов не вызывают — после
+них нужно вызвать bump() или bump_dependents() вручную.
+"""
+import os
+import time
+import uuid
+from typing import Callable, Dict, Iterable, List, Set, Type
+
+from tortoise.models import Model
+from tortoise.signals import post_delete, post_save
+
+from core.config import settings
+from models.models import (
+    Teacher, Group, Student, Discipline, ControlWork, Grade,
+    Literature, ExamQuestion, Publication, Template, TemplateInventory, TemplateVersion, TimeSlot,
+    Classroom, ScheduleItem
+)
+
+VERSIONS_DIR = os.path.join(settings.RUNTIME_DIR, "table_versions")
+
+TRACKED_MODELS = (
+    Teacher, Group, Student, Discipline, ControlWork, Grade,
+    Literature, ExamQuestion, Publication, Template, TemplateInventory, TemplateVersion, TimeSlot,
+    Classroom, ScheduleItem
+)
+
+_listeners: Dict[str, List[Callable[[str], None]]] = {}
+
+
+def _version_path(table: str) -> str:
+    return os.path.join(VERSIONS_DIR, table)
+
+
+def get_version(table: str) -> str:
+    """
+    Возвращает текущую версию таблицы
+
+    Args:
+        table: Имя таблицы
+
+    Returns:
+        Непрозрачная строка, меняющаяся при каждом изменении таблицы
+    """
+    try:
+        stat_result = os.stat(_version_path(table))
+    except FileNotFoundError:
+        return "0"
+    return f"{stat_result.st_ino:x}.{stat_result.st_mtime_ns:x}"
+
+
+def changed_within(tables: Iterable[str], seconds: float) -> bool:
+    """
+    Проверяет, менялась ли какая-либо из таблиц за последние seconds секунд
+
+    Args:
+        tables: Имена таблиц
+        seconds: Длина окна, секунды
+
+    Returns:
+        True, если версия таблицы обновлена в пределах окна
+    """
+    threshold = time.time() - seconds
+    for table in tables:
+        try:
+            if os.stat(_version_path(table)).st_mtime > threshold:
+                return True
+        except FileNotFoundError:
+            continue
+    return False
+
+
+def versions_token(*tables: str) -> str:
+    """Возвращает общую версию набора таблиц"""
+    return ",".join(f"{table}:{get_version(table)}" for table in tables)
+
+
+def bump(table: str) -> None:
+    """
+    Отмечает изменение таблицы и уведомляет подписчиков текущего процесса
+
+    Args:
+        table: Имя таблицы
+    """
+    os.makedirs(VERSIONS_DIR, exist_ok=True)
+    path = _version_path(table)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(uuid.uuid4().hex)
+    os.replace(tmp_path, path)
+
+    for callback in list(_listeners.get(table, ())):
+        callback(table)
+
+
+def bump_dependents(model: Type[Model]) -> None:
+    """
+    Отмечает изменение таблиц, ссылающихся на модель внешними ключами (рекурсивно)
+
+    Вызывается после удаления записей модели: зависимые записи удаляются
+    или обнуляются каскадно на стороне СУБД без сигналов ORM.
+
+    Args:
+        model: Модель, записи которой удалены
+    """
+    seen: Set[Type[Model]] = {model}
+    pending = [model]
+    while pending:
+        current = pending.pop()
+        for name in current._meta.backward_fk_fields | current._meta.backward_o2o_fields:
+            related = current._meta.fields_map[name].related_model
+            if related not in seen:
+                seen.add(related)
+                pending.append(related)
+                bump(related._meta.db_table)
+
+
+def subscribe(table: str, callback: Callable[[str], None]) -> None:
+    """
+    Регистрирует обработчик изменений таблицы в текущем процессе.
+
+    Изменения, сделанные другими воркерами, обработчик не получает —
+    их нужно обнаруживать сравнением версий.
+
+    Args:
+        table: Имя таблицы
+        callback: Функция, принимающая имя таблицы
+    """
+    _listeners.setdefault(table, []).append(callback)
+
+
+@post_save(*TRACKED_MODELS)
+async def _on_model_saved(sender, instance, created, using_db, update_fields) -> None:
+    bump(sender._meta.db_table)
+
+
+@post_delete(*TRACKED_MODELS)
+async def _on_model_deleted(sender, instance, using_db) -> None:
+    bump(sender._meta.db_table)
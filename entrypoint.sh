@@ -14,5 +14,11 @@ echo "PostgreSQL started"
 echo "Initializing database..."
 python init_db.py
 
+if [ -n "$METRICS_MULTIPROCESS_DIR" ]; then
+  echo "Cleaning metrics directory..."
+  rm -rf "$METRICS_MULTIPROCESS_DIR"
+  mkdir -p "$METRICS_MULTIPROCESS_DIR"
+fi
+
 echo "Starting application..."
 exec uvicorn main:app --host 0.0.0.0 --port 8000
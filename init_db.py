@@ -9,6 +9,10 @@ from models.models import (
 )
 
 from core.config import settings
+from services.fulltext_search import ensure_schema as ensure_fulltext_schema
+from services.template_inventory import refresh_inventory
+from services.template_versions import record_version
+from core import table_versions  # noqa: F401 — изменения при импорте обновляют версии таблиц
 
 
 async def init():
@@ -17,6 +21,7 @@ async def init():
         modules={"models": ["models.models"]},
     )
     await Tortoise.generate_schemas()
+    await ensure_fulltext_schema()
 
     if await Teacher.exists():
         print("База данных уже содержит данные. Проверяем наличие шаблонов...")
@@ -298,6 +303,19 @@ async def import_templates():
 
     print(f"Импортировано {added_count} шаблонов из директории {settings.TEMPLATE_DIR}")
 
+    # Версии шаблонов и инвентаризация плейсхолдеров: повторно анализируются только измененные файлы
+    analyzed_count = 0
+    for template in await Template.all():
+        try:
+            await record_version(template)
+            await refresh_inventory(template, settings.TEMPLATE_DIR)
+        except Exception as e:
+            print(f"Не удалось проанализировать шаблон {template.file_path}: {e}")
+            continue
+        analyzed_count += 1
+
+    print(f"Проанализировано плейсхолдеров шаблонов: {analyzed_count}")
+
     if added_count == 0 and not template_files:
         print("Директория шаблонов пуста. Шаблоны не импортированы.")
 
@@ -1,19 +1,41 @@
+import asyncio
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 import os
-from fastadmin import fastapi_app as admin_app
 
 from core.config import settings
+from core.admin import create_admin_app, ensure_admin_user
 from core.database import TORTOISE_ORM
+from core import executor
+from core import table_versions  # noqa: F401 — регистрирует сигналы изменения таблиц
+from core.http_cache import NEXT_AFTER_ID_HEADER, OutputStaticFiles
+from core.metrics import MetricsMiddleware, REGISTRY, instrument_db_client, run_snapshot_writer
+from core.preload import import_module, preload_modules
 from api.endpoints.report import router as report_router
-from models.models import AdminUser
+from api.endpoints.metrics import router as metrics_router
+from services.output_manager import OUTPUT_MANAGER, run_output_sweeper
+from services.reference_data import REFERENCE_DATA
+from services.template_versions import TEMPLATE_VERSIONS, run_template_watcher
 
 # Создаем директории, если они не существуют
 os.makedirs(settings.TEMPLATE_DIR, exist_ok=True)
 os.makedirs(settings.OUTPUT_DIR, exist_ok=True)
+os.makedirs(settings.RUNTIME_DIR, exist_ok=True)
+
+async def warm_up() -> None:
+    """Загружает шаблоны и справочные таблицы в память, библиотеки документов и компилирует шаблоны"""
+    await asyncio.to_thread(TEMPLATE_VERSIONS.load_directory, settings.TEMPLATE_DIR)
+    await REFERENCE_DATA.load()
+
+    if settings.PRELOAD_DOCUMENT_LIBRARIES:
+        await asyncio.to_thread(preload_modules)
+
+    if settings.COMPILE_TEMPLATES_ON_STARTUP:
+        compiler = await asyncio.to_thread(import_module, "services.template_compiler")
+        await asyncio.to_thread(compiler.TEMPLATE_COMPILER.compile_directory, settings.TEMPLATE_DIR)
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -21,24 +43,56 @@ async def lifespan(app: FastAPI):
     from tortoise import Tortoise
 
     await Tortoise.init(config=TORTOISE_ORM)
+    instrument_db_client(Tortoise.get_connection("default"))
+    instrument_db_client(Tortoise.get_connection("replica"))
+
+    # Создание администратора (хэширование bcrypt), загрузка библиотек документов и компиляция
+    # шаблонов выполняются в фоне, чтобы не задерживать начало обработки запросов
+    background = [asyncio.create_task(warm_up())]
+    if admin_app is not None:
+        background.append(asyncio.create_task(ensure_admin_user()))
+
+    # Индексируем выходные файлы и запускаем их периодическое вытеснение
+    await asyncio.to_thread(OUTPUT_MANAGER.load)
+    output_sweeper = asyncio.create_task(run_output_sweeper(settings.OUTPUT_SWEEP_INTERVAL))
+
+    # Новые версии шаблонов, измененных на месте, перекомпилируются в фоне без перезапуска
+    template_watcher = None
+    if settings.TEMPLATE_WATCH_ENABLED:
+        template_watcher = asyncio.create_task(run_template_watcher(settings.TEMPLATE_WATCH_INTERVAL))
+
+    # Предсказуемые отчеты генерируются заранее, пока сервис простаивает
+    prewarm_scheduler = None
+    if settings.PREWARM_JOBS or settings.PREWARM_JOBS_FILE:
+        prewarm = await asyncio.to_thread(import_module, "services.prewarm")
+        prewarm_scheduler = asyncio.create_task(prewarm.run_prewarm_scheduler(settings.PREWARM_INTERVAL))
+
+    # В многопроцессном режиме каждый воркер периодически публикует снимок своих метрик
+    snapshot_writer = None
+    if settings.METRICS_ENABLED and REGISTRY.multiprocess_dir:
+        snapshot_writer = asyncio.create_task(run_snapshot_writer(settings.METRICS_FLUSH_INTERVAL))
 
-    user = await AdminUser.get_or_none(username='admin')
-
-    if not user:
-        user = await AdminUser.create(
-            username='admin',
-            is_superuser=True,
-            password='adminpassword'
-        )
+    yield
 
-        user.set_password(user.password.encode())
-        await user.save()
+    output_sweeper.cancel()
+    for task in (template_watcher, prewarm_scheduler):
+        if task:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+    # Дожидаемся фоновых задач старта, чтобы не прерывать их посреди запроса к БД
+    await asyncio.gather(*background, return_exceptions=True)
 
-    yield
+    if snapshot_writer:
+        snapshot_writer.cancel()
+        REGISTRY.write_snapshot()
 
+    executor.shutdown()
     await Tortoise.close_connections()
 
 
+# Административная панель (None, если отключена)
+admin_app = create_admin_app(settings.ADMIN_MODE)
+
 # Создаем приложение FastAPI
 app = FastAPI(
     title=settings.APP_NAME,
@@ -54,14 +108,22 @@ app.add_middleware(
     allow_credentials=settings.CORS_ALLOW_CREDENTIALS,
     allow_methods=settings.CORS_ALLOW_METHODS,
     allow_headers=settings.CORS_ALLOW_HEADERS,
+    expose_headers=[NEXT_AFTER_ID_HEADER],
 )
 
+# Добавляем сбор метрик по HTTP-запросам
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 # Настраиваем статические файлы для доступа к сгенерированным документам
-app.mount("/output", StaticFiles(directory=settings.OUTPUT_DIR), name="output")
-app.mount("/admin", admin_app)
+app.mount("/output", OutputStaticFiles(directory=settings.OUTPUT_DIR, on_access=OUTPUT_MANAGER.touch), name="output")
+if admin_app is not None:
+    app.mount("/admin", admin_app)
 
 # Регистрируем роутеры
 app.include_router(report_router, tags=["reports"])
+if settings.METRICS_ENABLED:
+    app.include_router(metrics_router, tags=["metrics"])
 
 # Корневой маршрут
 @app.get("/", tags=["root"])
@@ -69,7 +131,7 @@ async def root():
     return {
         "message": "Добро пожаловать в сервис генерации документов!",
         "docs_url": "/docs",
-        "admin_url": "/admin"
+        "admin_url": "/admin" if admin_app is not None else None
     }
 
 # Для запуска через uvicorn
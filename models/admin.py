@@ -0,0 +1,177 @@
+"""
+Регистрация моделей в административной панели fastadmin.
+
+Модуль импортируется только при подключении админки (см. core/admin.py),
+поэтому процессы без админки не загружают fastadmin.
+"""
+import asyncio
+
+from fastadmin import (
+    TortoiseModelAdmin,
+    WidgetType,
+    register,
+    action
+)
+import bcrypt
+
+from models.models import (
+    AdminUser, Teacher, Group, Student, Discipline, ControlWork, Grade,
+    Literature, ExamQuestion, Publication, Template, ScheduleItem
+)
+from core.table_versions import bump_dependents
+from services.template_versions import copy_template_file, record_version
+
+
+class VersionedModelAdmin(TortoiseModelAdmin):
+    """
+    Админка модели с учетом удалений в версиях таблиц.
+
+    fastadmin удаляет запись через QuerySet.delete(), который не вызывает сигналов ORM:
+    версии таблиц, кэши и ETag остались бы устаревшими. Запись удаляется через
+    Model.delete() (сигнал post_delete), а таблицы с каскадно удаленными записями
+    отмечаются измененными.
+    """
+
+    async def orm_delete_obj(self, id) -> None:
+        obj = await self.orm_get_obj(id)
+        if obj is None:
+            return
+        await obj.delete()
+        bump_dependents(self.model_cls)
+
+
+@register(Teacher)
+class TeacherAdmin(VersionedModelAdmin):
+    list_display = ("id", "full_name", "email")
+    list_display_links = ("id", "full_name")
+    search_fields = ("full_name", "email")
+
+
+@register(Group)
+class GroupAdmin(VersionedModelAdmin):
+    list_display = ("id", "code", "course", "teacher")
+    list_display_links = ("id", "code")
+    list_filter = ("teacher",)
+    search_fields = ("code", "course")
+
+
+@register(Student)
+class StudentAdmin(VersionedModelAdmin):
+    list_display = ("id", "full_name", "email", "group")
+    list_display_links = ("id", "full_name")
+    list_filter = ("group",)
+    search_fields = ("full_name", "email")
+
+
+@register(ScheduleItem)
+class ScheduleItemAdmin(VersionedModelAdmin):
+    pass
+
+
+@register(Discipline)
+class DisciplineAdmin(VersionedModelAdmin):
+    list_display = ("id", "name", "education_level", "department", "hours_lecture", "hours_practice", "hours_lab")
+    list_display_links = ("id", "name")
+    list_filter = ("education_level",)
+    search_fields = ("name", "department")
+
+
+@register(ControlWork)
+class ControlWorkAdmin(VersionedModelAdmin):
+    list_display = ("id", "number", "discipline", "max_score", "week", "semester", "format")
+    list_display_links = ("id",)
+    list_filter = ("discipline", "format", "semester")
+
+
+@register(Grade)
+class GradeAdmin(VersionedModelAdmin):
+    list_display = ("id", "student", "control_work", "score", "date")
+    list_display_links = ("id",)
+    list_filter = ("student", "control_work", "date")
+
+
+@register(Literature)
+class LiteratureAdmin(VersionedModelAdmin):
+    list_display = ("id", "title", "authors", "publisher", "year", "discipline")
+    list_display_links = ("id", "title")
+    list_filter = ("discipline", "year")
+    search_fields = ("title", "authors")
+
+
+@register(ExamQuestion)
+class ExamQuestionAdmin(VersionedModelAdmin):
+    list_display = ("id", "number", "discipline", "text")
+    list_display_links = ("id", "number")
+    list_filter = ("discipline",)
+    search_fields = ("text",)
+
+
+@register(Publication)
+class PublicationAdmin(VersionedModelAdmin):
+    list_display = ("id", "title", "student")
+    list_display_links = ("id",)
+    list_filter = ("student",)
+    search_fields = ("title",)
+
+
+@register(Template)
+class TemplateAdmin(VersionedModelAdmin):
+    list_display = ("id", "name", "file_path", "file_type", "description")
+    list_display_links = ("id", "name")
+    list_filter = ("file_type",)
+    search_fields = ("name", "description")
+
+    @action(description="Создать копию шаблона")
+    async def duplicate_template(self, request, pk):
+        template = await Template.get(id=pk)
+        # Копия получает собственный файл: правка одного шаблона не меняет другой
+        file_path = await asyncio.to_thread(copy_template_file, template.file_path)
+        new_template = await Template.create(
+            name=f"{template.name} (копия)",
+            file_path=file_path,
+            file_type=template.file_type,
+            description=template.description
+        )
+        await record_version(new_template)
+        return True, f"Создана копия шаблона: {new_template.name}"
+
+
+@register(AdminUser)
+class UserAdmin(VersionedModelAdmin):
+    list_display = ("id", "username", "is_superuser", "is_active")
+    list_display_links = ("id", "username")
+    list_filter = ("id", "username", "is_superuser", "is_active")
+    search_fields = ("username",)
+    formfield_overrides = {
+        "username": (WidgetType.SlugInput, {"required": True}),
+        "password": (WidgetType.PasswordInput, {"passwordModalForm": True}),
+    }
+    actions = (
+        *TortoiseModelAdmin.actions,
+        "activate",
+        "deactivate",
+    )
+
+    async def authenticate(self, username: str, password: str) -> int | None:
+        user = await AdminUser.filter(username=username, is_superuser=True).first()
+        if not user:
+            return None
+        if not bcrypt.checkpw(password.encode(), user.password.encode()):
+            return None
+        return user.pk
+
+    async def change_password(self, id: int, password: str) -> None:
+        user = await self.model_cls.filter(id=id).first()
+        if not user:
+            return
+
+        user.set_password(password.encode())
+        await user.save(update_fields=("password",))
+
+    @action(description="Set as active")
+    async def activate(self, ids: list[int]) -> None:
+        await self.model_cls.filter(id__in=ids).update(is_active=True)
+
+    @action(description="Deactivate")
+    async def deactivate(self, ids: list[int]) -> None:
+        await self.model_cls.filter(id__in=ids).update(is_active=False)
@@ -1,10 +1,4 @@
 from tortoise import fields, models
-from fastadmin import (
-    TortoiseModelAdmin,
-    WidgetType,
-    register,
-    action
-)
 import bcrypt
 from enum import Enum
 
@@ -202,6 +196,44 @@ class Template(models.Model):
         return self.name
 
 
+class TemplateVersion(models.Model):
+    """Неизменяемая версия файла шаблона (по хэшу содержимого)"""
+    id = fields.IntField(pk=True)
+    template = fields.ForeignKeyField("models.Template", related_name="versions", on_delete=fields.CASCADE)
+    version = fields.IntField(null=False)
+    content_hash = fields.CharField(max_length=64, null=False)
+    snapshot_path = fields.CharField(max_length=500, null=False)  # копия файла этой версии
+    created_at = fields.DatetimeField(auto_now_add=True)
+
+    class Meta:
+        table = "template_versions"
+        unique_together = (("template", "version"),)
+
+    def __str__(self):
+        return f"Шаблон {self.template_id}, версия {self.version}"
+
+
+class TemplateInventory(models.Model):
+    """Плейсхолдеры шаблона, найденные при импорте"""
+    id = fields.IntField(pk=True)
+    template = fields.OneToOneField("models.Template", related_name="inventory", on_delete=fields.CASCADE)
+    template_type = fields.CharField(max_length=50, null=False)
+    content_hash = fields.CharField(max_length=64, null=False)
+    highlighted = fields.JSONField(default=list)  # выделенные фрагменты
+    keys = fields.JSONField(default=list)  # ключи {{...}}
+    codes = fields.JSONField(default=list)  # однобуквенные коды
+    markers = fields.JSONField(default=list)  # ячейки-маркеры
+    required_params = fields.JSONField(default=list)
+    optional_params = fields.JSONField(default=list)
+    analyzed_at = fields.DatetimeField(auto_now=True)
+
+    class Meta:
+        table = "template_inventories"
+
+    def __str__(self):
+        return f"Плейсхолдеры шаблона {self.template_id}"
+
+
 class TimeSlot(models.Model):
     """Модель временного слота для расписания"""
     id = fields.IntField(pk=True)
@@ -248,137 +280,3 @@ class ScheduleItem(models.Model):
 
     def __str__(self):
         return f"{self.day_of_week.value}, {self.time_slot}, {self.discipline.name}, {self.group.code}, {self.classroom.name if self.classroom else 'Нет аудитории'}"
-
-
-@register(Teacher)
-class TeacherAdmin(TortoiseModelAdmin):
-    list_display = ("id", "full_name", "email")
-    list_display_links = ("id", "full_name")
-    search_fields = ("full_name", "email")
-
-
-@register(Group)
-class GroupAdmin(TortoiseModelAdmin):
-    list_display = ("id", "code", "course", "teacher")
-    list_display_links = ("id", "code")
-    list_filter = ("teacher",)
-    search_fields = ("code", "course")
-
-
-@register(Student)
-class StudentAdmin(TortoiseModelAdmin):
-    list_display = ("id", "full_name", "email", "group")
-    list_display_links = ("id", "full_name")
-    list_filter = ("group",)
-    search_fields = ("full_name", "email")
-
-
-@register(ScheduleItem)
-class ScheduleItemAdmin(TortoiseModelAdmin):
-    pass
-
-
-@register(Discipline)
-class DisciplineAdmin(TortoiseModelAdmin):
-    list_display = ("id", "name", "education_level", "department", "hours_lecture", "hours_practice", "hours_lab")
-    list_display_links = ("id", "name")
-    list_filter = ("education_level",)
-    search_fields = ("name", "department")
-
-
-@register(ControlWork)
-class ControlWorkAdmin(TortoiseModelAdmin):
-    list_display = ("id", "number", "discipline", "max_score", "week", "semester", "format")
-    list_display_links = ("id",)
-    list_filter = ("discipline", "format", "semester")
-
-
-@register(Grade)
-class GradeAdmin(TortoiseModelAdmin):
-    list_display = ("id", "student", "control_work", "score", "date")
-    list_display_links = ("id",)
-    list_filter = ("student", "control_work", "date")
-
-
-@register(Literature)
-class LiteratureAdmin(TortoiseModelAdmin):
-    list_display = ("id", "title", "authors", "publisher", "year", "discipline")
-    list_display_links = ("id", "title")
-    list_filter = ("discipline", "year")
-    search_fields = ("title", "authors")
-
-
-@register(ExamQuestion)
-class ExamQuestionAdmin(TortoiseModelAdmin):
-    list_display = ("id", "number", "discipline", "text")
-    list_display_links = ("id", "number")
-    list_filter = ("discipline",)
-    search_fields = ("text",)
-
-
-@register(Publication)
-class PublicationAdmin(TortoiseModelAdmin):
-    list_display = ("id", "title", "student")
-    list_display_links = ("id",)
-    list_filter = ("student",)
-    search_fields = ("title",)
-
-
-@register(Template)
-class TemplateAdmin(TortoiseModelAdmin):
-    list_display = ("id", "name", "file_path", "file_type", "description")
-    list_display_links = ("id", "name")
-    list_filter = ("file_type",)
-    search_fields = ("name", "description")
-
-    @action(description="Создать копию шаблона")
-    async def duplicate_template(self, request, pk):
-        template = await Template.get(id=pk)
-        new_template = await Template.create(
-            name=f"{template.name} (копия)",
-            file_path=template.file_path,
-            file_type=template.file_type,
-            description=template.description
-        )
-        return True, f"Создана копия шаблона: {new_template.name}"
-
-
-@register(AdminUser)
-class UserAdmin(TortoiseModelAdmin):
-    list_display = ("id", "username", "is_superuser", "is_active")
-    list_display_links = ("id", "username")
-    list_filter = ("id", "username", "is_superuser", "is_active")
-    search_fields = ("username",)
-    formfield_overrides = {
-        "username": (WidgetType.SlugInput, {"required": True}),
-        "password": (WidgetType.PasswordInput, {"passwordModalForm": True}),
-    }
-    actions = (
-        *TortoiseModelAdmin.actions,
-        "activate",
-        "deactivate",
-    )
-
-    async def authenticate(self, username: str, password: str) -> int | None:
-        user = await AdminUser.filter(username=username, is_superuser=True).first()
-        if not user:
-            return None
-        if not bcrypt.checkpw(password.encode(), user.password.encode()):
-            return None
-        return user.pk
-
-    async def change_password(self, id: int, password: str) -> None:
-        user = await self.model_cls.filter(id=id).first()
-        if not user:
-            return
-
-        user.set_password(password.encode())
-        await user.save(update_fields=("password",))
-
-    @action(description="Set as active")
-    async def activate(self, ids: list[int]) -> None:
-        await self.model_cls.filter(id__in=ids).update(is_active=True)
-
-    @action(description="Deactivate")
-    async def deactivate(self, ids: list[int]) -> None:
-        await self.model_cls.filter(id__in=ids).update(is_active=False)
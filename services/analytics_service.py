@@ -0,0 +1,114 @@
+"""
+Аналитика оценок, вычисляемая на стороне базы данных
+"""
+from typing import Any, Dict, List, Optional
+
+from tortoise import Tortoise
+
+# Итоги студента по дисциплине и место в группе — один запрос с GROUP BY и оконными функциями.
+# Итоги строятся по всем парам «студент группы × контрольная работа» с LEFT JOIN оценок, поэтому
+# студенты без оценок получают нулевую сумму и учитываются в месте, размере и среднем итоге группы.
+# {works_filter} и {totals_filter} заменяются условиями фильтров, {limit} и {offset} — плейсхолдерами СУБД.
+GRADE_SUMMARY_SQL = """
+WITH works AS (
+    SELECT cw.discipline_id,
+           COUNT(*) AS works_total,
+           COALESCE(SUM(cw.max_score), 0) AS max_total
+    FROM control_works cw
+    WHERE cw.discipline_id IS NOT NULL{works_filter}
+    GROUP BY cw.discipline_id
+),
+totals AS (
+    SELECT s.id AS student_id,
+           s.full_name,
+           s.group_id,
+           cw.discipline_id,
+           COALESCE(SUM(g.score), 0) AS total_score,
+           AVG(g.score) AS average_score,
+           COUNT(g.score) AS completed
+    FROM students s
+    CROSS JOIN control_works cw
+    LEFT JOIN grades g ON g.student_id = s.id AND g.control_work_id = cw.id
+    WHERE s.group_id IS NOT NULL AND cw.discipline_id IS NOT NULL{totals_filter}
+    GROUP BY s.id, s.full_name, s.group_id, cw.discipline_id
+)
+SELECT t.student_id,
+       t.full_name,
+       t.group_id,
+       gr.code AS group_code,
+       t.discipline_id,
+       d.name AS discipline_name,
+       t.total_score,
+       w.max_total,
+       ROUND(t.average_score, 2) AS average_score,
+       t.completed,
+       w.works_total,
+       RANK() OVER (PARTITION BY t.group_id, t.discipline_id ORDER BY t.total_score DESC) AS group_rank,
+       COUNT(*) OVER (PARTITION BY t.group_id, t.discipline_id) AS group_size,
+       ROUND(AVG(t.total_score) OVER (PARTITION BY t.group_id, t.discipline_id), 2) AS group_average
+FROM totals t
+JOIN works w ON w.discipline_id = t.discipline_id
+JOIN disciplines d ON d.id = t.discipline_id
+LEFT JOIN "groups" gr ON gr.id = t.group_id
+ORDER BY t.group_id, t.discipline_id, group_rank, t.student_id
+LIMIT {limit} OFFSET {offset}
+"""
+
+
+class GradeAnalyticsService:
+    """
+    Сводка оценок по студентам, дисциплинам и группам.
+
+    Оценки не загружаются в Python: суммы, средние, количество сданных работ
+    и место в группе считает СУБД (PostgreSQL или SQLite 3.25+).
+    """
+
+    def __init__(self, connection_name: str = "replica"):
+        self.connection_name = connection_name
+
+    async def grade_summary(self, group_id: Optional[int] = None, discipline_id: Optional[int] = None,
+                            limit: int = 500, offset: int = 0) -> List[Dict[str, Any]]:
+        """
+        Возвращает итоги студентов по дисциплинам
+
+        Args:
+            group_id: ID группы (опционально)
+            discipline_id: ID дисциплины (опционально)
+            limit: Размер страницы
+            offset: Количество пропускаемых строк
+
+        Returns:
+            Строки с суммой баллов, максимумом, средним баллом, количеством сданных работ,
+            местом в группе по дисциплине, размером группы и средним итогом группы.
+            Место считается по всем студентам группы (включая студентов без оценок), а не по странице.
+        """
+        connection = Tortoise.get_connection(self.connection_name)
+        postgres = connection.capabilities.dialect == "postgres"
+        values: List[Any] = []
+
+        def placeholder(value: Any) -> str:
+            values.append(value)
+            return f"${len(values)}" if postgres else "?"
+
+        works_filter = ""
+        totals_filter = ""
+        if discipline_id is not None:
+            works_filter += f" AND cw.discipline_id = {placeholder(discipline_id)}"
+            totals_filter += f" AND cw.discipline_id = {placeholder(discipline_id)}"
+        if group_id is not None:
+            totals_filter += f" AND s.group_id = {placeholder(group_id)}"
+
+        sql = GRADE_SUMMARY_SQL.format(
+            works_filter=works_filter,
+            totals_filter=totals_filter,
+            limit=placeholder(limit),
+            offset=placeholder(offset)
+        )
+
+        rows = await connection.execute_query_dict(sql, values)
+        # Средние в PostgreSQL возвращаются как numeric
+        for row in rows:
+            for key in ("average_score", "group_average"):
+                if row[key] is not None:
+                    row[key] = float(row[key])
+        return rows
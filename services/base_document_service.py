@@ -1,10 +1,17 @@
+import io
 import os
 import re
+import uuid
 from abc import ABC, abstractmethod
-from typing import Dict, Any
+from typing import Dict, Any, Awaitable, Callable, Tuple
 
 from core.config import settings
+from core.metrics import REPORT_GENERATION_SECONDS, REPORT_GENERATIONS_IN_PROGRESS
+from core.preload import import_module
 from models.models import Template
+from services.output_manager import OUTPUT_MANAGER
+from services.reference_data import REFERENCE_DATA
+from services.template_versions import TEMPLATE_VERSIONS
 
 
 class BaseDocumentService(ABC):
@@ -30,14 +37,30 @@ class BaseDocumentService(ABC):
         Raises:
             FileNotFoundError: Если файл шаблона не найден
         """
-        template = await Template.get(id=template_id)
-        template_path = os.path.join(settings.TEMPLATE_DIR, template.file_path)
+        template = await REFERENCE_DATA.get(Template, template_id)
+        template_path = self.template_path(template)
 
-        if not os.path.exists(template_path):
+        if not TEMPLATE_VERSIONS.exists(template_path):
             raise FileNotFoundError(f"Шаблон {template_path} не найден")
 
         return template
 
+    def template_path(self, template: Template) -> str:
+        """Возвращает путь к файлу шаблона"""
+        return os.path.join(settings.TEMPLATE_DIR, template.file_path)
+
+    async def get_template_type(self, template: Template) -> str:
+        """
+        Возвращает тип шаблона для меток метрик
+
+        Args:
+            template: Объект шаблона
+
+        Returns:
+            Строковый тип шаблона
+        """
+        return template.file_type
+
     async def generate_output_filename(self, template: Template, params: Dict[str, Any]) -> str:
         """
         Генерирует имя выходного файла на основе шаблона и параметров
@@ -125,6 +148,37 @@ class BaseDocumentService(ABC):
         """
         pass
 
+    async def write_output(self, output_filename: str, writer: Callable[[str], Awaitable[None]]) -> str:
+        """
+        Записывает выходной файл атомарно и регистрирует его в каталоге OUTPUT_DIR
+
+        Файл сначала записывается во временный файл и затем переименовывается,
+        поэтому параллельные генерации и чтение через /output никогда не видят
+        частично записанный файл.
+
+        Args:
+            output_filename: Имя выходного файла
+            writer: Корутина, записывающая содержимое по переданному пути
+
+        Returns:
+            Путь к выходному файлу
+        """
+        # Создаем директорию для выходных файлов, если она не существует
+        os.makedirs(settings.OUTPUT_DIR, exist_ok=True)
+
+        output_path = os.path.join(settings.OUTPUT_DIR, output_filename)
+        tmp_path = os.path.join(settings.OUTPUT_DIR, f".{uuid.uuid4().hex}.tmp")
+        try:
+            await writer(tmp_path)
+            os.replace(tmp_path, output_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        OUTPUT_MANAGER.register(output_path)
+
+        return output_path
+
     async def generate_document(self, template_id: int, params: Dict[str, Any]) -> str:
         """
         Основной метод генерации документа
@@ -138,25 +192,49 @@ class BaseDocumentService(ABC):
         """
         # Получаем шаблон
         template = await self.get_template(template_id)
-        template_path = os.path.join(settings.TEMPLATE_DIR, template.file_path)
+        template_path = self.template_path(template)
+        template_type = await self.get_template_type(template)
 
-        # Загружаем документ
-        document = await self.load_document(template_path)
+        with REPORT_GENERATIONS_IN_PROGRESS.track_inprogress(), \
+                REPORT_GENERATION_SECONDS.time(template_type=template_type):
+            # Загружаем документ
+            document = await self.load_document(template_path)
 
-        # Обрабатываем документ
-        document = await self.process_document(document, params)
+            # Обрабатываем документ
+            document = await self.process_document(document, params)
 
-        # Создаем директорию для выходных файлов, если она не существует
-        os.makedirs(settings.OUTPUT_DIR, exist_ok=True)
+            # Генерируем имя выходного файла и сохраняем результат
+            output_filename = await self.generate_output_filename(template, params)
 
-        # Генерируем имя выходного файла
-        output_filename = await self.generate_output_filename(template, params)
-        output_path = os.path.join(settings.OUTPUT_DIR, output_filename)
+            return await self.write_output(
+                output_filename,
+                lambda path: self.save_document(document, path)
+            )
 
-        # Сохраняем результат
-        await self.save_document(document, output_path)
+    async def render_document(self, template_id: int, params: Dict[str, Any]) -> Tuple[str, bytes]:
+        """
+        Генерирует документ в памяти, не сохраняя его в OUTPUT_DIR
 
-        return output_path
+        Args:
+            template_id: ID шаблона
+            params: Параметры для генерации документа
+
+        Returns:
+            Кортеж (имя файла, содержимое)
+        """
+        template = await self.get_template(template_id)
+        template_type = await self.get_template_type(template)
+
+        with REPORT_GENERATIONS_IN_PROGRESS.track_inprogress(), \
+                REPORT_GENERATION_SECONDS.time(template_type=template_type):
+            document = await self.load_document(self.template_path(template))
+            document = await self.process_document(document, params)
+
+            # python-docx и openpyxl умеют сохранять документ в файловый объект
+            buffer = io.BytesIO()
+            await self.save_document(document, buffer)
+
+        return await self.generate_output_filename(template, params), buffer.getvalue()
 
 
 class DocumentServiceFactory:
@@ -178,14 +256,11 @@ class DocumentServiceFactory:
         Raises:
             ValueError: Если тип файла не поддерживается
         """
-        from services.docx_service import DocxService
-        from services.xlsx_service import XlsxService
-
-        template = await Template.get(id=template_id)
+        template = await REFERENCE_DATA.get(Template, template_id)
 
         if template.file_type.lower() == 'docx':
-            return DocxService()
+            return import_module("services.docx_service").DocxService()
         elif template.file_type.lower() == 'xlsx':
-            return XlsxService()
+            return import_module("services.xlsx_service").XlsxService()
         else:
             raise ValueError(f"Неподдерживаемый тип файла: {template.file_type}")
\ No newline at end of file
@@ -0,0 +1,54 @@
+"""
+Пакетная генерация документов с потоковой выдачей zip-архива
+"""
+from typing import Any, AsyncIterator, Dict, List, Tuple
+
+from core.admission import ADMISSION
+from models.models import Template
+from services.base_document_service import DocumentServiceFactory
+
+
+class BatchService:
+    """Генерирует набор документов по одному, не сохраняя их в OUTPUT_DIR"""
+
+    async def validate(self, items: List[Dict[str, Any]]) -> None:
+        """
+        Проверяет, что все шаблоны пакета существуют, до начала выдачи архива
+
+        Args:
+            items: Наборы параметров с template_id
+
+        Raises:
+            FileNotFoundError: Если какого-либо шаблона нет
+        """
+        template_ids = {item['template_id'] for item in items}
+        existing = set(await Template.filter(id__in=template_ids).values_list('id', flat=True))
+        missing = sorted(template_ids - existing)
+
+        if missing:
+            raise FileNotFoundError(f"Шаблоны не найдены: {', '.join(map(str, missing))}")
+
+    async def files(self, items: List[Dict[str, Any]]) -> AsyncIterator[Tuple[str, bytes]]:
+        """
+        Генерирует документы пакета
+
+        Ошибка генерации одного документа не прерывает архив: вместо документа
+        в архив добавляется текстовый файл с описанием ошибки.
+
+        Args:
+            items: Наборы параметров с template_id
+
+        Yields:
+            Пары (имя файла в архиве, содержимое)
+        """
+        for index, params in enumerate(items, start=1):
+            try:
+                service = await DocumentServiceFactory.get_service(params['template_id'])
+                # Пакет уже допущен к выдаче: документы ждут слот генерации без ограничения очереди
+                async with ADMISSION.slot(bounded=False):
+                    filename, content = await service.render_document(params['template_id'], params)
+            except Exception as e:
+                yield f"{index:03d}_error.txt", f"Ошибка при генерации документа: {e}".encode("utf-8")
+                continue
+
+            yield f"{index:03d}_{filename}", content
@@ -0,0 +1,106 @@
+"""
+Сборка нескольких заполненных копий одного DOCX-шаблона в один документ.
+
+Шаблон разбирается один раз. Перед заполнением очередной копии содержимое
+тела документа восстанавливается из исходного снимка, а заполненное
+содержимое переносится в накопитель. Стили, нумерация, колонтитулы и
+изображения остаются общими частями одного пакета и не дублируются.
+"""
+from copy import deepcopy
+from typing import Iterable, List
+
+from docx.document import Document
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+
+PAGE_BREAK = "page"
+SECTION_BREAK = "section"
+
+_SECT_PR = qn("w:sectPr")
+_DOC_PR = qn("wp:docPr")
+
+
+class DocxComposer:
+    """Накопитель заполненных копий шаблона"""
+
+    def __init__(self, document: Document):
+        self.document = document
+        self._body = document.element.body
+        self._pristine = [deepcopy(element) for element in self._content()]
+        self._entries: List[list] = []
+
+    def _content(self) -> list:
+        """Элементы тела документа, кроме свойств последнего раздела"""
+        return [child for child in self._body.iterchildren() if child.tag != _SECT_PR]
+
+    def _insert(self, elements: Iterable) -> None:
+        sect_pr = self._body.sectPr
+        for element in elements:
+            if sect_pr is not None:
+                sect_pr.addprevious(element)
+            else:
+                self._body.append(element)
+
+    def _clear(self) -> list:
+        content = self._content()
+        for element in content:
+            self._body.remove(element)
+        return content
+
+    def reset(self) -> None:
+        """Восстанавливает исходное содержимое шаблона"""
+        self._clear()
+        self._insert(deepcopy(element) for element in self._pristine)
+
+    def commit(self) -> None:
+        """Сохраняет заполненное содержимое как очередную часть и восстанавливает шаблон"""
+        self._entries.append(self._clear())
+        self._insert(deepcopy(element) for element in self._pristine)
+
+    @property
+    def count(self) -> int:
+        return len(self._entries)
+
+    def _separator(self, kind: str):
+        paragraph = OxmlElement("w:p")
+        sect_pr = self._body.sectPr
+
+        if kind == SECTION_BREAK and sect_pr is not None:
+            # Раздел заканчивается абзацем со свойствами раздела; без w:type это разрыв со следующей страницы
+            section = deepcopy(sect_pr)
+            for section_type in section.findall(qn("w:type")):
+                section.remove(section_type)
+            p_pr = OxmlElement("w:pPr")
+            p_pr.append(section)
+            paragraph.append(p_pr)
+        else:
+            run = OxmlElement("w:r")
+            br = OxmlElement("w:br")
+            br.set(qn("w:type"), "page")
+            run.append(br)
+            paragraph.append(run)
+
+        return paragraph
+
+    def compose(self, separator: str = PAGE_BREAK) -> Document:
+        """
+        Заменяет тело документа накопленными частями
+
+        Args:
+            separator: Разделитель частей — разрыв страницы или разрыв раздела
+
+        Returns:
+            Итоговый документ
+        """
+        self._clear()
+        for index, content in enumerate(self._entries):
+            if index:
+                self._insert([self._separator(separator)])
+            self._insert(content)
+        self._entries = []
+
+        # Идентификаторы рисунков должны быть уникальны в пределах документа
+        for index, doc_pr in enumerate(self._body.iter(_DOC_PR), start=1):
+            doc_pr.set("id", str(index))
+
+        return self.document
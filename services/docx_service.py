@@ -2,17 +2,30 @@
 Улучшенная реализация DocxService с точной заменой буквенных плейсхолдеров
 для каждого типа шаблона
 """
+import logging
+import math
 import random
+import re
 from typing import Dict, Any, List, Tuple
 from docx import Document
 from docx.shared import Pt
 
+from core.executor import run_blocking
 from services.base_document_service import BaseDocumentService
+from services.rating_engine import (
+    RATING_ENGINE, SUMMARY_HEADERS, RatingResult, ScoreMatrix, due_week, format_score, load_score_matrix,
+    load_students_matrix
+)
+from services.reference_data import REFERENCE_DATA
+from services.template_compiler import TEMPLATE_COMPILER, PatchPlan
+from services.template_versions import TEMPLATE_VERSIONS
 from models.models import (
     Group, Student, Teacher, Discipline, ExamQuestion,
-    ScheduleItem, Publication
+    ScheduleItem, Publication, Template, TimeSlot
 )
 
+logger = logging.getLogger(__name__)
+
 
 class DocxService(BaseDocumentService):
     """
@@ -22,6 +35,8 @@ class DocxService(BaseDocumentService):
     TEMPLATE_TYPE_MASTER_TITLE = "master_title"
     TEMPLATE_TYPE_BACHELOR_TITLE = "bachelor_title"
     TEMPLATE_TYPE_EXAM_TICKET = "exam_ticket"
+    # Количество мест для вопросов в шаблоне билета
+    EXAM_TICKET_QUESTION_SLOTS = 3
     TEMPLATE_TYPE_ABSTRACT = "abstract"
     TEMPLATE_TYPE_LAB_WORK = "lab_work"
     TEMPLATE_TYPE_COURSE_WORK = "course_work"
@@ -35,63 +50,90 @@ class DocxService(BaseDocumentService):
     TEMPLATE_TYPE_PRACTICE_REPORT = "practice_report"
     TEMPLATE_TYPE_TASK = "task"
     TEMPLATE_TYPE_CLASSROOM_SCHEDULE = "classroom_schedule"
+    TEMPLATE_TYPE_RATING_SYSTEM = "rating_system"
     TEMPLATE_TYPE_GENERIC = "generic"
 
+    def __init__(self):
+        super().__init__()
+        # План замен последнего загруженного документа: (тело документа, план)
+        self._patch_plan = None
+
+    def _load(self, template_path: str) -> Tuple[Document, PatchPlan]:
+        document = Document(TEMPLATE_VERSIONS.open(template_path))
+        return document, TEMPLATE_COMPILER.plan_for(template_path, document)
+
     async def load_document(self, template_path: str) -> Document:
         """
-        Загружает DOCX-документ из файла шаблона
+        Загружает DOCX-документ из файла шаблона вместе с планом замен выделенного текста
         """
-        return Document(template_path)
+        document, plan = await run_blocking(self._load, template_path)
+        self._patch_plan = (document.element.body, plan)
+        return document
 
     async def save_document(self, document: Document, output_path: str) -> None:
         """
         Сохраняет DOCX-документ в файл
         """
-        document.save(output_path)
+        await run_blocking(document.save, output_path)
+
+    async def get_template_type(self, template: Template) -> str:
+        """
+        Возвращает тип DOCX-шаблона для меток метрик
+        """
+        return self.template_type_for_name(template.name)
 
     async def determine_template_type(self, template_id: int, template_name: str) -> str:
         """
         Определяет тип шаблона по его ID и имени
         """
-        template_name_lower = template_name.lower()
+        template_type = self.template_type_for_name(template_name)
+        logger.debug("Шаблон %s (%s): тип %s", template_id, template_name, template_type)
+        return template_type
 
-        print(template_name_lower)
+    @classmethod
+    def template_type_for_name(cls, template_name: str) -> str:
+        """
+        Определяет тип шаблона по его имени
+        """
+        template_name_lower = template_name.lower()
 
         if "титул маг" in template_name_lower:
-            return self.TEMPLATE_TYPE_MASTER_TITLE
+            return cls.TEMPLATE_TYPE_MASTER_TITLE
         elif "титул бак" in template_name_lower:
-            return self.TEMPLATE_TYPE_BACHELOR_TITLE
+            return cls.TEMPLATE_TYPE_BACHELOR_TITLE
         elif "билет" in template_name_lower:
-            return self.TEMPLATE_TYPE_EXAM_TICKET
+            return cls.TEMPLATE_TYPE_EXAM_TICKET
         elif "реферат" in template_name_lower:
-            return self.TEMPLATE_TYPE_ABSTRACT
+            return cls.TEMPLATE_TYPE_ABSTRACT
         elif "лабораторная работа" in template_name_lower:
-            return self.TEMPLATE_TYPE_LAB_WORK
+            return cls.TEMPLATE_TYPE_LAB_WORK
         elif "курсовая работа" in template_name_lower:
-            return self.TEMPLATE_TYPE_COURSE_WORK
+            return cls.TEMPLATE_TYPE_COURSE_WORK
         elif "курсовой проект" in template_name_lower:
-            return self.TEMPLATE_TYPE_COURSE_PROJECT
+            return cls.TEMPLATE_TYPE_COURSE_PROJECT
         elif "практических работ" in template_name_lower:
-            return self.TEMPLATE_TYPE_PRACTICE_THEMES
+            return cls.TEMPLATE_TYPE_PRACTICE_THEMES
         elif "публикаций" in template_name_lower:
-            return self.TEMPLATE_TYPE_PUBLICATIONS
+            return cls.TEMPLATE_TYPE_PUBLICATIONS
         elif "литератур" in template_name_lower:
-            return self.TEMPLATE_TYPE_LITERATURE
+            return cls.TEMPLATE_TYPE_LITERATURE
         elif "вопрос" in template_name_lower and ("экзамен" in template_name_lower or "зачет" in template_name_lower):
-            return self.TEMPLATE_TYPE_EXAM_QUESTIONS
+            return cls.TEMPLATE_TYPE_EXAM_QUESTIONS
         elif "расписание преподавателей" in template_name_lower:
-            return self.TEMPLATE_TYPE_TEACHER_SCHEDULE
+            return cls.TEMPLATE_TYPE_TEACHER_SCHEDULE
         elif "секции" in template_name_lower:
-            return self.TEMPLATE_TYPE_SECTION_PROGRAM
+            return cls.TEMPLATE_TYPE_SECTION_PROGRAM
         elif "практик" in template_name_lower and "отчет" in template_name_lower:
-            return self.TEMPLATE_TYPE_PRACTICE_REPORT
+            return cls.TEMPLATE_TYPE_PRACTICE_REPORT
         elif "задание" in template_name_lower:
-            return self.TEMPLATE_TYPE_TASK
+            return cls.TEMPLATE_TYPE_TASK
         elif "загруженность" in template_name_lower or 'загруженность аудиторий' == template_name_lower:
-            return self.TEMPLATE_TYPE_CLASSROOM_SCHEDULE
+            return cls.TEMPLATE_TYPE_CLASSROOM_SCHEDULE
+        elif "брс" in template_name_lower or "балльно-рейтинг" in template_name_lower:
+            return cls.TEMPLATE_TYPE_RATING_SYSTEM
         else:
 
-            return self.TEMPLATE_TYPE_GENERIC
+            return cls.TEMPLATE_TYPE_GENERIC
 
     async def find_highlighted_text(self, document: Document) -> List[Tuple[Any, str]]:
         """
@@ -119,6 +161,11 @@ class DocxService(BaseDocumentService):
         """
         Заменяет выделенный текст на соответствующие значения и убирает желтое выделение
         """
+        # Для документа, загруженного из скомпилированного шаблона, замены применяются по плану без поиска
+        if self._patch_plan and self._patch_plan[0] is document.element.body:
+            if self._patch_plan[1].apply(document, replacement_map):
+                return
+
         highlighted_items = await self.find_highlighted_text(document)
 
         for run, text in highlighted_items:
@@ -176,21 +223,22 @@ class DocxService(BaseDocumentService):
         replacements = {}
 
         if discipline_id:
-            discipline = await Discipline.get(id=discipline_id)
+            discipline = await REFERENCE_DATA.get(Discipline, discipline_id)
             replacements['J'] = "Исследование и разработка методов машинного обучения"
         else:
             replacements['J'] = "Исследование и разработка методов машинного обучения"
 
         if student_id:
-            student = await Student.get(id=student_id).prefetch_related('group')
+            student = await Student.get(id=student_id)
+            student_group = await REFERENCE_DATA.get_or_none(Group, student.group_id)
             replacements['N'] = student.full_name
-            if student.group:
-                replacements['T'] = student.group.code
+            if student_group:
+                replacements['T'] = student_group.code
             else:
                 replacements['T'] = "КМБО-05-21"
 
         if teacher_id:
-            teacher = await Teacher.get(id=teacher_id)
+            teacher = await REFERENCE_DATA.get(Teacher, teacher_id)
 
             name_parts = teacher.full_name.split()
             if len(name_parts) >= 3:
@@ -220,21 +268,22 @@ class DocxService(BaseDocumentService):
         replacements = {}
 
         if discipline_id:
-            discipline = await Discipline.get(id=discipline_id)
+            discipline = await REFERENCE_DATA.get(Discipline, discipline_id)
             replacements['J'] = "Разработка программного обеспечения"
         else:
             replacements['J'] = "Разработка программного обеспечения"
 
         if student_id:
-            student = await Student.get(id=student_id).prefetch_related('group')
+            student = await Student.get(id=student_id)
+            student_group = await REFERENCE_DATA.get_or_none(Group, student.group_id)
             replacements['N'] = student.full_name
-            if student.group:
-                replacements['T'] = student.group.code
+            if student_group:
+                replacements['T'] = student_group.code
             else:
                 replacements['T'] = "КМБО-05-21"
 
         if teacher_id:
-            teacher = await Teacher.get(id=teacher_id)
+            teacher = await REFERENCE_DATA.get(Teacher, teacher_id)
 
             name_parts = teacher.full_name.split()
             if len(name_parts) >= 3:
@@ -259,7 +308,7 @@ class DocxService(BaseDocumentService):
         Обрабатывает шаблон экзаменационного билета
         """
         discipline_id = params.get('discipline_id')
-        ticket_number = params.get('ticket_number', random.randint(1, 30))
+        ticket_number = params.get('ticket_number') or random.randint(1, 30)
 
         replacements = {
             'K': str(ticket_number),
@@ -273,8 +322,13 @@ class DocxService(BaseDocumentService):
             "Методы оптимизации программного кода"
         ]
 
-        if discipline_id:
-            discipline = await Discipline.get(id=discipline_id)
+        if params.get('questions') is not None:
+            # Набор билетов передает заранее распределенные вопросы и название дисциплины
+            replacements['T'] = params.get('discipline_name') or replacements['T']
+            example_questions = params['questions']
+
+        elif discipline_id:
+            discipline = await REFERENCE_DATA.get(Discipline, discipline_id)
             replacements['T'] = discipline.name
 
             questions = await ExamQuestion.filter(discipline_id=discipline_id).order_by('number')
@@ -283,12 +337,14 @@ class DocxService(BaseDocumentService):
                 selected_questions = questions[:3] if len(questions) <= 3 else random.sample(list(questions), 3)
                 example_questions = [q.text for q in selected_questions]
 
-        success = await self.replace_exam_ticket_questions(document, example_questions)
+        # В билете из набора лишние места для вопросов остаются пустыми, а не заполняются вопросом по умолчанию
+        pad = params.get('questions') is None
+        success = await self.replace_exam_ticket_questions(document, example_questions, pad)
 
         if not success:
             print("Не удалось найти плейсхолдеры вопросов в таблице, пробуем другой метод...")
 
-            await self.replace_exam_ticket_questions(document, example_questions)
+            await self.replace_exam_ticket_questions(document, example_questions, pad)
 
         await self.replace_highlighted_text(document, replacements)
 
@@ -313,7 +369,7 @@ class DocxService(BaseDocumentService):
         replacements = {}
 
         if discipline_id:
-            discipline = await Discipline.get(id=discipline_id)
+            discipline = await REFERENCE_DATA.get(Discipline, discipline_id)
             replacements['N'] = discipline.name
         else:
             replacements['N'] = "Программирование и алгоритмы"
@@ -325,7 +381,7 @@ class DocxService(BaseDocumentService):
             replacements['G'] = "Иванов Иван Иванович"
 
         if teacher_id:
-            teacher = await Teacher.get(id=teacher_id)
+            teacher = await REFERENCE_DATA.get(Teacher, teacher_id)
             replacements['P'] = teacher.full_name
         else:
             replacements['P'] = "Петров Петр Петрович"
@@ -401,16 +457,17 @@ class DocxService(BaseDocumentService):
         replacements = {}
 
         if discipline_id:
-            discipline = await Discipline.get(id=discipline_id)
+            discipline = await REFERENCE_DATA.get(Discipline, discipline_id)
             replacements['N'] = discipline.name
         else:
             replacements['N'] = "Программирование и алгоритмы"
 
         if student_id:
-            student = await Student.get(id=student_id).prefetch_related('group')
+            student = await Student.get(id=student_id)
+            student_group = await REFERENCE_DATA.get_or_none(Group, student.group_id)
             replacements['G'] = student.full_name
-            if student.group:
-                replacements['S'] = student.group.code
+            if student_group:
+                replacements['S'] = student_group.code
             else:
                 replacements['S'] = "КМБО-05-21"
         else:
@@ -418,7 +475,7 @@ class DocxService(BaseDocumentService):
             replacements['S'] = "КМБО-05-21"
 
         if teacher_id:
-            teacher = await Teacher.get(id=teacher_id)
+            teacher = await REFERENCE_DATA.get(Teacher, teacher_id)
             replacements['P'] = teacher.full_name
         else:
             replacements['P'] = "Петров Петр Петрович"
@@ -457,7 +514,7 @@ class DocxService(BaseDocumentService):
         }
 
         if discipline_id:
-            discipline = await Discipline.get(id=discipline_id)
+            discipline = await REFERENCE_DATA.get(Discipline, discipline_id)
             replacements['G'] = discipline.name
 
             practice_themes = [
@@ -492,18 +549,20 @@ class DocxService(BaseDocumentService):
 
         await self.replace_highlighted_text(document, replacements)
 
-    async def replace_exam_ticket_questions(self, document, questions):
+    async def replace_exam_ticket_questions(self, document, questions, pad: bool = True):
         """
         Метод, предназначенный специально для замены вопросов в таблице билета
 
         Args:
             document: Документ Word
-            questions: Список вопросов (минимум 3)
+            questions: Список вопросов (не больше EXAM_TICKET_QUESTION_SLOTS)
+            pad: Заполнять недостающие вопросы вопросом по умолчанию; иначе лишние места очищаются
         """
         print("Начинаем поиск и замену вопросов в билете...")
 
-        if len(questions) < 3:
-            questions = questions + ["Вопрос по умолчанию"] * (3 - len(questions))
+        slots = self.EXAM_TICKET_QUESTION_SLOTS
+        if pad and len(questions) < slots:
+            questions = questions + ["Вопрос по умолчанию"] * (slots - len(questions))
 
         found_placeholders = []
 
@@ -557,33 +616,36 @@ class DocxService(BaseDocumentService):
                             if "M" in paragraph.text:
                                 found_placeholders.append((cell, row_index, cell_index, paragraph))
 
+        # Прогоны вида "M" или "1. M"; номер вопроса перед плейсхолдером сохраняется
+        # Объединенные ячейки возвращаются row.cells несколько раз, поэтому прогоны дедуплицируются
         question_runs = []
+        seen_runs = set()
         for table in document.tables:
             for row in table.rows:
                 for cell in row.cells:
                     for paragraph in cell.paragraphs:
                         for run in paragraph.runs:
-                            run_text = run.text.strip()
-                            if run_text == "M":
-                                question_runs.append(run)
+                            match = re.fullmatch(r"(\d+\.\s*)?M", run.text.strip())
+                            if match and run._r not in seen_runs:
+                                seen_runs.add(run._r)
+                                question_runs.append((run, match.group(1) or ""))
 
         if question_runs:
-            for i, run in enumerate(question_runs[:3]):
-                if i < len(questions):
-                    run.text = questions[i]
-                    if hasattr(run, 'font') and hasattr(run.font, 'highlight_color'):
-                        run.font.highlight_color = None
+            for i, (run, prefix) in enumerate(question_runs[:slots]):
+                run.text = prefix + questions[i] if i < len(questions) else ""
+                if hasattr(run, 'font') and hasattr(run.font, 'highlight_color'):
+                    run.font.highlight_color = None
 
 
         elif found_placeholders:
-            for i, placeholder_info in enumerate(found_placeholders[:3]):
-                if i < len(questions):
-                    if len(placeholder_info) == 4:
-                        cell, _, _, paragraph = placeholder_info
-                        paragraph.text = paragraph.text.replace("M", questions[i])
-                    else:
-                        cell, _, _ = placeholder_info
-                        cell.text = questions[i]
+            for i, placeholder_info in enumerate(found_placeholders[:slots]):
+                question = questions[i] if i < len(questions) else ""
+                if len(placeholder_info) == 4:
+                    cell, _, _, paragraph = placeholder_info
+                    paragraph.text = paragraph.text.replace("M", question)
+                else:
+                    cell, _, _ = placeholder_info
+                    cell.text = question
 
         return len(question_runs) > 0 or len(found_placeholders) > 0
 
@@ -669,11 +731,12 @@ class DocxService(BaseDocumentService):
         replacements = {}
 
         if student_id:
-            student = await Student.get(id=student_id).prefetch_related('group')
+            student = await Student.get(id=student_id)
+            student_group = await REFERENCE_DATA.get_or_none(Group, student.group_id)
             replacements['T'] = student.full_name
 
-            if student.group:
-                replacements['G'] = student.group.code
+            if student_group:
+                replacements['G'] = student_group.code
             else:
                 replacements['G'] = "КМБО-05-21"
 
@@ -704,7 +767,7 @@ class DocxService(BaseDocumentService):
         replacements = {}
 
         if discipline_id:
-            discipline = await Discipline.get(id=discipline_id)
+            discipline = await REFERENCE_DATA.get(Discipline, discipline_id)
             replacements['G'] = discipline.name
 
             literature_examples = [
@@ -789,7 +852,7 @@ class DocxService(BaseDocumentService):
         }
 
         if discipline_id:
-            discipline = await Discipline.get(id=discipline_id)
+            discipline = await REFERENCE_DATA.get(Discipline, discipline_id)
             replacements['G'] = discipline.name
 
             questions = await ExamQuestion.filter(discipline_id=discipline_id).order_by('number')
@@ -855,22 +918,23 @@ class DocxService(BaseDocumentService):
         }
 
         if teacher_id:
-            teacher = await Teacher.get(id=teacher_id)
+            teacher = await REFERENCE_DATA.get(Teacher, teacher_id)
             replacements['М'] = teacher.full_name
             replacements['M'] = teacher.full_name
 
-            query = ScheduleItem.filter(teacher_id=teacher_id).prefetch_related('discipline')
+            query = ScheduleItem.filter(teacher_id=teacher_id)
             if day_of_week:
                 query = query.filter(day_of_week=day_of_week)
 
             schedule_items = await query.order_by('time_slot__number')
 
             if schedule_items:
+                reference = await REFERENCE_DATA.snapshot()
 
-                replacements['P'] = schedule_items[0].discipline.name
+                replacements['P'] = reference.get(Discipline, schedule_items[0].discipline_id).name
 
-                if hasattr(schedule_items[0], 'time_slot') and schedule_items[0].time_slot:
-                    time_slot = schedule_items[0].time_slot
+                time_slot = reference.get_or_none(TimeSlot, schedule_items[0].time_slot_id)
+                if time_slot:
                     replacements['XX:XX-XX:XX'] = f"{time_slot.start_time}-{time_slot.end_time}"
             else:
                 replacements['P'] = "Программирование и алгоритмы"
@@ -948,11 +1012,12 @@ class DocxService(BaseDocumentService):
         }
 
         if student_id:
-            student = await Student.get(id=student_id).prefetch_related('group')
+            student = await Student.get(id=student_id)
+            student_group = await REFERENCE_DATA.get_or_none(Group, student.group_id)
             replacements['M'] = student.full_name
 
-            if student.group:
-                replacements['S'] = student.group.code
+            if student_group:
+                replacements['S'] = student_group.code
             else:
                 replacements['S'] = "КМБО-05-21"
         else:
@@ -960,7 +1025,7 @@ class DocxService(BaseDocumentService):
             replacements['S'] = "КМБО-05-21"
 
         if teacher_id:
-            teacher = await Teacher.get(id=teacher_id)
+            teacher = await REFERENCE_DATA.get(Teacher, teacher_id)
             replacements['B'] = teacher.full_name
         else:
             replacements['B'] = "Петров Петр Петрович"
@@ -981,12 +1046,13 @@ class DocxService(BaseDocumentService):
         replacements = {}
 
         if student_id:
-            student = await Student.get(id=student_id).prefetch_related('group')
+            student = await Student.get(id=student_id)
+            student_group = await REFERENCE_DATA.get_or_none(Group, student.group_id)
             replacements['N'] = student.full_name
             replacements['O'] = "Александрова Виктория Петровна"
 
-            if student.group:
-                replacements['M'] = student.group.code
+            if student_group:
+                replacements['M'] = student_group.code
             else:
                 replacements['M'] = "КМБО-05-21"
 
@@ -1015,14 +1081,14 @@ class DocxService(BaseDocumentService):
 
         if group_id:
             try:
-                group = await Group.get(id=group_id)
+                group = await REFERENCE_DATA.get(Group, group_id)
                 group_name_1 = group.code
             except:
                 pass
 
         if group_id_2:
             try:
-                group_2 = await Group.get(id=group_id_2)
+                group_2 = await REFERENCE_DATA.get(Group, group_id_2)
                 group_name_2 = group_2.code
             except:
                 pass
@@ -1032,9 +1098,7 @@ class DocxService(BaseDocumentService):
         date_format = "01-05-2025"
 
         if classroom_id:
-            query = ScheduleItem.filter(classroom_id=classroom_id).prefetch_related(
-                'time_slot', 'discipline', 'group', 'teacher'
-            )
+            query = ScheduleItem.filter(classroom_id=classroom_id)
 
             if day_of_week:
                 query = query.filter(day_of_week=day_of_week)
@@ -1042,17 +1106,18 @@ class DocxService(BaseDocumentService):
             schedule_items = await query.order_by('time_slot__number')
 
             if schedule_items and len(schedule_items) > 0:
+                reference = await REFERENCE_DATA.snapshot()
 
-                group_name_1 = schedule_items[0].group.code
+                group_name_1 = reference.get(Group, schedule_items[0].group_id).code
 
-                if hasattr(schedule_items[0], 'time_slot') and schedule_items[0].time_slot:
-                    time_slot_1 = schedule_items[0].time_slot
+                time_slot_1 = reference.get_or_none(TimeSlot, schedule_items[0].time_slot_id)
+                if time_slot_1:
                     time_format_1 = f"{time_slot_1.start_time} – {time_slot_1.end_time}"
 
                 if len(schedule_items) > 1:
-                    group_name_2 = schedule_items[1].group.code
-                    if hasattr(schedule_items[1], 'time_slot') and schedule_items[1].time_slot:
-                        time_slot_2 = schedule_items[1].time_slot
+                    group_name_2 = reference.get(Group, schedule_items[1].group_id).code
+                    time_slot_2 = reference.get_or_none(TimeSlot, schedule_items[1].time_slot_id)
+                    if time_slot_2:
                         time_format_2 = f"{time_slot_2.start_time} – {time_slot_2.end_time}"
 
         time_cells = []
@@ -1148,16 +1213,86 @@ class DocxService(BaseDocumentService):
                 if date_placeholder in paragraph.text:
                     paragraph.text = paragraph.text.replace(date_placeholder, date_format)
 
+    async def process_rating_system(self, document: Document, params: Dict[str, Any]) -> None:
+        """
+        Обрабатывает шаблон балльно-рейтинговой системы (БРС)
+
+        Общие замены выполняются как для произвольного шаблона. Если указана дисциплина,
+        в конец документа добавляется рейтинг студентов группы (или всех групп, если
+        группа не указана): баллы по контрольным работам, сумма, процент от максимума,
+        пропуски и оценка. Если указана дата начала семестра (start_date), итоги
+        считаются по работам, срок которых уже наступил.
+        """
+        await self.generic_default_replacing(document, params)
+
+        group_id = params.get('group_id')
+        discipline_id = params.get('discipline_id')
+        if not discipline_id:
+            return
+
+        if group_id:
+            group = await REFERENCE_DATA.get(Group, group_id)
+            students = await Student.filter(group_id=group_id).order_by('id').values_list('id', 'full_name')
+            matrix = await load_students_matrix(discipline_id, students, [group_id])
+            subject = f"группы {group.code}"
+        else:
+            matrix = await load_score_matrix(discipline_id)
+            subject = "всех групп"
+
+        if params.get('start_date'):
+            matrix.due_week = due_week(params['start_date'].date())
+        result = RATING_ENGINE.compute(matrix)
+
+        self.add_rating_table(document, subject, matrix, result)
+
+    def add_rating_table(self, document: Document, subject: str, matrix: ScoreMatrix,
+                         result: RatingResult) -> None:
+        """
+        Добавляет в конец документа таблицу рейтинга студентов
+
+        Args:
+            document: Объект документа Word
+            subject: Чей рейтинг, для заголовка ("группы КМБО-05-21", "всех групп")
+            matrix: Матрица баллов
+            result: Итоги БРС по строкам матрицы
+        """
+        heading = document.add_paragraph()
+        heading.add_run(f"2. Рейтинг студентов {subject}").bold = True
+
+        headers = ["№", "Студент"] + [f"КР {number}" for number in matrix.work_numbers] + list(SUMMARY_HEADERS)
+        template_tables = document.tables
+        table = document.add_table(rows=1, cols=len(headers))
+        # Оформление как у таблиц шаблона
+        if template_tables:
+            table.style = template_tables[0].style
+
+        for cell, text in zip(table.rows[0].cells, headers):
+            cell.text = text
+            for run in cell.paragraphs[0].runs:
+                run.bold = True
+
+        for index, name in enumerate(matrix.student_names):
+            scores = ["-" if math.isnan(score) else format_score(score) for score in matrix.scores[index]]
+            values = [index + 1, name] + scores + list(result.summary_row(index))
+            for cell, value in zip(table.add_row().cells, values):
+                cell.text = str(value)
+
+        maximums = ["" if math.isnan(max_score) else format_score(max_score) for max_score in matrix.max_scores]
+        values = ["", "Максимум"] + maximums + [format_score(result.max_total), 100, "", ""]
+        for cell, value in zip(table.add_row().cells, values):
+            cell.text = str(value)
+
     async def generic_default_replacing(self, document, params):
         self.replacements = {}
 
         group_id = params.get('group_id')
         if group_id:
-            group = await Group.get(id=group_id).prefetch_related('students')
+            group = await REFERENCE_DATA.get(Group, group_id)
+            students = await Student.filter(group_id=group_id).order_by('id')
             self.replacements.update({
                 "group": group.code,
                 "course": group.course,
-                "students": "\n".join([f"{student.full_name} ({student.email})" for student in group.students]),
+                "students": "\n".join([f"{student.full_name} ({student.email})" for student in students]),
                 "S": group.code,
                 "T": group.code,
                 "G": group.code
@@ -1165,7 +1300,8 @@ class DocxService(BaseDocumentService):
 
         student_id = params.get('student_id')
         if student_id:
-            student = await Student.get(id=student_id).prefetch_related('group')
+            student = await Student.get(id=student_id)
+            student_group = await REFERENCE_DATA.get_or_none(Group, student.group_id)
             self.replacements.update({
                 "student_name": student.full_name,
                 "student_email": student.email,
@@ -1174,16 +1310,16 @@ class DocxService(BaseDocumentService):
                 "N": student.full_name
             })
 
-            if student.group:
+            if student_group:
                 self.replacements.update({
-                    "group": student.group.code,
-                    "S": student.group.code,
-                    "T": student.group.code
+                    "group": student_group.code,
+                    "S": student_group.code,
+                    "T": student_group.code
                 })
 
         teacher_id = params.get('teacher_id')
         if teacher_id:
-            teacher = await Teacher.get(id=teacher_id)
+            teacher = await REFERENCE_DATA.get(Teacher, teacher_id)
             self.replacements.update({
                 "teacher_name": teacher.full_name,
                 "teacher_email": teacher.email,
@@ -1195,7 +1331,7 @@ class DocxService(BaseDocumentService):
 
         discipline_id = params.get('discipline_id')
         if discipline_id:
-            discipline = await Discipline.get(id=discipline_id)
+            discipline = await REFERENCE_DATA.get(Discipline, discipline_id)
             self.replacements.update({
                 "discipline": discipline.name,
                 "N": discipline.name
@@ -1261,6 +1397,20 @@ class DocxService(BaseDocumentService):
         template = await self.get_template(template_id)
         template_type = await self.determine_template_type(template_id, template.name)
 
+        return await self.process_by_type(document, template_type, params)
+
+    async def process_by_type(self, document: Document, template_type: str, params: Dict[str, Any]) -> Document:
+        """
+        Заполняет документ обработчиком, соответствующим типу шаблона
+
+        Args:
+            document: Объект документа Word
+            template_type: Тип шаблона (см. determine_template_type)
+            params: Параметры для обработки документа
+
+        Returns:
+            Обработанный документ Word
+        """
         if template_type == self.TEMPLATE_TYPE_MASTER_TITLE:
             await self.process_master_title(document, params)
         elif template_type == self.TEMPLATE_TYPE_BACHELOR_TITLE:
@@ -1293,6 +1443,8 @@ class DocxService(BaseDocumentService):
             await self.process_task(document, params)
         elif template_type == self.TEMPLATE_TYPE_CLASSROOM_SCHEDULE:
             await self.process_classroom_schedule(document, params)
+        elif template_type == self.TEMPLATE_TYPE_RATING_SYSTEM:
+            await self.process_rating_system(document, params)
         else:
             await self.generic_default_replacing(document, params)
 
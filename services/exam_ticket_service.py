@@ -0,0 +1,229 @@
+"""
+Генерация полного набора экзаменационных билетов за один запрос
+"""
+import io
+import random
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from core.executor import run_blocking
+from core.metrics import REPORT_GENERATION_SECONDS, REPORT_GENERATIONS_IN_PROGRESS
+from models.models import Discipline, ExamQuestion
+from services.docx_compose import DocxComposer, PAGE_BREAK
+from services.docx_service import DocxService
+from services.reference_data import REFERENCE_DATA
+from services.zip_stream import stream_zip
+
+FORMAT_DOCX = "docx"
+FORMAT_ZIP = "zip"
+
+
+def assign_questions(question_count: int, tickets: int, per_ticket: int, seed: int) -> List[List[int]]:
+    """
+    Равномерно распределяет вопросы по билетам
+
+    Каждый билет получает различные вопросы; вопрос попадает в следующий билет,
+    только если он использовался не чаще остальных, поэтому число использований
+    любых двух вопросов отличается не более чем на единицу. Пока вопросов
+    хватает, они не повторяются между билетами. При равенстве выбор определяется
+    seed, так что набор воспроизводим.
+
+    Args:
+        question_count: Количество вопросов
+        tickets: Количество билетов
+        per_ticket: Количество вопросов в билете
+        seed: Начальное значение генератора случайных чисел
+
+    Returns:
+        Для каждого билета — индексы вопросов по возрастанию
+
+    Raises:
+        ValueError: Если вопросов меньше, чем нужно для одного билета
+    """
+    if question_count < per_ticket:
+        raise ValueError(f"Для билета нужно {per_ticket} вопросов, а у дисциплины их {question_count}")
+
+    rng = random.Random(seed)
+    usage = [0] * question_count
+    assignment = []
+
+    for _ in range(tickets):
+        order = list(range(question_count))
+        rng.shuffle(order)
+        # Сортировка устойчива: среди одинаково использованных вопросов сохраняется случайный порядок
+        order.sort(key=lambda index: usage[index])
+
+        chosen = sorted(order[:per_ticket])
+        for index in chosen:
+            usage[index] += 1
+        assignment.append(chosen)
+
+    return assignment
+
+
+class TicketSet:
+    """Подготовленный набор билетов: шаблон, вопросы и их распределение"""
+
+    __slots__ = ("template", "template_type", "discipline", "questions", "seed", "assignment")
+
+    def __init__(self, template, template_type: str, discipline, questions: list, seed: int,
+                 assignment: List[List[int]]):
+        self.template = template
+        self.template_type = template_type
+        self.discipline = discipline
+        self.questions = questions
+        self.seed = seed
+        self.assignment = assignment
+
+    def output_filename(self, output_format: str) -> str:
+        return (f"{self.template.name}_discipline_id_{self.discipline.id}"
+                f"_tickets_{len(self.assignment)}_seed_{self.seed}.{output_format}")
+
+
+class ExamTicketSetService:
+    """
+    Сервис генерации набора экзаменационных билетов.
+
+    Вопросы дисциплины загружаются одним запросом, шаблон разбирается один раз,
+    билеты собираются в один документ с разрывами страниц или в zip-архив.
+    """
+
+    def __init__(self):
+        self.docx_service = DocxService()
+
+    async def prepare(self, template_id: int, discipline_id: int, tickets: int,
+                      questions_per_ticket: int = 3, seed: Optional[int] = None) -> TicketSet:
+        """
+        Загружает шаблон и вопросы и распределяет вопросы по билетам
+
+        Args:
+            template_id: ID шаблона экзаменационного билета
+            discipline_id: ID дисциплины
+            tickets: Количество билетов
+            questions_per_ticket: Количество вопросов в билете
+            seed: Начальное значение для распределения вопросов (если не указано, выбирается случайно)
+
+        Returns:
+            Подготовленный набор билетов
+
+        Raises:
+            ValueError: Если шаблон не является билетом, в шаблоне меньше мест для вопросов, чем
+                questions_per_ticket, или у дисциплины недостаточно вопросов
+        """
+        if questions_per_ticket > DocxService.EXAM_TICKET_QUESTION_SLOTS:
+            raise ValueError(
+                f"В шаблоне билета {DocxService.EXAM_TICKET_QUESTION_SLOTS} места для вопросов, "
+                f"запрошено {questions_per_ticket}"
+            )
+
+        service = self.docx_service
+        template = await service.get_template(template_id)
+        template_type = await service.get_template_type(template)
+
+        if template_type != DocxService.TEMPLATE_TYPE_EXAM_TICKET:
+            raise ValueError(f"Шаблон {template.name} не является шаблоном экзаменационного билета")
+
+        discipline = await REFERENCE_DATA.get(Discipline, discipline_id)
+        questions = await ExamQuestion.filter(discipline_id=discipline_id).order_by('number')
+
+        if not questions:
+            raise ValueError(f"У дисциплины {discipline.name} нет вопросов к экзамену")
+
+        if seed is None:
+            seed = random.randrange(2 ** 31)
+
+        assignment = assign_questions(len(questions), tickets, questions_per_ticket, seed)
+        return TicketSet(template, template_type, discipline, questions, seed, assignment)
+
+    async def _fill_tickets(self, ticket_set: TicketSet, document) -> AsyncIterator[int]:
+        """Заполняет документ очередным билетом и возвращает его номер"""
+        for number, indexes in enumerate(ticket_set.assignment, start=1):
+            await self.docx_service.process_by_type(document, ticket_set.template_type, {
+                'template_id': ticket_set.template.id,
+                'discipline_id': ticket_set.discipline.id,
+                'discipline_name': ticket_set.discipline.name,
+                'ticket_number': number,
+                'questions': [ticket_set.questions[index].text for index in indexes],
+            })
+            yield number
+
+    async def ticket_files(self, ticket_set: TicketSet) -> AsyncIterator[Tuple[str, bytes]]:
+        """
+        Генерирует билеты по одному в виде отдельных DOCX-файлов
+
+        Args:
+            ticket_set: Подготовленный набор билетов
+
+        Yields:
+            Пары (имя файла, содержимое)
+        """
+        service = self.docx_service
+
+        with REPORT_GENERATIONS_IN_PROGRESS.track_inprogress(), \
+                REPORT_GENERATION_SECONDS.time(template_type="exam_ticket_set"):
+            document = await service.load_document(service.template_path(ticket_set.template))
+            composer = await run_blocking(DocxComposer, document)
+
+            async for number in self._fill_tickets(ticket_set, document):
+                buffer = io.BytesIO()
+                await service.save_document(document, buffer)
+                await run_blocking(composer.reset)
+                yield f"Билет {number}.docx", buffer.getvalue()
+
+    async def generate(self, template_id: int, discipline_id: int, tickets: int,
+                       questions_per_ticket: int = 3, seed: Optional[int] = None,
+                       output_format: str = FORMAT_DOCX) -> Dict[str, Any]:
+        """
+        Генерирует набор билетов и сохраняет его в OUTPUT_DIR
+
+        Args:
+            template_id: ID шаблона экзаменационного билета
+            discipline_id: ID дисциплины
+            tickets: Количество билетов
+            questions_per_ticket: Количество вопросов в билете
+            seed: Начальное значение для распределения вопросов (если не указано, выбирается случайно)
+            output_format: docx — один документ, zip — архив с отдельным файлом на каждый билет
+
+        Returns:
+            Dict с путем к файлу, seed и номерами вопросов каждого билета
+        """
+        if output_format not in (FORMAT_DOCX, FORMAT_ZIP):
+            raise ValueError(f"Неподдерживаемый формат: {output_format}")
+
+        service = self.docx_service
+        ticket_set = await self.prepare(template_id, discipline_id, tickets, questions_per_ticket, seed)
+        output_filename = ticket_set.output_filename(output_format)
+
+        if output_format == FORMAT_ZIP:
+            async def write_zip(path: str) -> None:
+                with open(path, "wb") as f:
+                    async for chunk in stream_zip(self.ticket_files(ticket_set)):
+                        await run_blocking(f.write, chunk)
+
+            file_path = await service.write_output(output_filename, write_zip)
+        else:
+            with REPORT_GENERATIONS_IN_PROGRESS.track_inprogress(), \
+                    REPORT_GENERATION_SECONDS.time(template_type="exam_ticket_set"):
+                document = await service.load_document(service.template_path(ticket_set.template))
+                # Копирование XML-элементов шаблона и сборка документа выполняются в пуле рендеринга,
+                # поэтому цикл событий получает управление после каждого билета
+                composer = await run_blocking(DocxComposer, document)
+
+                async for _ in self._fill_tickets(ticket_set, document):
+                    await run_blocking(composer.commit)
+
+                await run_blocking(composer.compose, PAGE_BREAK)
+                file_path = await service.write_output(
+                    output_filename,
+                    lambda path: service.save_document(document, path)
+                )
+
+        return {
+            "message": "Набор билетов успешно сгенерирован и сохранён!",
+            "file_path": file_path,
+            "file_type": output_format,
+            "seed": ticket_set.seed,
+            "tickets": [
+                {"ticket_number": number, "questions": [ticket_set.questions[index].number for index in indexes]}
+                for number, indexes in enumerate(ticket_set.assignment, start=1)
+            ]
+        }
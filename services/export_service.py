@@ -0,0 +1,217 @@
+"""
+Потоковая выгрузка оценок и расписания в CSV и NDJSON.
+
+Строки читаются курсором на стороне СУБД порциями по EXPORT_FETCH_SIZE и сразу
+передаются клиенту, поэтому память не зависит от объема выгрузки, а первые байты
+(заголовок CSV) отправляются до выполнения запроса.
+
+PostgreSQL: серверный курсор asyncpg в транзакции только для чтения на соединении
+из пула "replica". SQLite: отдельное соединение aiosqlite только для чтения, чтобы
+выгрузка не занимала общее соединение Tortoise на все время передачи.
+"""
+import csv
+import io
+import json
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+import aiosqlite
+from tortoise import Tortoise
+
+from core.config import settings
+from core.metrics import EXPORT_ROWS
+
+EXPORT_FORMATS = ("csv", "ndjson")
+
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+GRADE_COLUMNS = (
+    "group_id", "group_code", "student_id", "student", "email", "discipline_id", "discipline",
+    "control_work_id", "work_number", "week", "max_score", "score", "date"
+)
+
+# {filters} заменяется условиями фильтров
+GRADES_SQL = """
+SELECT s.group_id, gr.code AS group_code, s.id AS student_id, s.full_name AS student, s.email,
+       cw.discipline_id, d.name AS discipline, cw.id AS control_work_id, cw.number AS work_number,
+       cw.week, cw.max_score, g.score, g.date
+FROM grades g
+JOIN students s ON s.id = g.student_id
+JOIN control_works cw ON cw.id = g.control_work_id
+LEFT JOIN disciplines d ON d.id = cw.discipline_id
+LEFT JOIN "groups" gr ON gr.id = s.group_id
+WHERE 1 = 1{filters}
+ORDER BY s.group_id, cw.discipline_id, s.id, cw.number, g.id
+"""
+
+SCHEDULE_COLUMNS = (
+    "id", "day_of_week", "week_type", "time_slot", "start_time", "end_time", "discipline_id", "discipline",
+    "is_lecture", "group_id", "group_code", "teacher_id", "teacher", "classroom_id", "classroom"
+)
+
+SCHEDULE_SQL = """
+SELECT si.id, si.day_of_week, si.week_type, ts.number AS time_slot, ts.start_time, ts.end_time,
+       si.discipline_id, d.name AS discipline, si.is_lecture, si.group_id, gr.code AS group_code,
+       si.teacher_id, t.full_name AS teacher, si.classroom_id, c.name AS classroom
+FROM schedule_items si
+JOIN time_slots ts ON ts.id = si.time_slot_id
+JOIN disciplines d ON d.id = si.discipline_id
+JOIN "groups" gr ON gr.id = si.group_id
+JOIN teachers t ON t.id = si.teacher_id
+LEFT JOIN classrooms c ON c.id = si.classroom_id
+WHERE 1 = 1{filters}
+ORDER BY si.day_of_week, ts.number, gr.code, si.id
+"""
+
+
+async def encode_rows(rows: AsyncIterator[Dict[str, Any]], columns: Sequence[str], format: str,
+                      export: str) -> AsyncIterator[bytes]:
+    """
+    Кодирует поток строк в CSV или NDJSON
+
+    Заголовок CSV и первая строка отдаются сразу, остальные строки — фрагментами по EXPORT_FETCH_SIZE.
+
+    Args:
+        rows: Асинхронный поток строк
+        columns: Порядок колонок
+        format: csv или ndjson
+        export: Название выгрузки для метрик
+
+    Yields:
+        Фрагменты ответа в UTF-8
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+
+    def drain() -> bytes:
+        data = buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+        return data
+
+    if format == "csv":
+        writer.writerow(columns)
+        yield drain()
+
+    pending = 0
+    first = True
+    async for row in rows:
+        if format == "csv":
+            writer.writerow(["" if row[column] is None else row[column] for column in columns])
+        else:
+            buffer.write(json.dumps({column: row[column] for column in columns}, ensure_ascii=False, default=str))
+            buffer.write("\n")
+        pending += 1
+        # Первая строка отдается сразу, остальные — фрагментами
+        if first or pending >= settings.EXPORT_FETCH_SIZE:
+            EXPORT_ROWS.inc(pending, export=export)
+            pending = 0
+            first = False
+            yield drain()
+
+    if pending:
+        EXPORT_ROWS.inc(pending, export=export)
+        yield drain()
+
+
+class ExportService:
+    """Выгрузка строк курсором на стороне СУБД"""
+
+    def __init__(self, connection_name: str = "replica"):
+        self.connection_name = connection_name
+
+    async def stream_query(self, sql: str, values: List[Any]) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Выполняет запрос и отдает строки по мере чтения курсором
+
+        Args:
+            sql: Запрос с плейсхолдерами СУБД (см. _filters)
+            values: Значения плейсхолдеров
+
+        Yields:
+            Строки результата в виде словарей
+        """
+        client = Tortoise.get_connection(self.connection_name)
+        fetch_size = settings.EXPORT_FETCH_SIZE
+
+        if client.capabilities.dialect == "postgres":
+            async with client.acquire_connection() as connection:
+                # Серверный курсор asyncpg существует только внутри транзакции
+                async with connection.transaction(readonly=True):
+                    async for record in connection.cursor(sql, *values, prefetch=fetch_size):
+                        yield dict(record)
+            return
+
+        if client.filename == ":memory:":
+            # Базу в памяти видит только соединение Tortoise
+            async with client.acquire_connection() as connection:
+                async with connection.execute(sql, values) as cursor:
+                    cursor.arraysize = fetch_size
+                    async for row in cursor:
+                        yield dict(row)
+            return
+
+        uri = Path(client.filename).absolute().as_uri() + "?mode=ro"
+        async with aiosqlite.connect(uri, uri=True) as connection:
+            connection.row_factory = aiosqlite.Row
+            async with connection.execute(sql, values) as cursor:
+                cursor.arraysize = fetch_size
+                async for row in cursor:
+                    yield dict(row)
+
+    async def grades(self, group_id: Optional[int] = None, discipline_id: Optional[int] = None,
+                     student_id: Optional[int] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Оценки студентов по контрольным работам (строка на оценку)
+
+        Args:
+            group_id: ID группы (опционально)
+            discipline_id: ID дисциплины (опционально)
+            student_id: ID студента (опционально)
+
+        Yields:
+            Строки с колонками GRADE_COLUMNS
+        """
+        filters, values = self._filters(
+            ("s.group_id", group_id), ("cw.discipline_id", discipline_id), ("s.id", student_id)
+        )
+        async for row in self.stream_query(GRADES_SQL.format(filters=filters), values):
+            yield row
+
+    async def schedule(self, group_id: Optional[int] = None, teacher_id: Optional[int] = None,
+                       classroom_id: Optional[int] = None,
+                       day_of_week: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Занятия расписания (строка на занятие)
+
+        Args:
+            group_id: ID группы (опционально)
+            teacher_id: ID преподавателя (опционально)
+            classroom_id: ID аудитории (опционально)
+            day_of_week: День недели (опционально)
+
+        Yields:
+            Строки с колонками SCHEDULE_COLUMNS
+        """
+        filters, values = self._filters(
+            ("si.group_id", group_id), ("si.teacher_id", teacher_id),
+            ("si.classroom_id", classroom_id), ("si.day_of_week", day_of_week)
+        )
+        async for row in self.stream_query(SCHEDULE_SQL.format(filters=filters), values):
+            # В SQLite логические значения хранятся как 0/1
+            row["is_lecture"] = bool(row["is_lecture"])
+            yield row
+
+    def _filters(self, *conditions: Tuple[str, Any]) -> Tuple[str, List[Any]]:
+        """Условия WHERE для заданных значений фильтров (колонка, значение) и значения плейсхолдеров"""
+        postgres = Tortoise.get_connection(self.connection_name).capabilities.dialect == "postgres"
+        filters = ""
+        values: List[Any] = []
+        for column, value in conditions:
+            if value is not None:
+                values.append(value)
+                filters += f" AND {column} = {f'${len(values)}' if postgres else '?'}"
+        return filters, values
@@ -0,0 +1,241 @@
+"""
+Полнотекстовый поиск по вопросам к экзамену и литературе всех дисциплин.
+
+PostgreSQL: выражения to_tsvector по exam_questions.text и literature.title/authors
+с GIN-индексами (создаются ensure_schema), запрос — websearch_to_tsquery,
+ранжирование — ts_rank. Конфигурация словаря задается FULLTEXT_CONFIG.
+
+SQLite (локальный запуск): таблицы FTS5 exam_questions_fts и literature_fts,
+синхронизируемые триггерами, ранжирование — bm25. Слова запроса ищутся
+по началу слова, "ё" и "е" не различаются.
+
+Поиск никогда не выполняет LIKE '%…%' по исходным таблицам.
+"""
+import re
+from typing import Any, Dict, Iterable, List, Optional
+
+from tortoise import Tortoise
+
+from core.config import settings
+
+FULLTEXT_KINDS = ("exam_question", "literature")
+
+_WORD = re.compile(r"\w+")
+
+# Выражения tsvector должны совпадать в индексах и запросах, иначе индекс не используется
+PG_VECTORS = {
+    "exam_question": "to_tsvector('{config}', eq.text)",
+    "literature": "to_tsvector('{config}', l.title || ' ' || coalesce(l.authors, ''))",
+}
+
+PG_SCHEMA = (
+    "CREATE INDEX IF NOT EXISTS exam_questions_text_fts ON exam_questions "
+    "USING GIN (to_tsvector('{config}', text))",
+    "CREATE INDEX IF NOT EXISTS literature_title_authors_fts ON literature "
+    "USING GIN (to_tsvector('{config}', title || ' ' || coalesce(authors, '')))",
+)
+
+# Текст в FTS5 хранится с заменой "ё" на "е"; регистр приводит токенизатор unicode61
+_SQLITE_FOLD = "replace(replace({column}, 'ё', 'е'), 'Ё', 'Е')"
+
+SQLITE_TABLES = {
+    "exam_questions_fts": {
+        "source": "exam_questions",
+        "columns": ("text",),
+    },
+    "literature_fts": {
+        "source": "literature",
+        "columns": ("title", "authors"),
+    },
+}
+
+# Общие колонки результата обеих ветвей UNION ALL
+EXAM_QUESTION_COLUMNS = (
+    "'exam_question' AS type, eq.id, eq.discipline_id, d.name AS discipline_name, eq.number, eq.text, "
+    "NULL AS title, NULL AS authors, NULL AS year"
+)
+LITERATURE_COLUMNS = (
+    "'literature' AS type, l.id, l.discipline_id, d.name AS discipline_name, NULL AS number, NULL AS text, "
+    "l.title, l.authors, l.year"
+)
+PG_EXAM_QUESTION_COLUMNS = (
+    "'exam_question' AS type, eq.id, eq.discipline_id, d.name AS discipline_name, eq.number, eq.text, "
+    "NULL::varchar AS title, NULL::varchar AS authors, NULL::int AS year"
+)
+PG_LITERATURE_COLUMNS = (
+    "'literature' AS type, l.id, l.discipline_id, d.name AS discipline_name, NULL::int AS number, NULL::text AS text, "
+    "l.title, l.authors, l.year"
+)
+
+
+def text_search_config() -> str:
+    """Имя конфигурации полнотекстового поиска PostgreSQL (подставляется в SQL как литерал)"""
+    config = settings.FULLTEXT_CONFIG
+    if not re.fullmatch(r"[a-z_]+", config):
+        raise ValueError(f"Некорректная конфигурация полнотекстового поиска: {config}")
+    return config
+
+
+def fts5_query(query: str) -> str:
+    """
+    Преобразует строку поиска в выражение MATCH FTS5: все слова, каждое — по началу слова
+
+    Args:
+        query: Строка поиска
+
+    Returns:
+        Выражение MATCH или пустая строка, если в запросе нет слов
+    """
+    words = _WORD.findall(query.casefold().replace("ё", "е"))
+    return " ".join(f'"{word}"*' for word in words)
+
+
+async def ensure_schema(connection_name: str = "default") -> None:
+    """
+    Создает индексы (PostgreSQL) или таблицы FTS5 с триггерами (SQLite); повторный вызов ничего не меняет
+
+    Args:
+        connection_name: Соединение с правом записи
+    """
+    connection = Tortoise.get_connection(connection_name)
+
+    if connection.capabilities.dialect == "postgres":
+        config = text_search_config()
+        for statement in PG_SCHEMA:
+            await connection.execute_script(statement.format(config=config))
+        return
+
+    if connection.capabilities.dialect != "sqlite":
+        return
+
+    for table, spec in SQLITE_TABLES.items():
+        source = spec["source"]
+        columns = spec["columns"]
+        folded = ", ".join(_SQLITE_FOLD.format(column=f"new.{column}") for column in columns)
+        column_list = ", ".join(columns)
+
+        _, existing = await connection.execute_query(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name = ?", [table]
+        )
+
+        statements = [
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5({column_list}, tokenize='unicode61')",
+            f"CREATE TRIGGER IF NOT EXISTS {table}_ai AFTER INSERT ON {source} BEGIN "
+            f"INSERT INTO {table}(rowid, {column_list}) VALUES (new.id, {folded}); END",
+            f"CREATE TRIGGER IF NOT EXISTS {table}_ad AFTER DELETE ON {source} BEGIN "
+            f"DELETE FROM {table} WHERE rowid = old.id; END",
+            f"CREATE TRIGGER IF NOT EXISTS {table}_au AFTER UPDATE ON {source} BEGIN "
+            f"DELETE FROM {table} WHERE rowid = old.id; "
+            f"INSERT INTO {table}(rowid, {column_list}) VALUES (new.id, {folded}); END",
+        ]
+        if not existing:
+            # Таблица создается впервые — индексируем уже существующие записи
+            source_folded = ", ".join(_SQLITE_FOLD.format(column=column) for column in columns)
+            statements.append(
+                f"INSERT INTO {table}(rowid, {column_list}) SELECT id, {source_folded} FROM {source}"
+            )
+
+        for statement in statements:
+            await connection.execute_script(statement)
+
+
+class FullTextSearchService:
+    """Полнотекстовый поиск по вопросам к экзамену и литературе"""
+
+    def __init__(self, connection_name: str = "replica"):
+        self.connection_name = connection_name
+        self._sqlite_schema_ready = False
+
+    async def search(self, query: str, kinds: Iterable[str] = FULLTEXT_KINDS, discipline_id: Optional[int] = None,
+                     limit: int = 20, offset: int = 0) -> List[Dict[str, Any]]:
+        """
+        Ищет вопросы к экзамену и литературу по словам запроса
+
+        Args:
+            query: Строка поиска
+            kinds: Типы записей (exam_question, literature)
+            discipline_id: ID дисциплины (опционально)
+            limit: Размер страницы
+            offset: Количество пропускаемых результатов
+
+        Returns:
+            Результаты по убыванию релевантности (score)
+        """
+        kinds = [kind for kind in FULLTEXT_KINDS if kind in set(kinds)]
+        connection = Tortoise.get_connection(self.connection_name)
+        postgres = connection.capabilities.dialect == "postgres"
+        values: List[Any] = []
+
+        def placeholder(value: Any) -> str:
+            values.append(value)
+            return f"${len(values)}" if postgres else "?"
+
+        if postgres:
+            config = text_search_config()
+            query_placeholder = placeholder(query)
+            tsquery = f"websearch_to_tsquery('{config}', {query_placeholder})"
+            sources = {
+                "exam_question": (PG_EXAM_QUESTION_COLUMNS, "exam_questions eq", "eq"),
+                "literature": (PG_LITERATURE_COLUMNS, "literature l", "l"),
+            }
+            branches = []
+            for kind in kinds:
+                columns, source, alias = sources[kind]
+                vector = PG_VECTORS[kind].format(config=config)
+                condition = f"{vector} @@ {tsquery}"
+                if discipline_id is not None:
+                    condition += f" AND {alias}.discipline_id = {placeholder(discipline_id)}"
+                branches.append(
+                    f"SELECT {columns}, ts_rank({vector}, {tsquery}) AS score "
+                    f"FROM {source} LEFT JOIN disciplines d ON d.id = {alias}.discipline_id "
+                    f"WHERE {condition}"
+                )
+        else:
+            match = fts5_query(query)
+            if not match:
+                return []
+            if not self._sqlite_schema_ready:
+                # Локальная база могла быть создана без init_db.py
+                await ensure_schema("default")
+                self._sqlite_schema_ready = True
+            sources = {
+                "exam_question": (EXAM_QUESTION_COLUMNS, "exam_questions_fts", "exam_questions eq", "eq"),
+                "literature": (LITERATURE_COLUMNS, "literature_fts", "literature l", "l"),
+            }
+            branches = []
+            for kind in kinds:
+                columns, fts_table, source, alias = sources[kind]
+                condition = f"{fts_table} MATCH {placeholder(match)}"
+                if discipline_id is not None:
+                    condition += f" AND {alias}.discipline_id = {placeholder(discipline_id)}"
+                branches.append(
+                    f"SELECT {columns}, -bm25({fts_table}) AS score "
+                    f"FROM {fts_table} JOIN {source} ON {alias}.id = {fts_table}.rowid "
+                    f"LEFT JOIN disciplines d ON d.id = {alias}.discipline_id "
+                    f"WHERE {condition}"
+                )
+
+        if not branches:
+            return []
+
+        sql = (
+            f"SELECT * FROM ({' UNION ALL '.join(branches)}) results "
+            f"ORDER BY score DESC, type, id LIMIT {placeholder(limit)} OFFSET {placeholder(offset)}"
+        )
+        rows = await connection.execute_query_dict(sql, values)
+
+        results = []
+        for row in rows:
+            result = {
+                "type": row["type"],
+                "id": row["id"],
+                "discipline_id": row["discipline_id"],
+                "discipline": row["discipline_name"],
+                "score": float(row["score"]),
+            }
+            if row["type"] == "exam_question":
+                result.update(number=row["number"], text=row["text"])
+            else:
+                result.update(title=row["title"], authors=row["authors"], year=row["year"])
+            results.append(result)
+        return results
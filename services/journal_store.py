@@ -0,0 +1,357 @@
+"""
+Последние сгенерированные журналы оценок и их точечное обновление.
+
+Для каждой пары (группа, дисциплина) хранится последний сгенерированный
+журнал: путь к файлу в OUTPUT_DIR, матрица баллов и карта ячеек (строка
+каждого студента, колонка каждой контрольной работы, колонки итогов БРС).
+
+При изменении оценки через ORM журнал не генерируется заново: баллы группы
+перечитываются, и в сохраненном xlsx переписываются только ячейки, значения
+которых изменились, и итоговые колонки этих студентов. Повторный запрос того же
+журнала получает обновленный файл без генерации, пока версии таблиц, от которых
+он зависит, совпадают с версиями на момент последнего обновления. Изменения
+студентов, групп, дисциплин, контрольных работ и файла шаблона делают журнал
+недействительным — он генерируется заново. Версия таблицы оценок общая для всех групп, поэтому ее
+изменение (например, оценка, выставленная другим воркером) не сбрасывает журнал:
+при запросе баллы группы перечитываются, и файл обновляется точечно.
+"""
+import asyncio
+import logging
+import math
+import os
+import uuid
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from tortoise.signals import post_delete, post_save
+
+from core.config import settings
+from core.database import replica_may_lag, use_primary
+from core.executor import run_blocking
+from core.metrics import CACHE_REQUESTS, JOURNAL_PATCHES
+from core.preload import import_module
+from core.table_versions import get_version
+from models.models import Grade
+from services.output_cache import OutputCache
+from services.output_manager import OUTPUT_MANAGER
+from services.rating_engine import (
+    RATING_ENGINE, RatingResult, ScoreMatrix, due_week, format_score, load_students_matrix
+)
+
+logger = logging.getLogger(__name__)
+
+# Таблицы, от которых зависит содержимое журнала
+JOURNAL_TABLES = ("grades", "students", "groups", "disciplines", "control_works")
+
+# Таблицы, изменение которых делает недействительной карту ячеек журнала
+STRUCTURE_TABLES = tuple(table for table in JOURNAL_TABLES if table != "grades")
+
+
+class JournalSheet:
+    """Карта ячеек журнала на одном листе"""
+
+    __slots__ = ("title", "student_rows", "work_cols", "summary_col")
+
+    def __init__(self, title: str, student_rows: List[int], work_cols: List[Optional[int]],
+                 summary_col: Optional[int]):
+        self.title = title
+        # Строка каждого студента в порядке строк матрицы (студенты без строки не выводятся)
+        self.student_rows = student_rows
+        # Колонка каждой работы в порядке колонок матрицы; None — неделя работы вне журнала
+        self.work_cols = work_cols
+        # Первая итоговая колонка БРС; None — итоги не выводились
+        self.summary_col = summary_col
+
+
+class StoredJournal:
+    """Последний сгенерированный журнал пары (группа, дисциплина)"""
+
+    __slots__ = ("key", "params", "output_path", "sheets", "matrix", "versions", "template_hash", "generated_on",
+                 "dirty")
+
+    def __init__(self, key: Tuple[int, int], params: Tuple, output_path: str, sheets: List[JournalSheet],
+                 matrix: ScoreMatrix, versions: Dict[str, str], template_hash: Optional[str]):
+        self.key = key
+        self.params = params
+        self.output_path = output_path
+        self.sheets = sheets
+        self.matrix = matrix
+        self.versions = versions
+        # Хэш содержимого шаблона, по которому сгенерирован файл
+        self.template_hash = template_hash
+        self.generated_on = date.today()
+        # Оценки изменились, файл ожидает обновления
+        self.dirty = False
+
+
+def journal_versions(tables: Sequence[str] = JOURNAL_TABLES) -> Dict[str, str]:
+    """Текущие версии таблиц журнала (или заданных таблиц из JOURNAL_TABLES)"""
+    return {table: get_version(table) for table in tables}
+
+
+def cell_value(matrix: ScoreMatrix, row: int, works: Sequence[int]):
+    """
+    Значение ячейки журнала: балл последней по порядку сданной работы колонки или "-"
+
+    Args:
+        matrix: Матрица баллов
+        row: Строка матрицы
+        works: Колонки матрицы (работы), выводимые в эту ячейку
+    """
+    value = "-"
+    for j in works:
+        score = matrix.scores[row, j]
+        if not math.isnan(score):
+            value = format_score(score)
+    return value
+
+
+def patch_workbook(journal: StoredJournal, cells: Sequence[Tuple[int, int]], rows: Sequence[int],
+                   result: RatingResult) -> str:
+    """
+    Переписывает измененные ячейки сохраненного журнала во временный файл
+
+    Args:
+        journal: Сохраненный журнал с уже обновленной матрицей
+        cells: Измененные ячейки матрицы (строка, колонка)
+        rows: Строки матрицы, итоги которых нужно переписать
+        result: Итоги БРС по обновленной матрице
+
+    Returns:
+        Путь к временному файлу в OUTPUT_DIR
+    """
+    openpyxl = import_module("openpyxl")
+    workbook = openpyxl.load_workbook(journal.output_path)
+
+    for sheet in journal.sheets:
+        worksheet = workbook[sheet.title]
+
+        # Несколько работ одной недели выводятся в одну ячейку
+        works_by_col: Dict[int, List[int]] = {}
+        for j, col in enumerate(sheet.work_cols):
+            if col is not None:
+                works_by_col.setdefault(col, []).append(j)
+
+        for i, j in cells:
+            col = sheet.work_cols[j]
+            if col is None or i >= len(sheet.student_rows):
+                continue
+            worksheet.cell(row=sheet.student_rows[i], column=col).value = \
+                cell_value(journal.matrix, i, works_by_col[col])
+
+        if sheet.summary_col is not None:
+            for i in rows:
+                if i >= len(sheet.student_rows):
+                    continue
+                for offset, value in enumerate(result.summary_row(i)):
+                    worksheet.cell(row=sheet.student_rows[i], column=sheet.summary_col + offset).value = value
+
+    tmp_path = os.path.join(os.path.dirname(journal.output_path), f".{uuid.uuid4().hex}.tmp")
+    try:
+        workbook.save(tmp_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return tmp_path
+
+
+class JournalStore:
+    """Последние журналы по парам (группа, дисциплина) с точечным обновлением при изменении оценок"""
+
+    def __init__(self, max_entries: int, patch_delay: float):
+        self.max_entries = max_entries
+        self.patch_delay = patch_delay
+        self._entries: "OrderedDict[Tuple[int, int], StoredJournal]" = OrderedDict()
+        self._flush_task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def remember(self, params: Dict[str, Any], output_path: str, sheets: List[JournalSheet],
+                 matrix: ScoreMatrix, versions: Dict[str, str], template_hash: Optional[str]) -> None:
+        """
+        Запоминает сгенерированный журнал
+
+        Args:
+            params: Параметры генерации (group_id, discipline_id, ...)
+            output_path: Путь к файлу журнала
+            sheets: Карты ячеек листов
+            matrix: Матрица баллов, по которой заполнен журнал
+            versions: Версии таблиц журнала, снятые до чтения данных
+            template_hash: Хэш шаблона, загруженного для генерации (см. OutputCache.template_hash)
+        """
+        # Журнал, прочитанный с отстающей реплики, нельзя сохранять под новыми версиями таблиц
+        if not self.enabled or not sheets or replica_may_lag(JOURNAL_TABLES):
+            return
+
+        key = (params['group_id'], params['discipline_id'])
+        self._entries[key] = StoredJournal(
+            key, self.params_key(params), output_path, sheets, matrix, versions, template_hash
+        )
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    @staticmethod
+    def params_key(params: Dict[str, Any]) -> Tuple:
+        return tuple(sorted((key, value) for key, value in params.items() if value is not None))
+
+    def forget(self, key: Tuple[int, int]) -> None:
+        self._entries.pop(key, None)
+
+    async def lookup(self, params: Dict[str, Any], template_file: str) -> Optional[str]:
+        """
+        Возвращает путь к актуальному сохраненному журналу с теми же параметрами
+
+        Args:
+            params: Параметры запроса отчета
+            template_file: Имя файла шаблона
+
+        Returns:
+            Путь к файлу или None, если журнал нужно сгенерировать
+        """
+        if not self.enabled or params.get('group_id') is None or params.get('discipline_id') is None:
+            return None
+
+        journal = self._entries.get((params['group_id'], params['discipline_id']))
+        if journal is None or journal.params != self.params_key(params):
+            return None
+        # Шаблон изменен (горячая перезагрузка, загрузка через админку) — журнал генерируется заново
+        if journal.template_hash != OutputCache.template_hash(template_file):
+            self.forget(journal.key)
+            return None
+        # Без start_date журнал начинается с даты генерации
+        if params.get('start_date') is None and journal.generated_on != date.today():
+            return None
+        # С наступлением новой недели журнала меняется набор работ, по которым считаются итоги
+        if params.get('start_date') is not None and journal.matrix.due_week != due_week(params['start_date'].date()):
+            return None
+
+        if journal.dirty and self._flush_task is not None:
+            await asyncio.shield(self._flush_task)
+        elif journal.versions["grades"] != get_version("grades") and self._entries.get(journal.key) is journal:
+            # Оценки менялись в другом воркере или в других группах — перечитываем баллы группы
+            try:
+                await self.patch(journal)
+            except Exception:
+                logger.exception("Не удалось обновить журнал %s", journal.output_path)
+                self.forget(journal.key)
+                JOURNAL_PATCHES.inc(result="failed")
+
+        current = self._entries.get(journal.key) is journal and not journal.dirty \
+            and all(journal.versions[table] == version for table, version in journal_versions(STRUCTURE_TABLES).items()) \
+            and os.path.exists(journal.output_path)
+        CACHE_REQUESTS.inc(cache="journal", result="hit" if current else "miss")
+        return journal.output_path if current else None
+
+    def grade_changed(self, student_id: int, control_work_id: int) -> None:
+        """
+        Отмечает журналы, содержащие ячейку оценки, и планирует их обновление
+
+        Args:
+            student_id: ID студента
+            control_work_id: ID контрольной работы
+        """
+        marked = False
+        for journal in self._entries.values():
+            matrix = journal.matrix
+            if np.any(matrix.student_ids == student_id) and np.any(matrix.work_ids == control_work_id):
+                journal.dirty = True
+                marked = True
+
+        if marked and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        # Оценки обычно выставляются сериями — обновляем файл один раз за серию.
+        # Изменения во время обновления обрабатываются следующим проходом
+        while True:
+            await asyncio.sleep(self.patch_delay)
+            dirty = [journal for journal in self._entries.values() if journal.dirty]
+            if not dirty:
+                return
+            for journal in dirty:
+                try:
+                    await self.patch(journal)
+                except Exception:
+                    logger.exception("Не удалось обновить журнал %s", journal.output_path)
+                    self.forget(journal.key)
+                    JOURNAL_PATCHES.inc(result="failed")
+
+    async def patch(self, journal: StoredJournal) -> None:
+        """
+        Перечитывает баллы группы и переписывает в файле журнала только изменившиеся ячейки
+
+        Args:
+            journal: Сохраненный журнал
+        """
+        versions = journal_versions()
+        journal.dirty = False
+
+        # Состав группы, дисциплина или работы изменились — карта ячеек недействительна
+        if any(versions[table] != journal.versions[table] for table in STRUCTURE_TABLES):
+            self.forget(journal.key)
+            JOURNAL_PATCHES.inc(result="invalidated")
+            return
+
+        old = journal.matrix
+        with use_primary():
+            matrix = await load_students_matrix(
+                journal.key[1], list(zip(old.student_ids.tolist(), old.student_names)), [journal.key[0]]
+            )
+        if not np.array_equal(matrix.work_ids, old.work_ids):
+            self.forget(journal.key)
+            JOURNAL_PATCHES.inc(result="invalidated")
+            return
+
+        changed = ~((matrix.scores == old.scores) | (np.isnan(matrix.scores) & np.isnan(old.scores)))
+        cells = list(zip(*(axis.tolist() for axis in np.nonzero(changed))))
+        if not cells:
+            journal.versions = versions
+            JOURNAL_PATCHES.inc(result="unchanged")
+            return
+
+        previous = RATING_ENGINE.compute(old)
+        old.scores[:] = matrix.scores
+        result = RATING_ENGINE.compute(old)
+
+        # Первая оценка за еще не наступившую неделю (или удаление последней) меняет максимум
+        # и пропуски у всех студентов — итоги переписываются во всех строках
+        if previous.max_total != result.max_total or not np.array_equal(previous.due, result.due):
+            rows = list(range(len(old.student_ids)))
+        else:
+            rows = sorted({i for i, _ in cells})
+
+        try:
+            tmp_path = await run_blocking(patch_workbook, journal, cells, rows, result)
+        except FileNotFoundError:
+            # Файл вытеснен из OUTPUT_DIR
+            self.forget(journal.key)
+            JOURNAL_PATCHES.inc(result="invalidated")
+            return
+
+        # Журнал могли сгенерировать заново, пока обновлялся файл
+        if self._entries.get(journal.key) is not journal:
+            os.remove(tmp_path)
+            return
+        os.replace(tmp_path, journal.output_path)
+        OUTPUT_MANAGER.register(journal.output_path)
+        journal.versions = versions
+        JOURNAL_PATCHES.inc(result="patched")
+
+
+JOURNAL_STORE = JournalStore(settings.JOURNAL_STORE_MAX_ENTRIES, settings.JOURNAL_PATCH_DELAY)
+
+
+@post_save(Grade)
+async def _on_grade_saved(sender, instance, created, using_db, update_fields) -> None:
+    JOURNAL_STORE.grade_changed(instance.student_id, instance.control_work_id)
+
+
+@post_delete(Grade)
+async def _on_grade_deleted(sender, instance, using_db) -> None:
+    JOURNAL_STORE.grade_changed(instance.student_id, instance.control_work_id)
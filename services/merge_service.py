@@ -0,0 +1,91 @@
+"""
+Слияние: один DOCX-шаблон, заполненный по нескольким наборам параметров
+"""
+import hashlib
+import json
+from typing import Any, Dict, List
+
+from core.executor import run_blocking
+from core.metrics import REPORT_GENERATION_SECONDS, REPORT_GENERATIONS_IN_PROGRESS
+from services.docx_compose import DocxComposer, SECTION_BREAK
+from services.docx_service import DocxService
+
+
+class MergeService:
+    """
+    Сервис слияния документов.
+
+    Шаблон разбирается один раз; каждый набор параметров обрабатывается
+    обработчиком DocxService для типа шаблона, а заполненные копии
+    объединяются в один документ с разрывами разделов. Стили, нумерация
+    и колонтитулы остаются общими для всех копий.
+    """
+
+    def __init__(self):
+        self.docx_service = DocxService()
+
+    async def generate_output_filename(self, template_name: str, entries: List[Dict[str, Any]]) -> str:
+        """
+        Формирует имя файла, однозначно определяемое набором параметров
+
+        Args:
+            template_name: Название шаблона
+            entries: Наборы параметров
+
+        Returns:
+            Имя выходного файла
+        """
+        digest = hashlib.sha1(
+            json.dumps(entries, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")
+        ).hexdigest()[:12]
+        return f"{template_name}_merge_{len(entries)}_{digest}.docx"
+
+    async def merge(self, template_id: int, entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Заполняет шаблон по каждому набору параметров и объединяет результаты
+
+        Args:
+            template_id: ID шаблона
+            entries: Наборы параметров (как у /officesvc/report, без template_id)
+
+        Returns:
+            Dict с путем к файлу и количеством разделов
+
+        Raises:
+            ValueError: Если шаблон не DOCX или список параметров пуст
+        """
+        if not entries:
+            raise ValueError("Не передано ни одного набора параметров")
+
+        service = self.docx_service
+        template = await service.get_template(template_id)
+
+        if template.file_type.lower() != 'docx':
+            raise ValueError(f"Слияние поддерживается только для DOCX-шаблонов, а не {template.file_type}")
+
+        template_type = await service.get_template_type(template)
+
+        with REPORT_GENERATIONS_IN_PROGRESS.track_inprogress(), \
+                REPORT_GENERATION_SECONDS.time(template_type="merge"):
+            document = await service.load_document(service.template_path(template))
+            # Копирование XML-элементов шаблона и сборка документа выполняются в пуле рендеринга
+            composer = await run_blocking(DocxComposer, document)
+
+            for entry in entries:
+                await service.process_by_type(document, template_type, {**entry, 'template_id': template_id})
+                await run_blocking(composer.commit)
+
+            await run_blocking(composer.compose, SECTION_BREAK)
+
+            output_filename = await self.generate_output_filename(template.name, entries)
+            file_path = await service.write_output(
+                output_filename,
+                lambda path: service.save_document(document, path)
+            )
+
+        return {
+            "message": "Документ успешно сгенерирован и сохранён!",
+            "file_path": file_path,
+            "file_type": "docx",
+            "sections": len(entries)
+        }
@@ -0,0 +1,184 @@
+"""
+Кэш заранее сгенерированных отчетов.
+
+Фоновый прогрев (services/prewarm.py) генерирует предсказуемые отчеты заранее
+и запоминает их здесь по нормализованным параметрам запроса. Запрос отчета с
+теми же параметрами получает готовый файл без генерации, если с момента
+прогрева не изменились таблицы, которые читает обработчик этого типа шаблона
+(см. template_inventory.TEMPLATE_TABLES), файл шаблона и текущая дата.
+
+Индекс хранится в OUTPUT_DIR рядом с файлами (INDEX_FILE), поэтому отчеты,
+прогретые одним воркером, отдают все воркеры: индекс перечитывается, когда
+меняется время изменения файла.
+"""
+import json
+import logging
+import os
+import threading
+import uuid
+from datetime import date
+from typing import Dict, Optional, Sequence, Tuple
+
+from core.config import settings
+from core.metrics import CACHE_REQUESTS
+from core.table_versions import versions_token
+from services.template_versions import TEMPLATE_VERSIONS
+
+# Таблицы данных, от которых может зависеть содержимое отчета
+DATA_TABLES = (
+    "teachers", "groups", "students", "disciplines", "control_works", "grades",
+    "literature", "exam_questions", "publications", "templates", "time_slots",
+    "classrooms", "schedule_items"
+)
+
+# Индекс прогретых отчетов (имя с точкой не учитывается менеджером OUTPUT_DIR)
+INDEX_FILE = os.path.join(settings.OUTPUT_DIR, ".prewarm_index.json")
+
+logger = logging.getLogger(__name__)
+
+
+class CachedOutput:
+    """Сгенерированный файл и условия его актуальности"""
+
+    __slots__ = ("file_path", "file_type", "tables", "versions", "template_hash", "generated_on")
+
+    def __init__(self, file_path: str, file_type: str, tables: Sequence[str], versions: str,
+                 template_hash: Optional[str], generated_on: Optional[date] = None):
+        self.file_path = file_path
+        self.file_type = file_type
+        # Таблицы, от которых зависит отчет, и их версия до генерации
+        self.tables = tuple(tables)
+        self.versions = versions
+        self.template_hash = template_hash
+        # Отчеты без start_date зависят от текущей даты
+        self.generated_on = generated_on or date.today()
+
+    def to_json(self) -> Dict:
+        return {
+            "file_path": self.file_path, "file_type": self.file_type, "tables": self.tables,
+            "versions": self.versions, "template_hash": self.template_hash,
+            "generated_on": self.generated_on.isoformat(),
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict) -> "CachedOutput":
+        return cls(data["file_path"], data["file_type"], data["tables"], data["versions"],
+                   data["template_hash"], date.fromisoformat(data["generated_on"]))
+
+
+class OutputCache:
+    """Готовые файлы отчетов по нормализованным параметрам запроса"""
+
+    def __init__(self, index_file: str):
+        self.index_file = index_file
+        self._entries: Dict[Tuple, CachedOutput] = {}
+        # Время изменения прочитанного индекса
+        self._index_mtime: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def data_versions(tables: Sequence[str] = DATA_TABLES) -> str:
+        """Текущая общая версия таблиц данных (или заданных таблиц)"""
+        return versions_token(*tables)
+
+    @staticmethod
+    def template_hash(template_file: str) -> Optional[str]:
+        return TEMPLATE_VERSIONS.known_hash(os.path.join(settings.TEMPLATE_DIR, template_file))
+
+    def _sync(self) -> None:
+        """Перечитывает индекс, если его изменил другой воркер"""
+        try:
+            mtime = os.stat(self.index_file).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._index_mtime:
+            return
+
+        entries = {}
+        if mtime is not None:
+            try:
+                with open(self.index_file, encoding="utf-8") as f:
+                    entries = {
+                        tuple(tuple(pair) for pair in item["key"]): CachedOutput.from_json(item["entry"])
+                        for item in json.load(f)
+                    }
+            except (OSError, ValueError, KeyError, TypeError):
+                logger.exception("Не удалось прочитать индекс прогретых отчетов %s", self.index_file)
+                return
+        with self._lock:
+            self._entries = entries
+            self._index_mtime = mtime
+
+    def _save(self) -> None:
+        """Атомарно записывает индекс; вызывается под блокировкой"""
+        data = [{"key": key, "entry": entry.to_json()} for key, entry in self._entries.items()]
+        tmp_path = os.path.join(os.path.dirname(self.index_file), f".{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.index_file)
+        self._index_mtime = os.stat(self.index_file).st_mtime_ns
+
+    def put(self, key: Tuple, file_path: str, file_type: str, versions: str, template_file: str,
+            tables: Sequence[str] = DATA_TABLES) -> None:
+        """
+        Запоминает сгенерированный файл
+
+        Args:
+            key: Нормализованные параметры запроса
+            file_path: Путь к файлу в OUTPUT_DIR
+            file_type: Тип файла (docx, xlsx)
+            versions: Версия таблиц tables, снятая до генерации (см. data_versions)
+            template_file: Имя файла шаблона
+            tables: Таблицы, которые читает обработчик шаблона
+        """
+        self._sync()
+        entry = CachedOutput(file_path, file_type, tables, versions, self.template_hash(template_file))
+        with self._lock:
+            self._entries[key] = entry
+            self._save()
+
+    def get(self, key: Tuple, template_file: str) -> Optional[CachedOutput]:
+        """
+        Возвращает актуальный файл для параметров запроса
+
+        Args:
+            key: Нормализованные параметры запроса
+            template_file: Имя файла шаблона
+
+        Returns:
+            Запись кэша или None
+        """
+        self._sync()
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        if not self._is_current(entry, template_file):
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+            CACHE_REQUESTS.inc(cache="prewarm", result="miss")
+            return None
+
+        CACHE_REQUESTS.inc(cache="prewarm", result="hit")
+        return entry
+
+    def is_current(self, key: Tuple, template_file: str) -> bool:
+        """Проверяет, что файл для параметров уже прогрет и актуален (без учета в метриках)"""
+        self._sync()
+        with self._lock:
+            entry = self._entries.get(key)
+        return entry is not None and self._is_current(entry, template_file)
+
+    def _is_current(self, entry: CachedOutput, template_file: str) -> bool:
+        return entry.generated_on == date.today() \
+            and entry.versions == self.data_versions(entry.tables) \
+            and entry.template_hash == self.template_hash(template_file) \
+            and os.path.exists(entry.file_path)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+OUTPUT_CACHE = OutputCache(INDEX_FILE)
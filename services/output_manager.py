@@ -0,0 +1,211 @@
+"""
+Управление каталогом сгенерированных файлов (OUTPUT_DIR).
+
+Менеджер ведет индекс файлов в памяти (размер, время создания и последнего
+обращения). Фоновая задача периодически удаляет файлы старше OUTPUT_MAX_AGE и,
+если суммарный размер превышает OUTPUT_MAX_BYTES, — давно не запрашивавшиеся
+файлы (LRU).
+
+Каталог общий для всех воркеров, поэтому общее состояние хранится в самих
+файлах: время создания — mtime, время последнего обращения — atime, которое
+выставляется явно (не полагаясь на опции монтирования). touch обновляет только
+индекс в памяти и не обращается к диску: накопленные отметки записываются в atime
+фоновой задачей перед каждым вытеснением. Вытеснение работает по индексу в памяти,
+а раз в OUTPUT_RESCAN_INTERVAL индекс строится заново сканированием каталога, чтобы
+учесть файлы и обращения других воркеров.
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from core.config import settings
+from core.metrics import OUTPUT_DIR_BYTES
+
+
+class OutputEntry:
+    """Запись индекса выходного файла"""
+
+    __slots__ = ("name", "size", "created_at", "accessed_at")
+
+    def __init__(self, name: str, size: int, created_at: float, accessed_at: float):
+        self.name = name
+        self.size = size
+        self.created_at = created_at
+        self.accessed_at = accessed_at
+
+
+class OutputManager:
+    """Индекс выходных файлов с вытеснением по возрасту и суммарному размеру"""
+
+    def __init__(self, directory: str, max_bytes: int, max_age: float, rescan_interval: float):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.rescan_interval = rescan_interval
+        # Порядок записей — от давно запрашивавшихся к недавним
+        self._entries: "OrderedDict[str, OutputEntry]" = OrderedDict()
+        self._total_bytes = 0
+        self._evicted_files = 0
+        self._evicted_bytes = 0
+        self._last_sweep_at: Optional[float] = None
+        self._loaded_at: Optional[float] = None
+        # Обращения, еще не записанные в atime файлов: имя -> время обращения
+        self._pending_touches: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def load(self) -> None:
+        """Строит индекс по текущему содержимому каталога (при старте и раз в rescan_interval)"""
+        loaded_at = time.time()
+        entries = []
+        try:
+            with os.scandir(self.directory) as it:
+                for item in it:
+                    if not item.is_file(follow_symlinks=False) or item.name.startswith("."):
+                        continue
+                    stat_result = item.stat(follow_symlinks=False)
+                    entries.append(OutputEntry(
+                        item.name,
+                        stat_result.st_size,
+                        stat_result.st_mtime,
+                        max(stat_result.st_atime, stat_result.st_mtime)
+                    ))
+        except FileNotFoundError:
+            pass
+
+        entries.sort(key=lambda entry: entry.accessed_at)
+        with self._lock:
+            self._entries = OrderedDict((entry.name, entry) for entry in entries)
+            self._total_bytes = sum(entry.size for entry in entries)
+            self._loaded_at = loaded_at
+
+    def register(self, path: str) -> None:
+        """
+        Добавляет (или обновляет) сгенерированный файл в индексе
+
+        Args:
+            path: Путь к файлу в OUTPUT_DIR
+        """
+        try:
+            size = os.stat(path).st_size
+        except FileNotFoundError:
+            return
+
+        name = os.path.basename(path)
+        now = time.time()
+        with self._lock:
+            previous = self._entries.pop(name, None)
+            if previous:
+                self._total_bytes -= previous.size
+            self._entries[name] = OutputEntry(name, size, now, now)
+            self._total_bytes += size
+
+    def touch(self, name: str) -> None:
+        """
+        Отмечает обращение к файлу в индексе. Вызывается из обработчиков запросов,
+        поэтому к диску не обращается: atime файла выставит следующий sweep
+        """
+        now = time.time()
+        with self._lock:
+            self._pending_touches[name] = now
+            entry = self._entries.get(name)
+            if entry:
+                entry.accessed_at = now
+                self._entries.move_to_end(name)
+
+    def flush_touches(self) -> None:
+        """Записывает накопленные обращения в atime файлов, чтобы их видели другие воркеры"""
+        with self._lock:
+            pending, self._pending_touches = self._pending_touches, {}
+
+        for name, accessed_at in pending.items():
+            path = os.path.join(self.directory, name)
+            try:
+                os.utime(path, ns=(int(accessed_at * 1e9), os.stat(path).st_mtime_ns))
+            except OSError:
+                pass
+
+    def _remove(self, entry: OutputEntry) -> None:
+        """Удаляет файл; вызывается под блокировкой после исключения записи из индекса"""
+        self._total_bytes -= entry.size
+        try:
+            os.remove(os.path.join(self.directory, entry.name))
+        except FileNotFoundError:
+            return
+        self._evicted_files += 1
+        self._evicted_bytes += entry.size
+
+    def sweep(self) -> int:
+        """
+        Удаляет устаревшие файлы и файлы сверх лимита размера по индексу в памяти
+
+        Returns:
+            Количество удаленных записей индекса
+        """
+        self.flush_touches()
+        now = time.time()
+        # Файлы и обращения других воркеров видны только в самом каталоге, но полное
+        # сканирование дорогое, поэтому индекс перестраивается лишь раз в rescan_interval
+        if self._loaded_at is None or now - self._loaded_at >= self.rescan_interval:
+            self.load()
+        removed = 0
+
+        with self._lock:
+            if self.max_age:
+                expired = [entry for entry in self._entries.values() if now - entry.created_at > self.max_age]
+                for entry in expired:
+                    del self._entries[entry.name]
+                    self._remove(entry)
+                    removed += 1
+
+            if self.max_bytes:
+                while self._entries and self._total_bytes > self.max_bytes:
+                    _, entry = self._entries.popitem(last=False)
+                    self._remove(entry)
+                    removed += 1
+
+            self._last_sweep_at = now
+
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        """Возвращает статистику каталога выходных файлов"""
+        with self._lock:
+            oldest = min((entry.created_at for entry in self._entries.values()), default=None)
+            return {
+                "directory": self.directory,
+                "files": len(self._entries),
+                "total_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "max_age_seconds": self.max_age,
+                "oldest_file_age_seconds": time.time() - oldest if oldest else None,
+                "evicted_files": self._evicted_files,
+                "evicted_bytes": self._evicted_bytes,
+                "last_sweep_at": self._last_sweep_at,
+            }
+
+
+OUTPUT_MANAGER = OutputManager(
+    settings.OUTPUT_DIR,
+    settings.OUTPUT_MAX_BYTES,
+    settings.OUTPUT_MAX_AGE,
+    settings.OUTPUT_RESCAN_INTERVAL
+)
+
+OUTPUT_DIR_BYTES.set_function(lambda: OUTPUT_MANAGER.total_bytes)
+
+
+async def run_output_sweeper(interval: float) -> None:
+    """Фоновая задача, периодически вытесняющая выходные файлы"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(OUTPUT_MANAGER.sweep)
+        except OSError:
+            pass
@@ -0,0 +1,195 @@
+"""
+Фоновый прогрев предсказуемых отчетов.
+
+Списки групп, журналы и расписания запрашиваются волнами в начале недели.
+Фоновая задача заранее генерирует заданный набор отчетов (PREWARM_JOBS,
+PREWARM_JOBS_FILE) и сохраняет их в кэше готовых отчетов, поэтому первый
+утренний запрос получает готовый файл.
+
+Прогрев выполняется с низким приоритетом: отчет генерируется, только если
+в очереди генерации нет запросов и свободно больше PREWARM_HEADROOM слотов.
+Иначе проход откладывается до следующего периода. Отчет генерируется
+повторно, когда изменились таблицы, которые читает его шаблон, сам шаблон
+или наступил новый день.
+
+Задача планировщика запускается в каждом воркере, но проходы выполняет
+только воркер, захвативший блокировку SCHEDULER_LOCK_FILE в RUNTIME_DIR.
+Остальные пытаются захватить ее каждый период, поэтому при завершении
+воркера-владельца прогрев продолжает другой.
+"""
+import asyncio
+import fcntl
+import itertools
+import json
+import logging
+import os
+from datetime import datetime
+from typing import IO, Any, Dict, List, Optional
+
+from core.admission import ADMISSION
+from core.config import settings
+from core.metrics import PREWARM_REPORTS
+from models.models import Classroom, Discipline, Group, Student, Teacher, Template
+from services.base_document_service import DocumentServiceFactory
+from services.output_cache import OUTPUT_CACHE
+from services.reference_data import REFERENCE_DATA
+from services.report_service import ReportService
+from services.template_inventory import template_tables, template_type_for
+
+logger = logging.getLogger(__name__)
+
+# Параметры отчета (см. ReportService.generate_report)
+REPORT_PARAMS = (
+    "group_id", "student_id", "teacher_id", "discipline_id", "classroom_id",
+    "start_date", "ticket_number", "day_of_week", "group_id_2"
+)
+
+# Блокировка, которую держит воркер, выполняющий прогрев
+SCHEDULER_LOCK_FILE = os.path.join(settings.RUNTIME_DIR, "prewarm.lock")
+
+# Параметры, для которых значение "*" означает все записи
+EXPANDABLE_PARAMS = {
+    "group_id": Group,
+    "student_id": Student,
+    "teacher_id": Teacher,
+    "discipline_id": Discipline,
+    "classroom_id": Classroom,
+}
+
+
+def load_jobs() -> List[Dict[str, Any]]:
+    """
+    Возвращает задания прогрева из настроек и файла PREWARM_JOBS_FILE
+
+    Каждое задание — словарь с template_id и параметрами отчета, например
+    {"template_id": 13, "group_id": "*"}.
+    """
+    jobs = list(settings.PREWARM_JOBS)
+    if settings.PREWARM_JOBS_FILE:
+        with open(settings.PREWARM_JOBS_FILE, encoding="utf-8") as f:
+            jobs.extend(json.load(f))
+    return jobs
+
+
+async def expand_job(job: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Преобразует задание в параметры отчетов, раскрывая "*" в ID всех записей
+
+    Args:
+        job: Задание прогрева
+
+    Returns:
+        Параметры отчетов в формате ReportService.generate_report
+    """
+    unknown = set(job) - set(REPORT_PARAMS) - {"template_id"}
+    if unknown:
+        raise ValueError(f"Неизвестные параметры задания прогрева: {', '.join(sorted(unknown))}")
+
+    params = {"template_id": int(job["template_id"])}
+    params.update({key: job.get(key) for key in REPORT_PARAMS})
+    if params["start_date"]:
+        params["start_date"] = datetime.strptime(params["start_date"], "%Y-%m-%d")
+
+    choices = []
+    for key, model in EXPANDABLE_PARAMS.items():
+        if params[key] == "*":
+            choices.append([(key, pk) for pk in await model.all().order_by('id').values_list('id', flat=True)])
+
+    return [dict(params, **dict(combination)) for combination in itertools.product(*choices)]
+
+
+async def prewarm_pass(jobs: List[Dict[str, Any]]) -> int:
+    """
+    Генерирует неактуальные отчеты заданий, пока сервис простаивает
+
+    Args:
+        jobs: Задания прогрева
+
+    Returns:
+        Количество сгенерированных отчетов
+    """
+    generated = 0
+    for job in jobs:
+        try:
+            reports = await expand_job(job)
+        except Exception:
+            logger.exception("Некорректное задание прогрева %s", job)
+            continue
+
+        for params in reports:
+            template = await REFERENCE_DATA.get_or_none(Template, params["template_id"])
+            if template is None:
+                continue
+            try:
+                params = await ReportService.template_params(params)
+            except Exception:
+                continue
+
+            key = ReportService.normalize_params(params)
+            if OUTPUT_CACHE.is_current(key, template.file_path) or key in ReportService._inflight:
+                continue
+
+            # Низкий приоритет: при запросах пользователей в очереди проход откладывается
+            if not ADMISSION.try_acquire(settings.PREWARM_HEADROOM):
+                PREWARM_REPORTS.inc(result="deferred")
+                return generated
+
+            try:
+                tables = template_tables(template_type_for(template))
+                versions = OUTPUT_CACHE.data_versions(tables)
+                service = await DocumentServiceFactory.get_service(template.id)
+                file_path = await service.generate_document(template.id, params)
+            except Exception:
+                logger.exception("Не удалось прогреть отчет %s", dict(key))
+                PREWARM_REPORTS.inc(result="failed")
+                continue
+            finally:
+                ADMISSION.release()
+
+            OUTPUT_CACHE.put(key, file_path, template.file_type, versions, template.file_path, tables)
+            PREWARM_REPORTS.inc(result="generated")
+            generated += 1
+
+    return generated
+
+
+def acquire_scheduler_lock() -> Optional[IO]:
+    """
+    Захватывает блокировку планировщика без ожидания
+
+    Returns:
+        Открытый файл блокировки (блокировка действует, пока он открыт) или None, если ее держит другой воркер
+    """
+    lock_file = open(SCHEDULER_LOCK_FILE, "a")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+async def run_prewarm_scheduler(interval: float) -> None:
+    """Фоновая задача, периодически прогревающая отчеты из заданий (в воркере, владеющем блокировкой)"""
+    try:
+        jobs = load_jobs()
+    except (OSError, ValueError):
+        logger.exception("Не удалось загрузить задания прогрева")
+        return
+
+    lock_file = None
+    try:
+        while True:
+            if lock_file is None:
+                lock_file = acquire_scheduler_lock()
+            if lock_file is not None:
+                try:
+                    generated = await prewarm_pass(jobs)
+                    if generated:
+                        logger.info("Прогрето отчетов: %s", generated)
+                except Exception:
+                    logger.exception("Ошибка при прогреве отчетов")
+            await asyncio.sleep(interval)
+    finally:
+        if lock_file is not None:
+            lock_file.close()
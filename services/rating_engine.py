@@ -0,0 +1,241 @@
+"""
+Балльно-рейтинговая система (БРС): векторный расчет итогов по матрице баллов.
+
+Баллы загружаются одним запросом в матрицу студенты × контрольные работы
+(NaN — работа не сдана). Суммы, взвешенный по max_score рейтинг, пропуски
+и оценки вычисляются операциями NumPy над всей матрицей, поэтому расчет
+для потока или курса занимает столько же кода и почти столько же времени,
+сколько для одной группы.
+
+Если у матрицы задана текущая неделя (due_week), максимум и пропуски считаются
+только по работам, срок которых уже наступил (неделя работы не позже текущей),
+и по работам, которые уже оценивались хотя бы у одного студента.
+"""
+from datetime import date
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from models.models import ControlWork, Grade, Student
+
+# Границы оценок по проценту от максимума (нижняя граница включительно), по возрастанию
+GRADE_BANDS: Tuple[Tuple[float, str], ...] = (
+    (0.0, "неудовлетворительно"),
+    (55.0, "удовлетворительно"),
+    (70.0, "хорошо"),
+    (85.0, "отлично"),
+)
+
+SUMMARY_HEADERS = ("Сумма", "%", "Пропуски", "Оценка")
+
+
+class ScoreMatrix:
+    """Баллы студентов по контрольным работам дисциплины"""
+
+    __slots__ = ("student_ids", "student_names", "work_ids", "work_numbers", "work_weeks", "max_scores", "scores",
+                 "due_week")
+
+    def __init__(self, student_ids: np.ndarray, student_names: List[str], work_ids: np.ndarray,
+                 work_numbers: List[int], work_weeks: List[Optional[int]], max_scores: np.ndarray,
+                 scores: np.ndarray, due_week: Optional[int] = None):
+        self.student_ids = student_ids
+        self.student_names = student_names
+        self.work_ids = work_ids
+        self.work_numbers = work_numbers
+        self.work_weeks = work_weeks
+        # NaN, если максимальный балл работы не задан
+        self.max_scores = max_scores
+        # Форма (студенты, работы); NaN — оценки нет
+        self.scores = scores
+        # Текущая неделя семестра; None — учитываются все работы
+        self.due_week = due_week
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.scores.shape
+
+
+class RatingResult:
+    """Итоги БРС по строкам матрицы"""
+
+    __slots__ = ("totals", "max_total", "percent", "missing", "missing_count", "bands", "due")
+
+    def __init__(self, totals: np.ndarray, max_total: float, percent: np.ndarray,
+                 missing: np.ndarray, missing_count: np.ndarray, bands: List[str], due: np.ndarray):
+        self.totals = totals
+        self.max_total = max_total
+        self.percent = percent
+        # Матрица признаков несданных работ и их количество по студентам
+        self.missing = missing
+        self.missing_count = missing_count
+        self.bands = bands
+        # Признаки работ, учтенных в максимуме и пропусках (общие для всех строк)
+        self.due = due
+
+    def summary_row(self, index: int) -> Tuple:
+        """Значения итоговых колонок (см. SUMMARY_HEADERS) для студента"""
+        return (
+            format_score(self.totals[index]),
+            round(float(self.percent[index]), 1),
+            int(self.missing_count[index]),
+            self.bands[index],
+        )
+
+
+def format_score(value: float):
+    """Балл для вывода в документ: целое число без дробной части"""
+    value = float(value)
+    return int(value) if value.is_integer() else round(value, 2)
+
+
+def due_week(start: date, today: Optional[date] = None) -> int:
+    """Номер текущей недели, считая неделю, начинающуюся с start, первой"""
+    return ((today or date.today()) - start).days // 7 + 1
+
+
+def build_matrix(students: Sequence[Tuple[int, str]], works: Sequence[Tuple[int, int, Optional[int], Optional[int]]],
+                 grades: Sequence[Tuple[int, int, Optional[int]]]) -> ScoreMatrix:
+    """
+    Строит матрицу баллов
+
+    Args:
+        students: Пары (ID, ФИО) в порядке строк матрицы
+        works: Кортежи (ID, номер, неделя, максимальный балл) в порядке колонок
+        grades: Тройки (ID студента, ID работы, балл); оценки других студентов и работ игнорируются
+
+    Returns:
+        Матрица баллов
+    """
+    student_ids = np.fromiter((student[0] for student in students), dtype=np.int64, count=len(students))
+    work_ids = np.fromiter((work[0] for work in works), dtype=np.int64, count=len(works))
+    max_scores = np.array([np.nan if work[3] is None else work[3] for work in works], dtype=np.float64)
+    scores = np.full((len(students), len(works)), np.nan)
+
+    if len(grades) and len(students) and len(works):
+        grade_array = np.array(
+            [(student_id, work_id, np.nan if score is None else score) for student_id, work_id, score in grades],
+            dtype=np.float64
+        )
+        grade_students = grade_array[:, 0].astype(np.int64)
+        grade_works = grade_array[:, 1].astype(np.int64)
+
+        # Позиции ID в отсортированных массивах, затем обратно в порядок строк и колонок
+        student_order = np.argsort(student_ids)
+        work_order = np.argsort(work_ids)
+        rows = np.searchsorted(student_ids[student_order], grade_students).clip(max=len(students) - 1)
+        cols = np.searchsorted(work_ids[work_order], grade_works).clip(max=len(works) - 1)
+        rows = student_order[rows]
+        cols = work_order[cols]
+
+        known = (student_ids[rows] == grade_students) & (work_ids[cols] == grade_works)
+        scores[rows[known], cols[known]] = grade_array[known, 2]
+
+    return ScoreMatrix(
+        student_ids,
+        [student[1] for student in students],
+        work_ids,
+        [work[1] for work in works],
+        [work[2] for work in works],
+        max_scores,
+        scores
+    )
+
+
+async def load_score_matrix(discipline_id: int, group_ids: Optional[Sequence[int]] = None) -> ScoreMatrix:
+    """
+    Загружает баллы студентов по дисциплине
+
+    Args:
+        discipline_id: ID дисциплины
+        group_ids: ID групп; если не указаны — все студенты, распределенные по группам
+
+    Returns:
+        Матрица баллов: студенты упорядочены по группе и ID, работы — по номеру
+    """
+    students_query = Student.filter(group_id__in=group_ids) if group_ids is not None \
+        else Student.filter(group_id__isnull=False)
+    students = await students_query.order_by('group_id', 'id').values_list('id', 'full_name')
+    return await load_students_matrix(discipline_id, students, group_ids)
+
+
+async def load_students_matrix(discipline_id: int, students: Sequence[Tuple[int, str]],
+                               group_ids: Optional[Sequence[int]] = None) -> ScoreMatrix:
+    """
+    Загружает баллы заданных студентов по дисциплине
+
+    Оценки выбираются соединением по дисциплине и группам, а не списком ID студентов
+    (который для всего курса превращается в огромный IN); лишние строки отбрасывает build_matrix.
+
+    Args:
+        discipline_id: ID дисциплины
+        students: Пары (ID, ФИО) в порядке строк матрицы
+        group_ids: Группы, в которые входят студенты; если не указаны — оценки всех групп по дисциплине
+
+    Returns:
+        Матрица баллов
+    """
+    works = await ControlWork.filter(discipline_id=discipline_id).order_by('number', 'id').values_list(
+        'id', 'number', 'week', 'max_score'
+    )
+    grades_query = Grade.filter(control_work__discipline_id=discipline_id)
+    if group_ids is not None:
+        grades_query = grades_query.filter(student__group_id__in=group_ids)
+    grades = await grades_query.values_list('student_id', 'control_work_id', 'score')
+
+    return build_matrix(students, works, grades)
+
+
+class RatingEngine:
+    """Расчет итогов БРС по матрице баллов"""
+
+    def __init__(self, bands: Sequence[Tuple[float, str]] = GRADE_BANDS):
+        self.thresholds = np.array([threshold for threshold, _ in bands[1:]], dtype=np.float64)
+        self.labels = np.array([label for _, label in bands], dtype=object)
+
+    def compute(self, matrix: ScoreMatrix) -> RatingResult:
+        """
+        Считает сумму баллов, процент от максимума, пропуски и оценку для каждого студента
+
+        Процент взвешен максимальными баллами: каждая работа с заданным max_score
+        вносит score / max_score с весом max_score / сумма max_score, что равно
+        доле набранных баллов от максимума. Работы без max_score учитываются в сумме
+        и пропусках, но не в проценте. Если задана matrix.due_week, работы более
+        поздних недель, еще не оценивавшиеся ни у кого, не входят в максимум и не
+        считаются пропусками.
+
+        Args:
+            matrix: Матрица баллов
+
+        Returns:
+            Итоги по строкам матрицы
+        """
+        scores = matrix.scores
+        ungraded = np.isnan(scores)
+        totals = np.where(ungraded, 0.0, scores).sum(axis=1)
+
+        # Работы, срок которых наступил (или без недели), и работы, которые уже оценивались
+        due = np.array(
+            [matrix.due_week is None or week is None or week <= matrix.due_week for week in matrix.work_weeks],
+            dtype=bool
+        ) | ~ungraded.all(axis=0)
+        missing = ungraded & due
+
+        weighted = due & ~np.isnan(matrix.max_scores) & (np.nan_to_num(matrix.max_scores) > 0)
+        max_total = float(matrix.max_scores[weighted].sum())
+
+        if max_total > 0:
+            weights = np.where(weighted, np.nan_to_num(matrix.max_scores) / max_total, 0.0)
+            normalized = np.divide(
+                np.where(ungraded, 0.0, scores), matrix.max_scores,
+                out=np.zeros_like(scores), where=weighted
+            )
+            percent = (normalized * weights).sum(axis=1) * 100.0
+        else:
+            percent = np.zeros(len(scores))
+
+        bands = self.labels[np.searchsorted(self.thresholds, percent, side="right")]
+
+        return RatingResult(totals, max_total, percent, missing, missing.sum(axis=1), bands.tolist(), due)
+
+
+RATING_ENGINE = RatingEngine()
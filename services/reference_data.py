@@ -0,0 +1,169 @@
+"""
+Снимок справочных таблиц процесса: преподаватели, группы, аудитории, пары,
+дисциплины и шаблоны.
+
+Таблицы маленькие и меняются редко, поэтому загружаются целиком в неизменяемые
+записи с __slots__ (словарь ID → запись для каждой таблицы). Обработчики
+документов получают записи по ID без запросов к БД. Снимок загружается при
+старте; при изменении таблиц строится новый снимок (перечитываются только
+изменившиеся таблицы) и атомарно подменяет текущий — обработка, уже получившая
+снимок, продолжает работать со своей версией.
+
+Изменения в текущем процессе перестраивают снимок в фоне сразу, изменения
+других воркеров обнаруживаются сравнением версий таблиц при обращении.
+"""
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple, Type, TypeVar
+
+from tortoise.exceptions import DoesNotExist
+from tortoise.models import Model
+
+from core.database import use_primary
+from core.table_versions import get_version, subscribe
+from models.models import Classroom, Discipline, Group, Teacher, Template, TimeSlot
+
+logger = logging.getLogger(__name__)
+
+REFERENCE_MODELS = (Teacher, Group, Classroom, TimeSlot, Discipline, Template)
+
+REFERENCE_TABLES = tuple(model._meta.db_table for model in REFERENCE_MODELS)
+
+M = TypeVar("M", bound=Model)
+
+
+class ReferenceRecord:
+    """Неизменяемая запись справочной таблицы с полями модели (включая *_id внешних ключей)"""
+
+    __slots__ = ()
+
+    def __init__(self, values: Tuple):
+        for name, value in zip(self.__slots__, values):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} нельзя изменить")
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} id={getattr(self, 'id', None)}>"
+
+
+_record_types: Dict[Type[Model], Type[ReferenceRecord]] = {}
+
+
+def record_type(model: Type[Model]) -> Type[ReferenceRecord]:
+    """Класс записей модели; поля берутся после инициализации Tortoise (с *_id внешних ключей)"""
+    cls = _record_types.get(model)
+    if cls is None:
+        fields = tuple(model._meta.fields_db_projection)
+        cls = type(f"{model.__name__}Record", (ReferenceRecord,), {"__slots__": fields})
+        _record_types[model] = cls
+    return cls
+
+
+class ReferenceSnapshot:
+    """Неизменяемый снимок справочных таблиц"""
+
+    __slots__ = ("versions", "_tables")
+
+    def __init__(self, versions: Dict[str, str], tables: Dict[Type[Model], Dict[int, ReferenceRecord]]):
+        self.versions = versions
+        self._tables = tables
+
+    def get(self, model: Type[M], pk: int) -> M:
+        """
+        Возвращает запись по ID
+
+        Raises:
+            DoesNotExist: Если записи нет (как Model.get)
+        """
+        try:
+            return self._tables[model][pk]
+        except KeyError:
+            raise DoesNotExist(f"{model.__name__} с ID {pk} не найден") from None
+
+    def get_or_none(self, model: Type[M], pk: Optional[int]) -> Optional[M]:
+        """Возвращает запись по ID или None"""
+        return self._tables[model].get(pk)
+
+    def all(self, model: Type[M]) -> List[M]:
+        """Возвращает все записи таблицы в порядке ID"""
+        return list(self._tables[model].values())
+
+    def __len__(self) -> int:
+        return sum(len(records) for records in self._tables.values())
+
+
+class ReferenceData:
+    """Текущий снимок справочных таблиц процесса"""
+
+    def __init__(self):
+        self._snapshot: Optional[ReferenceSnapshot] = None
+        self._lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def current_versions() -> Dict[str, str]:
+        return {table: get_version(table) for table in REFERENCE_TABLES}
+
+    async def snapshot(self) -> ReferenceSnapshot:
+        """Возвращает актуальный снимок, перечитывая изменившиеся таблицы"""
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.versions == self.current_versions():
+            return snapshot
+        return await self.load()
+
+    async def load(self) -> ReferenceSnapshot:
+        """Строит новый снимок и подменяет им текущий"""
+        async with self._lock:
+            # Версии снимаются до чтения: изменение во время загрузки приведет к повторной загрузке
+            versions = self.current_versions()
+            previous = self._snapshot
+            if previous is not None and previous.versions == versions:
+                return previous
+
+            tables = {}
+            for model in REFERENCE_MODELS:
+                table = model._meta.db_table
+                if previous is not None and previous.versions[table] == versions[table]:
+                    # Неизменившаяся таблица переходит в новый снимок без копирования
+                    tables[model] = previous._tables[model]
+                    continue
+
+                cls = record_type(model)
+                # Снимок хранится под текущими версиями, поэтому читается из основной базы, а не с реплики
+                with use_primary():
+                    rows = await model.all().order_by('id').values_list(*cls.__slots__)
+                pk_index = cls.__slots__.index(model._meta.pk_attr)
+                tables[model] = {row[pk_index]: cls(row) for row in rows}
+
+            self._snapshot = ReferenceSnapshot(versions, tables)
+            return self._snapshot
+
+    async def get(self, model: Type[M], pk: int) -> M:
+        """Возвращает запись по ID из актуального снимка (см. ReferenceSnapshot.get)"""
+        return (await self.snapshot()).get(model, pk)
+
+    async def get_or_none(self, model: Type[M], pk: Optional[int]) -> Optional[M]:
+        """Возвращает запись по ID из актуального снимка или None"""
+        return (await self.snapshot()).get_or_none(model, pk)
+
+    def _on_table_changed(self, table: str) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if self._snapshot is not None and (self._refresh_task is None or self._refresh_task.done()):
+            self._refresh_task = loop.create_task(self._refresh_in_background())
+
+    async def _refresh_in_background(self) -> None:
+        try:
+            await self.load()
+        except Exception:
+            logger.exception("Не удалось обновить снимок справочных таблиц")
+
+
+REFERENCE_DATA = ReferenceData()
+
+for _table in REFERENCE_TABLES:
+    subscribe(_table, REFERENCE_DATA._on_table_changed)
@@ -1,8 +1,16 @@
+import asyncio
 from fastapi import HTTPException
-from typing import Dict, Any, Optional
+from typing import Dict, Any, AsyncIterator, List, Optional, Tuple
 from datetime import datetime
 
+from core.admission import ADMISSION, AdmissionRejected
+from core.config import settings
+from core.metrics import REPORT_REQUESTS_COALESCED
+from core.preload import import_module
 from services.base_document_service import DocumentServiceFactory
+from services.output_cache import OUTPUT_CACHE
+from services.reference_data import REFERENCE_DATA
+from services.zip_stream import stream_zip
 from models.models import Template
 
 
@@ -11,6 +19,30 @@ class ReportService:
     Сервис для генерации отчетов
     """
 
+    # Выполняющиеся генерации по нормализованным параметрам запроса
+    _inflight: Dict[Tuple, asyncio.Task] = {}
+
+    @staticmethod
+    def normalize_params(params: Dict[str, Any]) -> Tuple:
+        """
+        Возвращает ключ запроса: заданные параметры в фиксированном порядке
+
+        Args:
+            params: Параметры генерации
+
+        Returns:
+            Кортеж пар (имя, значение) без пустых параметров
+        """
+        normalized = []
+        for key in sorted(params):
+            value = params[key]
+            if value is None:
+                continue
+            if isinstance(value, datetime):
+                value = value.date().isoformat()
+            normalized.append((key, value))
+        return tuple(normalized)
+
     @staticmethod
     async def generate_report(
             template_id: int,
@@ -22,7 +54,8 @@ class ReportService:
             start_date: Optional[datetime] = None,
             ticket_number: Optional[int] = None,
             day_of_week: Optional[str] = None,
-            group_id_2: Optional[int] = None
+            group_id_2: Optional[int] = None,
+            strict: bool = False
     ) -> Dict[str, Any]:
         """
         Генерирует отчет на основе шаблона и предоставленных данных
@@ -38,28 +71,130 @@ class ReportService:
             ticket_number: Номер билета для экзаменационных билетов (опционально)
             day_of_week: День недели для расписания (опционально)
             group_id_2: ID второй группы для загруженности аудиторий (опционально)
+            strict: Отклонять запрос, если не переданы обязательные параметры шаблона
 
         Returns:
             Dict с информацией о сгенерированном файле
         """
+        params = {
+            'template_id': template_id,
+            'group_id': group_id,
+            'student_id': student_id,
+            'teacher_id': teacher_id,
+            'discipline_id': discipline_id,
+            'classroom_id': classroom_id,
+            'start_date': start_date,
+            'ticket_number': ticket_number,
+            'day_of_week': day_of_week,
+            'group_id_2': group_id_2
+        }
+
         try:
-            template = await Template.get(id=template_id)
-
-            params = {
-                'template_id': template_id,
-                'group_id': group_id,
-                'student_id': student_id,
-                'teacher_id': teacher_id,
-                'discipline_id': discipline_id,
-                'classroom_id': classroom_id,
-                'start_date': start_date,
-                'ticket_number': ticket_number,
-                'day_of_week': day_of_week,
-                'group_id_2': group_id_2
-            }
+            params = await ReportService.template_params(params, strict)
+        except Exception as e:
+            raise ReportService.http_error(e)
+
+        # Одинаковые параллельные запросы ожидают одну общую генерацию
+        key = ReportService.normalize_params(params)
+        task = ReportService._inflight.get(key)
+
+        if task is None:
+            task = asyncio.create_task(ReportService._generate(params))
+            ReportService._inflight[key] = task
+            task.add_done_callback(lambda finished: ReportService._finish_inflight(key, finished))
+        else:
+            REPORT_REQUESTS_COALESCED.inc()
+
+        # shield: отмена одного из ожидающих запросов не прерывает общую генерацию
+        return await asyncio.shield(task)
+
+    @staticmethod
+    async def template_params(params: Dict[str, Any], strict: bool = False) -> Dict[str, Any]:
+        """
+        Проверяет параметры по инвентаризации шаблона и убирает те, что шаблон не использует
+
+        Файл шаблона не открывается: обязательные и допустимые параметры берутся
+        из таблицы template_inventories. Неиспользуемые ID не попадают в имя файла
+        и не приводят к лишним запросам данных.
+
+        Args:
+            params: Параметры генерации с template_id
+            strict: Отклонять запрос без обязательных параметров
+
+        Returns:
+            Параметры, необходимые шаблону
+
+        Raises:
+            ValueError: Если strict и не переданы обязательные параметры
+        """
+        template = await REFERENCE_DATA.get_or_none(Template, params['template_id'])
+        if template is None:
+            # Ошибку "шаблон не найден" сформирует генерация
+            return params
+
+        inventory_module = import_module("services.template_inventory")
+        try:
+            inventory = await inventory_module.inventory_for(template, settings.TEMPLATE_DIR)
+        except (OSError, ValueError):
+            if strict:
+                raise
+            # Без инвентаризации параметры передаются как есть; ошибку файла сформирует генерация
+            return params
+
+        if strict:
+            missing = inventory_module.missing_params(inventory, params)
+            if missing:
+                raise ValueError(f"Для шаблона '{template.name}' не указаны параметры: {', '.join(missing)}")
+
+        return inventory_module.filter_params(inventory, params)
+
+    @staticmethod
+    def _finish_inflight(key: Tuple, task: asyncio.Task) -> None:
+        if ReportService._inflight.get(key) is task:
+            del ReportService._inflight[key]
+        # Помечаем исключение как полученное, даже если все ожидающие запросы были отменены
+        if not task.cancelled():
+            task.exception()
+
+    @staticmethod
+    async def _generate(params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Генерирует документ и преобразует ошибки в HTTP-исключения
+
+        Args:
+            params: Параметры генерации
+
+        Returns:
+            Dict с информацией о сгенерированном файле
+        """
+        template_id = params['template_id']
+
+        try:
+            template = await REFERENCE_DATA.get(Template, template_id)
+
+            # Отчет, сгенерированный фоновым прогревом и не устаревший с тех пор
+            cached = OUTPUT_CACHE.get(ReportService.normalize_params(params), template.file_path)
+            if cached is not None:
+                return {
+                    "message": "Отчет успешно сгенерирован и сохранён!",
+                    "file_path": cached.file_path,
+                    "file_type": cached.file_type
+                }
+
+            # Журнал оценок, обновленный после изменения оценок, не генерируется заново
+            if template.file_type.lower() == 'xlsx':
+                journal_store = import_module("services.journal_store")
+                file_path = await journal_store.JOURNAL_STORE.lookup(params, template.file_path)
+                if file_path is not None:
+                    return {
+                        "message": "Отчет успешно сгенерирован и сохранён!",
+                        "file_path": file_path,
+                        "file_type": template.file_type
+                    }
 
             service = await DocumentServiceFactory.get_service(template_id)
-            file_path = await service.generate_document(template_id, params)
+            async with ADMISSION.slot():
+                file_path = await service.generate_document(template_id, params)
 
             return {
                 "message": "Отчет успешно сгенерирован и сохранён!",
@@ -67,20 +202,149 @@ class ReportService:
                 "file_type": template.file_type
             }
 
-        except FileNotFoundError as e:
-            raise HTTPException(
+        except Exception as e:
+            raise ReportService.http_error(e)
+
+    @staticmethod
+    async def generate_exam_ticket_set(
+            template_id: int,
+            discipline_id: int,
+            tickets: int,
+            questions_per_ticket: int = 3,
+            seed: Optional[int] = None,
+            output_format: str = "docx"
+    ) -> Dict[str, Any]:
+        """
+        Генерирует полный набор экзаменационных билетов
+
+        Args:
+            template_id: ID шаблона билета
+            discipline_id: ID дисциплины
+            tickets: Количество билетов
+            questions_per_ticket: Количество вопросов в билете
+            seed: Начальное значение для распределения вопросов (опционально)
+            output_format: docx или zip
+
+        Returns:
+            Dict с информацией о сгенерированном файле и распределении вопросов
+        """
+        try:
+            service = import_module("services.exam_ticket_service").ExamTicketSetService()
+            async with ADMISSION.slot():
+                return await service.generate(
+                    template_id, discipline_id, tickets, questions_per_ticket, seed, output_format
+                )
+        except Exception as e:
+            raise ReportService.http_error(e)
+
+    @staticmethod
+    async def merge_documents(template_id: int, entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Заполняет DOCX-шаблон по нескольким наборам параметров и объединяет их в один документ
+
+        Args:
+            template_id: ID шаблона
+            entries: Наборы параметров
+
+        Returns:
+            Dict с информацией о сгенерированном файле
+        """
+        try:
+            service = import_module("services.merge_service").MergeService()
+            async with ADMISSION.slot():
+                return await service.merge(template_id, entries)
+        except Exception as e:
+            raise ReportService.http_error(e)
+
+    @staticmethod
+    async def stream_exam_ticket_set(
+            template_id: int,
+            discipline_id: int,
+            tickets: int,
+            questions_per_ticket: int = 3,
+            seed: Optional[int] = None
+    ) -> Tuple[str, AsyncIterator[bytes]]:
+        """
+        Подготавливает набор билетов и возвращает поток zip-архива с ними
+
+        Ошибки подготовки (нет шаблона, нет вопросов) возникают до начала выдачи архива.
+
+        Args:
+            template_id: ID шаблона билета
+            discipline_id: ID дисциплины
+            tickets: Количество билетов
+            questions_per_ticket: Количество вопросов в билете
+            seed: Начальное значение для распределения вопросов (опционально)
+
+        Returns:
+            Кортеж (имя архива, асинхронный итератор фрагментов архива)
+        """
+        try:
+            service = import_module("services.exam_ticket_service").ExamTicketSetService()
+            ticket_set = await service.prepare(template_id, discipline_id, tickets, questions_per_ticket, seed)
+            ADMISSION.check()
+        except Exception as e:
+            raise ReportService.http_error(e)
+
+        return (
+            ticket_set.output_filename("zip"),
+            stream_zip(service.ticket_files(ticket_set), settings.ZIP_STREAM_PREFETCH)
+        )
+
+    @staticmethod
+    async def stream_batch(items: List[Dict[str, Any]]) -> AsyncIterator[bytes]:
+        """
+        Проверяет пакет и возвращает поток zip-архива с его документами
+
+        Args:
+            items: Наборы параметров с template_id
+
+        Returns:
+            Асинхронный итератор фрагментов архива
+        """
+        try:
+            service = import_module("services.batch_service").BatchService()
+            await service.validate(items)
+            ADMISSION.check()
+        except Exception as e:
+            raise ReportService.http_error(e)
+
+        return stream_zip(service.files(items), settings.ZIP_STREAM_PREFETCH)
+
+    @staticmethod
+    def http_error(error: Exception) -> HTTPException:
+        """
+        Преобразует ошибку генерации в HTTP-исключение
+
+        Args:
+            error: Исключение, возникшее при генерации
+
+        Returns:
+            HTTPException с соответствующим кодом ответа
+        """
+        if isinstance(error, HTTPException):
+            return error
+
+        if isinstance(error, AdmissionRejected):
+            return HTTPException(
+                status_code=503,
+                detail=str(error),
+                headers={"Retry-After": str(error.retry_after)}
+            )
+
+        if isinstance(error, FileNotFoundError):
+            return HTTPException(
                 status_code=404,
-                detail=str(e)
+                detail=str(error)
             )
 
-        except ValueError as e:
-            raise HTTPException(
+        if isinstance(error, ValueError):
+            return HTTPException(
                 status_code=400,
-                detail=str(e)
+                detail=str(error)
             )
 
-        except Exception as e:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Ошибка при генерации отчета: {str(e)}"
-            )
+        return HTTPException(
+            status_code=500,
+            detail=f"Ошибка при генерации отчета: {str(error)}"
+        )
@@ -0,0 +1,292 @@
+"""
+Поисковый индекс в памяти по студентам, преподавателям и группам.
+
+Индексируются ФИО и email студентов, ФИО преподавателей и коды групп.
+Текст нормализуется: регистр, "ё" → "е", знаки препинания → пробелы.
+Поиск идет по началу слов: отсортированный список слов и бинарный поиск
+диапазона. Если по началу слов ничего не найдено (опечатка, слово из середины
+кода), используется поиск по совпадающим триграммам.
+
+Индекс перестраивается целиком при изменении таблиц students, teachers,
+groups. Изменения в текущем процессе запускают перестройку в фоне сразу,
+изменения других воркеров обнаруживаются по версиям таблиц при поиске.
+Пока идет перестройка, поиск обслуживается прежним индексом; ожидание
+возможно только до построения первого индекса.
+"""
+import asyncio
+import bisect
+import logging
+import re
+import unicodedata
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from core.database import use_primary
+from core.table_versions import subscribe, versions_token
+from models.models import Group, Student, Teacher
+
+logger = logging.getLogger(__name__)
+
+SEARCH_TABLES = (Student._meta.db_table, Teacher._meta.db_table, Group._meta.db_table)
+
+SEARCH_KINDS = ("student", "teacher", "group")
+
+_NON_WORD = re.compile(r"[^\w]+|_")
+
+# Доля триграмм запроса, которые должны встретиться в записи при нечетком поиске
+TRIGRAM_THRESHOLD = 0.5
+
+
+def normalize(text: Optional[str]) -> str:
+    """
+    Приводит текст к виду для поиска: нижний регистр, "ё" → "е", слова через один пробел
+
+    Args:
+        text: Исходный текст
+
+    Returns:
+        Нормализованный текст
+    """
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKC", text).casefold().replace("ё", "е")
+    return " ".join(_NON_WORD.split(text)).strip()
+
+
+def trigrams(word: str) -> Set[str]:
+    """Триграммы слова с границами (пробел в начале и в конце)"""
+    padded = f" {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchDocument:
+    """Найденная запись"""
+
+    __slots__ = ("kind", "id", "title", "email", "group")
+
+    def __init__(self, kind: str, id: int, title: str, email: Optional[str] = None, group: Optional[str] = None):
+        self.kind = kind
+        self.id = id
+        self.title = title
+        self.email = email
+        self.group = group
+
+    def to_dict(self, score: float) -> Dict[str, Any]:
+        result = {"type": self.kind, "id": self.id, "title": self.title, "score": round(score, 3)}
+        if self.email is not None:
+            result["email"] = self.email
+        if self.group is not None:
+            result["group"] = self.group
+        return result
+
+
+class SearchIndex:
+    """Неизменяемый индекс: слова для поиска по префиксу и триграммы для нечеткого поиска"""
+
+    def __init__(self, documents: List[SearchDocument], words: List[Tuple[int, Iterable[str]]]):
+        """
+        Args:
+            documents: Записи индекса
+            words: Пары (номер записи, нормализованные слова записи)
+        """
+        self.documents = documents
+
+        pairs = sorted({(word, doc) for doc, doc_words in words for word in doc_words})
+        self._words = [word for word, _ in pairs]
+        self._word_docs = [doc for _, doc in pairs]
+
+        trigram_docs: Dict[str, Set[int]] = defaultdict(set)
+        for word, doc in pairs:
+            for trigram in trigrams(word):
+                trigram_docs[trigram].add(doc)
+        self._trigrams = dict(trigram_docs)
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def _prefix(self, term: str) -> Dict[int, float]:
+        """Записи со словом, начинающимся с term: 1.0 за точное совпадение слова, 0.75 за префикс"""
+        matches: Dict[int, float] = {}
+        start = bisect.bisect_left(self._words, term)
+        end = bisect.bisect_left(self._words, term + "\uffff", lo=start)
+        for i in range(start, end):
+            doc = self._word_docs[i]
+            score = 1.0 if self._words[i] == term else 0.75
+            if score > matches.get(doc, 0.0):
+                matches[doc] = score
+        return matches
+
+    def _fuzzy(self, terms: List[str]) -> Dict[int, float]:
+        """Записи, содержащие не меньше TRIGRAM_THRESHOLD триграмм запроса; оценка — доля совпавших"""
+        query_trigrams = set()
+        for term in terms:
+            query_trigrams |= trigrams(term)
+
+        counts: Dict[int, int] = defaultdict(int)
+        for trigram in query_trigrams:
+            for doc in self._trigrams.get(trigram, ()):
+                counts[doc] += 1
+
+        return {
+            doc: 0.5 * count / len(query_trigrams)
+            for doc, count in counts.items() if count >= TRIGRAM_THRESHOLD * len(query_trigrams)
+        }
+
+    def search(self, query: str, kinds: Iterable[str] = SEARCH_KINDS, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        Ищет записи по запросу
+
+        Каждое слово запроса должно быть началом какого-либо слова записи;
+        если таких записей нет, используется нечеткий поиск по триграммам.
+
+        Args:
+            query: Текст запроса
+            kinds: Типы записей (student, teacher, group)
+            limit: Максимальное количество результатов
+
+        Returns:
+            Записи по убыванию оценки совпадения
+        """
+        terms = normalize(query).split()
+        if not terms:
+            return []
+
+        scores: Optional[Dict[int, float]] = None
+        for term in terms:
+            matches = self._prefix(term)
+            if scores is None:
+                scores = matches
+            else:
+                scores = {doc: score + matches[doc] for doc, score in scores.items() if doc in matches}
+            if not scores:
+                break
+
+        if scores:
+            scores = {doc: score / len(terms) for doc, score in scores.items()}
+        else:
+            scores = self._fuzzy(terms)
+
+        kinds = set(kinds)
+        ranked = sorted(
+            (doc for doc in scores if self.documents[doc].kind in kinds),
+            key=lambda doc: (-scores[doc], self.documents[doc].title, self.documents[doc].id)
+        )
+        return [self.documents[doc].to_dict(scores[doc]) for doc in ranked[:limit]]
+
+
+def build_index(students: List[Tuple], teachers: List[Tuple], groups: List[Tuple]) -> SearchIndex:
+    """
+    Строит индекс по выборкам из БД
+
+    Args:
+        students: Кортежи (ID, ФИО, email, код группы)
+        teachers: Кортежи (ID, ФИО)
+        groups: Кортежи (ID, код)
+
+    Returns:
+        Поисковый индекс
+    """
+    documents: List[SearchDocument] = []
+    words: List[Tuple[int, List[str]]] = []
+
+    def add(document: SearchDocument, *texts: Optional[str], compact: Iterable[Optional[str]] = ()) -> None:
+        doc_words = []
+        for text in texts:
+            doc_words.extend(normalize(text).split())
+        # Коды и email также ищутся без разделителей: "кмбо0521" найдет "КМБО-05-21"
+        for text in compact:
+            value = normalize(text).replace(" ", "")
+            if value:
+                doc_words.append(value)
+        words.append((len(documents), doc_words))
+        documents.append(document)
+
+    for student_id, full_name, email, group_code in students:
+        add(SearchDocument("student", student_id, full_name, email=email, group=group_code),
+            full_name, email, compact=(email,))
+    for teacher_id, full_name in teachers:
+        add(SearchDocument("teacher", teacher_id, full_name), full_name)
+    for group_id, code in groups:
+        add(SearchDocument("group", group_id, code), code, compact=(code,))
+
+    return SearchIndex(documents, words)
+
+
+class SearchService:
+    """Текущий индекс процесса и его перестройка при изменении таблиц"""
+
+    def __init__(self):
+        self._index: Optional[SearchIndex] = None
+        self._versions: Optional[str] = None
+        self._lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._subscribed = False
+
+    def is_stale(self) -> bool:
+        """Проверяет, отстает ли построенный индекс от текущих версий таблиц (поиск ответит по нему)"""
+        return self._index is not None and self._versions != versions_token(*SEARCH_TABLES)
+
+    async def refresh(self) -> SearchIndex:
+        """
+        Возвращает индекс. Если таблицы изменились, перестройка запускается в фоне,
+        а до ее завершения возвращается прежний индекс; ждать приходится только
+        построения первого индекса
+        """
+        versions = versions_token(*SEARCH_TABLES)
+        if self._index is not None:
+            if self._versions != versions:
+                self._schedule_rebuild()
+            return self._index
+
+        return await self._rebuild()
+
+    async def _rebuild(self) -> SearchIndex:
+        """Перестраивает индекс, если он устарел (одновременно выполняется одна перестройка)"""
+        async with self._lock:
+            # Версии снимаются до чтения данных: изменение во время загрузки вызовет повторную перестройку
+            versions = versions_token(*SEARCH_TABLES)
+            if self._index is None or self._versions != versions:
+                # Индекс хранится под текущими версиями, поэтому читается из основной базы, а не с реплики
+                with use_primary():
+                    students = await Student.all().order_by('id').values_list(
+                        'id', 'full_name', 'email', 'group__code'
+                    )
+                    teachers = await Teacher.all().order_by('id').values_list('id', 'full_name')
+                    groups = await Group.all().order_by('id').values_list('id', 'code')
+                self._index = await asyncio.to_thread(build_index, students, teachers, groups)
+                self._versions = versions
+            return self._index
+
+    def _schedule_rebuild(self) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = loop.create_task(self._refresh_in_background())
+
+    def _on_table_changed(self, table: str) -> None:
+        if self._index is not None:
+            self._schedule_rebuild()
+
+    async def _refresh_in_background(self) -> None:
+        try:
+            await self._rebuild()
+        except Exception:
+            logger.exception("Не удалось перестроить поисковый индекс")
+
+    def subscribe(self) -> None:
+        """Перестраивает индекс в фоне при изменении таблиц в текущем процессе"""
+        if not self._subscribed:
+            for table in SEARCH_TABLES:
+                subscribe(table, self._on_table_changed)
+            self._subscribed = True
+
+    async def search(self, query: str, kinds: Iterable[str] = SEARCH_KINDS, limit: int = 20) -> List[Dict[str, Any]]:
+        """Ищет студентов, преподавателей и группы (см. SearchIndex.search)"""
+        index = await self.refresh()
+        return index.search(query, kinds, limit)
+
+
+SEARCH_SERVICE = SearchService()
+SEARCH_SERVICE.subscribe()
@@ -0,0 +1,102 @@
+"""
+Быстрая запись табличных листов Excel.
+
+Лист очищается одной операцией, без обхода и создания пустых ячеек. Строки
+добавляются пакетами через Worksheet.append. Оформление задается общими
+именованными стилями книги вместо новых объектов Font/Alignment на каждую
+ячейку, поэтому время записи пропорционально объему данных.
+"""
+from itertools import repeat
+from typing import Any, Iterable, Optional, Sequence, Union
+
+from openpyxl import Workbook
+from openpyxl.cell import Cell
+from openpyxl.styles import Alignment, Font, NamedStyle
+from openpyxl.worksheet.cell_range import MultiCellRange
+from openpyxl.worksheet.worksheet import Worksheet
+
+STYLE_TITLE = "sheet_title"
+STYLE_HEADER = "sheet_header"
+STYLE_CELL = "sheet_cell"
+
+# Оформление именованных стилей (объекты NamedStyle создаются для каждой книги)
+SHEET_STYLES = {
+    STYLE_TITLE: {"font": Font(bold=True, size=14)},
+    STYLE_HEADER: {"font": Font(bold=True), "alignment": Alignment(horizontal='center', vertical='center')},
+    STYLE_CELL: {"alignment": Alignment(horizontal='center', vertical='center')},
+}
+
+RowStyle = Union[None, str, Sequence[Optional[str]]]
+
+
+def ensure_styles(workbook: Workbook) -> None:
+    """Регистрирует в книге именованные стили SHEET_STYLES, которых в ней еще нет"""
+    existing = set(workbook.named_styles)
+    for name, attributes in SHEET_STYLES.items():
+        if name not in existing:
+            workbook.add_named_style(NamedStyle(name=name, **attributes))
+
+
+class SheetWriter:
+    """Последовательная запись строк на лист с общими именованными стилями"""
+
+    def __init__(self, worksheet: Worksheet):
+        self.worksheet = worksheet
+        ensure_styles(worksheet.parent)
+
+    def reset(self) -> None:
+        """
+        Удаляет все ячейки и объединения листа; запись продолжается с первой строки
+
+        Размеры столбцов, параметры печати и стили книги сохраняются.
+        """
+        # У openpyxl нет публичной очистки листа: delete_rows и присваивание None обходят каждую ячейку
+        self.worksheet._cells.clear()
+        self.worksheet._current_row = 0
+        self.worksheet.merged_cells = MultiCellRange()
+
+    @property
+    def row(self) -> int:
+        """Номер последней записанной строки"""
+        return self.worksheet._current_row
+
+    def append(self, values: Iterable[Any], style: RowStyle = None) -> int:
+        """
+        Добавляет строку после последней записанной
+
+        Args:
+            values: Значения ячеек начиная с первого столбца
+            style: Имя стиля для всех ячеек строки или последовательность имен по столбцам
+
+        Returns:
+            Номер добавленной строки
+        """
+        styles = repeat(style) if style is None or isinstance(style, str) else iter(style)
+        cells = []
+        for value in values:
+            cell = Cell(self.worksheet, value=value)
+            name = next(styles, None)
+            if name is not None:
+                cell.style = name
+            cells.append(cell)
+        self.worksheet.append(cells)
+        return self.row
+
+    def append_rows(self, rows: Iterable[Iterable[Any]], style: RowStyle = None) -> None:
+        """
+        Добавляет строки пакетом с одинаковым оформлением
+
+        Args:
+            rows: Строки значений
+            style: Стиль строк (см. append)
+        """
+        for values in rows:
+            self.append(values, style)
+
+    def skip(self, count: int = 1) -> None:
+        """Оставляет пустые строки, не создавая ячеек"""
+        self.worksheet._current_row += count
+
+    def merge_row(self, row: int, end_column: int) -> None:
+        """Объединяет ячейки строки с первого столбца по end_column"""
+        self.worksheet.merge_cells(start_row=row, start_column=1, end_row=row, end_column=end_column)
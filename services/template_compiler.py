@@ -0,0 +1,204 @@
+"""
+Компиляция DOCX-шаблонов в план замен (patch plan).
+
+При компиляции шаблон один раз просматривается так же, как это делает
+DocxService.find_highlighted_text, и для каждого выделенного фрагмента
+запоминается путь к элементу w:r (индексы дочерних элементов от w:body),
+ключ замены (текст фрагмента) и действие. При генерации план применяется
+к свежезагруженному документу переходом по индексам, без обхода абзацев
+и таблиц.
+
+Перед применением каждый элемент плана проверяется (тот же тег, текст и
+выделение); если документ был изменен так, что план устарел, применение
+отменяется и вызывающий код выполняет обычный поиск.
+"""
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from docx.document import Document
+from docx.oxml.ns import qn
+from docx.text.run import Run
+
+from services.template_versions import TEMPLATE_VERSIONS
+
+ACTION_REPLACE = "replace"
+
+_RUN = qn("w:r")
+
+
+class Patch:
+    """Элемент плана: путь к прогону, ключ замены и действие"""
+
+    __slots__ = ("path", "key", "action")
+
+    def __init__(self, path: Tuple[int, ...], key: str, action: str = ACTION_REPLACE):
+        self.path = path
+        self.key = key
+        self.action = action
+
+
+class PatchPlan:
+    """Упорядоченный список замен скомпилированного шаблона"""
+
+    __slots__ = ("patches", "placeholders")
+
+    def __init__(self, patches: List[Patch]):
+        self.patches = patches
+        # Уникальные ключи в порядке появления в документе
+        self.placeholders = list(dict.fromkeys(patch.key for patch in patches))
+
+    def _resolve(self, body) -> Optional[list]:
+        """Находит прогоны плана; None, если документ не соответствует плану"""
+        runs = []
+        for patch in self.patches:
+            node = body
+            try:
+                for index in patch.path:
+                    node = node[index]
+            except IndexError:
+                return None
+
+            if node.tag != _RUN:
+                return None
+            run = Run(node, None)
+            if run.text.strip() != patch.key or not run.font.highlight_color:
+                return None
+            runs.append(run)
+        return runs
+
+    def apply(self, document: Document, replacement_map: Dict[str, str]) -> bool:
+        """
+        Применяет план: подставляет значения и снимает выделение
+
+        Args:
+            document: Документ, загруженный из скомпилированного шаблона
+            replacement_map: Словарь замен {текст фрагмента: значение}
+
+        Returns:
+            True, если план применен; False, если документ не соответствует плану
+            (в этом случае документ не изменяется)
+        """
+        runs = self._resolve(document.element.body)
+        if runs is None:
+            return False
+
+        for patch, run in zip(self.patches, runs):
+            if patch.key in replacement_map:
+                run.text = str(replacement_map[patch.key])
+            run.font.highlight_color = None
+
+        return True
+
+
+def _element_path(element, root) -> Tuple[int, ...]:
+    path = []
+    while element is not root:
+        parent = element.getparent()
+        path.append(parent.index(element))
+        element = parent
+    return tuple(reversed(path))
+
+
+def compile_document(document: Document) -> PatchPlan:
+    """
+    Строит план замен по исходному (незаполненному) документу
+
+    Порядок обхода совпадает с DocxService.find_highlighted_text: абзацы тела,
+    затем абзацы ячеек таблиц. Объединенные ячейки учитываются один раз.
+
+    Args:
+        document: Документ, только что загруженный из шаблона
+
+    Returns:
+        План замен
+    """
+    body = document.element.body
+    paragraphs = list(document.paragraphs)
+    for table in document.tables:
+        for row in table.rows:
+            for cell in row.cells:
+                paragraphs.extend(cell.paragraphs)
+
+    patches = []
+    seen = set()
+    for paragraph in paragraphs:
+        for run in paragraph.runs:
+            if run._r in seen or not run.font.highlight_color:
+                continue
+            seen.add(run._r)
+            patches.append(Patch(_element_path(run._r, body), run.text.strip()))
+
+    return PatchPlan(patches)
+
+
+class TemplateCompiler:
+    """
+    Кэш планов замен по версиям шаблонов.
+
+    План ключуется хэшем содержимого файла (см. TEMPLATE_VERSIONS): после правки
+    шаблона используется план новой версии, а копии шаблона с одинаковым
+    содержимым разделяют один план.
+    """
+
+    def __init__(self):
+        self._plans: Dict[str, PatchPlan] = {}
+        self._lock = threading.Lock()
+
+    def cached(self, path: str) -> Optional[PatchPlan]:
+        """Возвращает план текущей версии файла, если он уже скомпилирован"""
+        content_hash = TEMPLATE_VERSIONS.content_hash(path)
+        with self._lock:
+            return self._plans.get(content_hash)
+
+    def plan_for(self, path: str, document: Document) -> PatchPlan:
+        """
+        Возвращает план шаблона, компилируя его по загруженному документу при необходимости
+
+        Args:
+            path: Путь к файлу шаблона
+            document: Документ, только что загруженный из этого файла
+
+        Returns:
+            План замен
+        """
+        content_hash = TEMPLATE_VERSIONS.content_hash(path)
+        with self._lock:
+            plan = self._plans.get(content_hash)
+        if plan is not None:
+            return plan
+
+        plan = compile_document(document)
+        with self._lock:
+            self._plans[content_hash] = plan
+        return plan
+
+    def compile_file(self, path: str) -> PatchPlan:
+        """Компилирует файл шаблона, если план его текущей версии еще не построен"""
+        from docx import Document as load_docx
+
+        plan = self.cached(path)
+        if plan is not None:
+            return plan
+        return self.plan_for(path, load_docx(TEMPLATE_VERSIONS.open(path)))
+
+    def compile_directory(self, directory: str) -> int:
+        """
+        Компилирует все DOCX-шаблоны каталога (при старте приложения)
+
+        Returns:
+            Количество скомпилированных шаблонов
+        """
+        compiled = 0
+        for name in sorted(os.listdir(directory)):
+            if not name.lower().endswith(".docx") or name.startswith("~$"):
+                continue
+            try:
+                self.compile_file(os.path.join(directory, name))
+            except Exception:
+                continue
+            compiled += 1
+        return compiled
+
+
+TEMPLATE_COMPILER = TemplateCompiler()
@@ -0,0 +1,371 @@
+"""
+Инвентаризация плейсхолдеров шаблонов.
+
+При импорте каждый файл шаблона анализируется один раз: находятся выделенные
+фрагменты, ключи {{...}}, однобуквенные коды и ячейки-маркеры. По ним и по типу
+шаблона определяются обязательные параметры генерации. Результат хранится в
+таблице template_inventories, поэтому проверять запросы и отбрасывать лишние
+параметры можно без открытия файла.
+"""
+import os
+import re
+from typing import Any, Dict, List, Tuple
+
+from core.executor import run_blocking
+from models.models import Template, TemplateInventory
+from services.docx_service import DocxService
+from services.output_cache import DATA_TABLES
+from services.template_compiler import compile_document
+from services.template_versions import TEMPLATE_VERSIONS
+from services.xlsx_service import XlsxService
+
+ALL_PARAMS = (
+    'group_id', 'student_id', 'teacher_id', 'discipline_id', 'classroom_id',
+    'start_date', 'ticket_number', 'day_of_week', 'group_id_2'
+)
+
+# Параметры с идентификаторами записей, данные по которым загружаются из БД
+DATA_PARAMS = ('group_id', 'student_id', 'teacher_id', 'discipline_id', 'classroom_id', 'group_id_2')
+
+# Какой параметр заполняет однобуквенный код в обработчике каждого типа (см. DocxService.process_*)
+CODE_PARAMS: Dict[str, Dict[str, str]] = {
+    DocxService.TEMPLATE_TYPE_MASTER_TITLE: {'J': 'discipline_id', 'N': 'student_id', 'T': 'student_id',
+                                             'O': 'teacher_id'},
+    DocxService.TEMPLATE_TYPE_BACHELOR_TITLE: {'J': 'discipline_id', 'N': 'student_id', 'T': 'student_id',
+                                               'O': 'teacher_id', 'M': 'teacher_id'},
+    DocxService.TEMPLATE_TYPE_EXAM_TICKET: {'T': 'discipline_id'},
+    DocxService.TEMPLATE_TYPE_ABSTRACT: {'N': 'discipline_id', 'G': 'student_id', 'P': 'teacher_id'},
+    DocxService.TEMPLATE_TYPE_LAB_WORK: {'N': 'discipline_id', 'G': 'student_id', 'S': 'student_id',
+                                         'P': 'teacher_id'},
+    DocxService.TEMPLATE_TYPE_COURSE_WORK: {'N': 'discipline_id', 'G': 'student_id', 'S': 'student_id',
+                                            'P': 'teacher_id'},
+    DocxService.TEMPLATE_TYPE_COURSE_PROJECT: {'N': 'discipline_id', 'G': 'student_id', 'S': 'student_id',
+                                               'P': 'teacher_id'},
+    DocxService.TEMPLATE_TYPE_PRACTICE_THEMES: {'G': 'discipline_id'},
+    DocxService.TEMPLATE_TYPE_PUBLICATIONS: {'T': 'student_id', 'G': 'student_id', 'J': 'student_id'},
+    DocxService.TEMPLATE_TYPE_LITERATURE: {'G': 'discipline_id'},
+    DocxService.TEMPLATE_TYPE_EXAM_QUESTIONS: {'G': 'discipline_id'},
+    DocxService.TEMPLATE_TYPE_TEACHER_SCHEDULE: {'M': 'teacher_id', 'P': 'teacher_id'},
+    DocxService.TEMPLATE_TYPE_PRACTICE_REPORT: {'M': 'student_id', 'S': 'student_id', 'B': 'teacher_id'},
+    DocxService.TEMPLATE_TYPE_TASK: {'N': 'student_id', 'M': 'student_id'},
+    DocxService.TEMPLATE_TYPE_RATING_SYSTEM: {'P': 'teacher_id', 'B': 'teacher_id', 'O': 'teacher_id',
+                                              'M': 'student_id'},
+    DocxService.TEMPLATE_TYPE_GENERIC: {'P': 'teacher_id', 'B': 'teacher_id', 'O': 'teacher_id',
+                                        'M': 'student_id'},
+}
+
+# Параметры, от которых зависит содержимое списков и таблиц документа независимо от кодов
+CONTENT_PARAMS: Dict[str, Tuple[str, ...]] = {
+    DocxService.TEMPLATE_TYPE_EXAM_TICKET: ('discipline_id',),
+    DocxService.TEMPLATE_TYPE_LITERATURE: ('discipline_id',),
+    DocxService.TEMPLATE_TYPE_EXAM_QUESTIONS: ('discipline_id',),
+    DocxService.TEMPLATE_TYPE_PUBLICATIONS: ('student_id',),
+    DocxService.TEMPLATE_TYPE_TEACHER_SCHEDULE: ('teacher_id',),
+    DocxService.TEMPLATE_TYPE_CLASSROOM_SCHEDULE: ('classroom_id',),
+    XlsxService.TEMPLATE_TYPE_JOURNAL: ('group_id', 'discipline_id'),
+    XlsxService.TEMPLATE_TYPE_STUDENT_LIST: ('group_id',),
+    XlsxService.TEMPLATE_TYPE_TEACHER_SCHEDULE: ('teacher_id',),
+    XlsxService.TEMPLATE_TYPE_CLASSROOM_SCHEDULE: ('classroom_id',),
+}
+
+# Параметры, которые читает обработчик типа; для XLSX-шаблонов — все параметры
+ACCEPTED_PARAMS: Dict[str, Tuple[str, ...]] = {
+    DocxService.TEMPLATE_TYPE_MASTER_TITLE: ('discipline_id', 'student_id', 'teacher_id'),
+    DocxService.TEMPLATE_TYPE_BACHELOR_TITLE: ('discipline_id', 'student_id', 'teacher_id'),
+    DocxService.TEMPLATE_TYPE_EXAM_TICKET: ('discipline_id', 'ticket_number'),
+    DocxService.TEMPLATE_TYPE_ABSTRACT: ('discipline_id', 'student_id', 'teacher_id'),
+    DocxService.TEMPLATE_TYPE_LAB_WORK: ('discipline_id', 'student_id', 'teacher_id'),
+    DocxService.TEMPLATE_TYPE_COURSE_WORK: ('discipline_id', 'student_id', 'teacher_id'),
+    DocxService.TEMPLATE_TYPE_COURSE_PROJECT: ('discipline_id', 'student_id', 'teacher_id'),
+    DocxService.TEMPLATE_TYPE_PRACTICE_THEMES: ('discipline_id',),
+    DocxService.TEMPLATE_TYPE_PUBLICATIONS: ('student_id',),
+    DocxService.TEMPLATE_TYPE_LITERATURE: ('discipline_id',),
+    DocxService.TEMPLATE_TYPE_EXAM_QUESTIONS: ('discipline_id',),
+    DocxService.TEMPLATE_TYPE_TEACHER_SCHEDULE: ('teacher_id', 'day_of_week'),
+    DocxService.TEMPLATE_TYPE_SECTION_PROGRAM: (),
+    DocxService.TEMPLATE_TYPE_PRACTICE_REPORT: ('student_id', 'teacher_id'),
+    DocxService.TEMPLATE_TYPE_TASK: ('student_id',),
+    DocxService.TEMPLATE_TYPE_CLASSROOM_SCHEDULE: ('classroom_id', 'group_id', 'group_id_2', 'day_of_week'),
+    DocxService.TEMPLATE_TYPE_RATING_SYSTEM: ('group_id', 'student_id', 'teacher_id', 'discipline_id', 'start_date'),
+    DocxService.TEMPLATE_TYPE_GENERIC: ('group_id', 'student_id', 'teacher_id', 'discipline_id'),
+}
+
+PEOPLE_TABLES = ('teachers', 'groups', 'students', 'disciplines')
+SCHEDULE_TABLES = ('schedule_items', 'time_slots', 'classrooms', 'teachers', 'groups', 'disciplines')
+
+# Таблицы, которые читает обработчик типа (кроме templates, от которой зависят все типы).
+# XlsxService заполняет коды людей и дисциплины в любом XLSX-шаблоне
+TEMPLATE_TABLES: Dict[str, Tuple[str, ...]] = {
+    DocxService.TEMPLATE_TYPE_MASTER_TITLE: PEOPLE_TABLES,
+    DocxService.TEMPLATE_TYPE_BACHELOR_TITLE: PEOPLE_TABLES,
+    DocxService.TEMPLATE_TYPE_EXAM_TICKET: ('disciplines', 'exam_questions'),
+    DocxService.TEMPLATE_TYPE_ABSTRACT: ('teachers', 'students', 'disciplines'),
+    DocxService.TEMPLATE_TYPE_LAB_WORK: PEOPLE_TABLES,
+    DocxService.TEMPLATE_TYPE_COURSE_WORK: PEOPLE_TABLES,
+    DocxService.TEMPLATE_TYPE_COURSE_PROJECT: PEOPLE_TABLES,
+    DocxService.TEMPLATE_TYPE_PRACTICE_THEMES: ('disciplines',),
+    DocxService.TEMPLATE_TYPE_PUBLICATIONS: ('groups', 'students', 'publications'),
+    DocxService.TEMPLATE_TYPE_LITERATURE: ('disciplines',),
+    DocxService.TEMPLATE_TYPE_EXAM_QUESTIONS: ('disciplines', 'exam_questions'),
+    DocxService.TEMPLATE_TYPE_TEACHER_SCHEDULE: SCHEDULE_TABLES,
+    DocxService.TEMPLATE_TYPE_SECTION_PROGRAM: (),
+    DocxService.TEMPLATE_TYPE_PRACTICE_REPORT: ('teachers', 'groups', 'students'),
+    DocxService.TEMPLATE_TYPE_TASK: ('groups', 'students'),
+    DocxService.TEMPLATE_TYPE_CLASSROOM_SCHEDULE: SCHEDULE_TABLES,
+    DocxService.TEMPLATE_TYPE_RATING_SYSTEM: PEOPLE_TABLES + ('control_works', 'grades'),
+    DocxService.TEMPLATE_TYPE_GENERIC: PEOPLE_TABLES,
+    XlsxService.TEMPLATE_TYPE_JOURNAL: PEOPLE_TABLES + ('control_works', 'grades'),
+    XlsxService.TEMPLATE_TYPE_STUDENT_LIST: PEOPLE_TABLES,
+    XlsxService.TEMPLATE_TYPE_TEACHER_SCHEDULE: SCHEDULE_TABLES,
+    XlsxService.TEMPLATE_TYPE_CLASSROOM_SCHEDULE: SCHEDULE_TABLES,
+    XlsxService.TEMPLATE_TYPE_GENERIC: PEOPLE_TABLES,
+}
+
+
+def template_tables(template_type: str) -> Tuple[str, ...]:
+    """Таблицы, от которых зависит содержимое документа типа (для неизвестных типов — все DATA_TABLES)"""
+    tables = TEMPLATE_TABLES.get(template_type)
+    return DATA_TABLES if tables is None else ('templates',) + tables
+
+
+# Параметр, заполняющий ключ {{...}}, по первому слову ключа
+KEY_PARAMS = {
+    'group': 'group_id',
+    'course': 'group_id',
+    'students': 'group_id',
+    'student': 'student_id',
+    'teacher': 'teacher_id',
+    'discipline': 'discipline_id',
+    'classroom': 'classroom_id',
+}
+
+KEY_PATTERN = re.compile(r"\{\{([^}]+)\}\}")
+CODE_PATTERN = re.compile(r"[A-Z]")
+MARKER_PATTERN = re.compile(r"(\d+\.\s*)?([A-Za-z])")
+
+MAX_MARKERS = 200
+
+
+def template_type_for(template: Template) -> str:
+    """Определяет тип шаблона по имени и типу файла"""
+    if template.file_type.lower() == 'xlsx':
+        return XlsxService().determine_template_type(template.name)
+    return DocxService.template_type_for_name(template.name)
+
+
+def _marker_letter(text: str) -> str:
+    """Буква маркера, если каждая строка текста — маркер вида "M" или "1. M", иначе пустая строка"""
+    letters = set()
+    for line in text.strip().splitlines():
+        match = MARKER_PATTERN.fullmatch(line.strip())
+        if not match:
+            return ""
+        letters.add(match.group(2))
+    return letters.pop() if len(letters) == 1 else ""
+
+
+def _analyze_docx(path: str) -> Dict[str, list]:
+    from docx import Document
+
+    document = Document(TEMPLATE_VERSIONS.open(path))
+    highlighted = [key for key in compile_document(document).placeholders if key]
+
+    texts = [paragraph.text for paragraph in document.paragraphs]
+    markers = []
+    seen_cells = set()
+    for table_index, table in enumerate(document.tables):
+        for row_index, row in enumerate(table.rows):
+            for cell_index, cell in enumerate(row.cells):
+                if cell._tc in seen_cells:
+                    continue
+                seen_cells.add(cell._tc)
+                texts.append(cell.text)
+
+                letter = _marker_letter(cell.text)
+                if letter and len(markers) < MAX_MARKERS:
+                    markers.append({
+                        "location": f"table {table_index} row {row_index} cell {cell_index}",
+                        "text": cell.text.strip(),
+                        "code": letter,
+                    })
+
+    for section in document.sections:
+        for part in (section.header, section.footer):
+            texts.extend(paragraph.text for paragraph in part.paragraphs)
+
+    return {"highlighted": highlighted, "texts": texts, "markers": markers}
+
+
+def _analyze_xlsx(path: str) -> Dict[str, list]:
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(TEMPLATE_VERSIONS.open(path))
+    texts = []
+    markers = []
+    for worksheet in workbook.worksheets:
+        for row in worksheet.iter_rows():
+            for cell in row:
+                if not isinstance(cell.value, str):
+                    continue
+                texts.append(cell.value)
+
+                letter = _marker_letter(cell.value)
+                if letter and len(markers) < MAX_MARKERS:
+                    markers.append({
+                        "location": f"{worksheet.title}!{cell.coordinate}",
+                        "text": cell.value.strip(),
+                        "code": letter,
+                    })
+
+    return {"highlighted": [], "texts": texts, "markers": markers}
+
+
+def derive_params(template_type: str, file_type: str, codes: List[str],
+                  keys: List[str]) -> Tuple[List[str], List[str]]:
+    """
+    Определяет обязательные и необязательные параметры по найденным плейсхолдерам
+
+    Args:
+        template_type: Тип шаблона
+        file_type: Тип файла (docx, xlsx)
+        codes: Однобуквенные коды шаблона
+        keys: Ключи {{...}} шаблона
+
+    Returns:
+        Кортеж (обязательные параметры, необязательные параметры)
+    """
+    required = set(CONTENT_PARAMS.get(template_type, ()))
+
+    code_params = CODE_PARAMS.get(template_type, {})
+    required.update(code_params[code] for code in codes if code in code_params)
+
+    for key in keys:
+        param = KEY_PARAMS.get(re.split(r"[_\s.]", key.strip().lower())[0])
+        if param:
+            required.add(param)
+
+    if file_type.lower() == 'xlsx':
+        accepted = set(ALL_PARAMS)
+    else:
+        accepted = set(ACCEPTED_PARAMS.get(template_type, ALL_PARAMS)) | required
+
+    return (
+        [param for param in ALL_PARAMS if param in required],
+        [param for param in ALL_PARAMS if param in accepted - required],
+    )
+
+
+def analyze_template(path: str, file_type: str, template_type: str) -> Dict[str, Any]:
+    """
+    Анализирует файл шаблона
+
+    Args:
+        path: Путь к файлу шаблона
+        file_type: Тип файла (docx, xlsx)
+        template_type: Тип шаблона
+
+    Returns:
+        Словарь с полями инвентаризации (см. TemplateInventory)
+    """
+    found = _analyze_xlsx(path) if file_type.lower() == 'xlsx' else _analyze_docx(path)
+
+    keys = list(dict.fromkeys(
+        match.strip() for text in found["texts"] for match in KEY_PATTERN.findall(text or "")
+    ))
+    codes = sorted(
+        {token for token in found["highlighted"] if CODE_PATTERN.fullmatch(token)}
+        | {marker["code"] for marker in found["markers"] if CODE_PATTERN.fullmatch(marker["code"])}
+    )
+    required, optional = derive_params(template_type, file_type, codes, keys)
+
+    return {
+        "template_type": template_type,
+        "highlighted": found["highlighted"],
+        "keys": keys,
+        "codes": codes,
+        "markers": found["markers"],
+        "required_params": required,
+        "optional_params": optional,
+    }
+
+
+async def refresh_inventory(template: Template, template_dir: str) -> TemplateInventory:
+    """
+    Анализирует шаблон и сохраняет инвентаризацию, если файл изменился
+
+    Args:
+        template: Шаблон
+        template_dir: Каталог шаблонов
+
+    Returns:
+        Актуальная инвентаризация шаблона
+    """
+    path = os.path.join(template_dir, template.file_path)
+    content_hash = await run_blocking(TEMPLATE_VERSIONS.content_hash, path)
+    template_type = template_type_for(template)
+
+    inventory = await TemplateInventory.get_or_none(template_id=template.id)
+    if inventory and inventory.content_hash == content_hash and inventory.template_type == template_type:
+        return inventory
+
+    fields = await run_blocking(analyze_template, path, template.file_type, template_type)
+
+    if inventory:
+        for name, value in fields.items():
+            setattr(inventory, name, value)
+        inventory.content_hash = content_hash
+        await inventory.save()
+        return inventory
+
+    return await TemplateInventory.create(template_id=template.id, content_hash=content_hash, **fields)
+
+
+async def inventory_for(template: Template, template_dir: str) -> TemplateInventory:
+    """
+    Возвращает сохраненную инвентаризацию шаблона; шаблон, добавленный без импорта или
+    сменивший тип (например, после обновления правил определения типа), анализируется заново
+
+    Args:
+        template: Шаблон
+        template_dir: Каталог шаблонов
+
+    Returns:
+        Инвентаризация шаблона
+
+    Raises:
+        FileNotFoundError: Если файла шаблона нет
+        ValueError: Если файл шаблона не удалось разобрать
+    """
+    inventory = await TemplateInventory.get_or_none(template_id=template.id)
+    if inventory is not None and inventory.template_type == template_type_for(template):
+        return inventory
+
+    try:
+        return await refresh_inventory(template, template_dir)
+    except FileNotFoundError:
+        raise
+    except Exception as e:
+        raise ValueError(f"Не удалось проанализировать шаблон {template.file_path}: {e}") from e
+
+
+def filter_params(inventory: TemplateInventory, params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Убирает идентификаторы записей, которые шаблон не использует, чтобы не загружать лишние данные
+
+    Args:
+        inventory: Инвентаризация шаблона
+        params: Параметры запроса
+
+    Returns:
+        Параметры, необходимые шаблону
+    """
+    used = set(inventory.required_params) | set(inventory.optional_params)
+    return {
+        key: (None if key in DATA_PARAMS and key not in used else value)
+        for key, value in params.items()
+    }
+
+
+def missing_params(inventory: TemplateInventory, params: Dict[str, Any]) -> List[str]:
+    """Возвращает обязательные параметры, не переданные в запросе"""
+    return [param for param in inventory.required_params if params.get(param) is None]
@@ -0,0 +1,364 @@
+"""
+Версии шаблонов по хэшу содержимого и фоновое отслеживание изменений.
+
+Шаблоны редактируются на месте в TEMPLATE_DIR. Каждое новое содержимое файла
+сохраняется как неизменяемая версия: запись template_versions и копия файла
+в RUNTIME_DIR/template_versions/<sha256>.<расширение>. Текущее содержимое
+шаблонов хранится в памяти и хэшируется при чтении. Кэши, зависящие от
+содержимого шаблона (планы замен, инвентаризация), ключуются хэшем версии,
+поэтому после правки файла они не требуют перезапуска.
+
+Фоновая задача опрашивает mtime и размер файлов каталога шаблонов и для
+измененных файлов в фоне записывает новую версию, перекомпилирует план замен
+и обновляет инвентаризацию — вне обработки запросов.
+"""
+import asyncio
+import hashlib
+import io
+import logging
+import os
+import shutil
+import threading
+import uuid
+from typing import Dict, List, Optional, Tuple, Union
+
+from tortoise.exceptions import IntegrityError
+
+from core.config import settings
+from core.executor import run_blocking
+from core.preload import import_module
+from models.models import Template, TemplateVersion
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DIR = os.path.join(settings.RUNTIME_DIR, "template_versions")
+
+TEMPLATE_EXTENSIONS = (".docx", ".xlsx")
+
+
+def file_hash(path: str) -> str:
+    """Возвращает SHA-256 содержимого файла"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class FileVersion:
+    """Известное состояние файла: подпись (mtime, размер), хэш и содержимое"""
+
+    __slots__ = ("signature", "content_hash", "content")
+
+    def __init__(self, signature: Tuple[int, int], content_hash: str, content: Optional[bytes]):
+        self.signature = signature
+        self.content_hash = content_hash
+        # None, если файл больше TEMPLATE_STORE_MAX_FILE_BYTES и читается с диска
+        self.content = content
+
+
+class TemplateVersionIndex:
+    """
+    Хранилище файлов шаблонов в памяти с хэшами их содержимого.
+
+    Каждый файл читается один раз: содержимое остается в памяти, а хэш для
+    версионирования считается по тем же байтам. Документы открываются из
+    io.BytesIO поверх неизменяемых bytes — буфер не копируется, пока в него
+    не пишут, и каждый запрос получает собственную позицию чтения.
+
+    Пока работает фоновое отслеживание изменений (trusted), запросы берут
+    файлы из памяти без обращения к файловой системе; без него перед
+    использованием файла проверяется его подпись (один вызов stat).
+    """
+
+    def __init__(self, max_file_bytes: int):
+        self.max_file_bytes = max_file_bytes
+        self.trusted = False
+        self._files: Dict[str, FileVersion] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def signature(path: str) -> Tuple[int, int]:
+        stat_result = os.stat(path)
+        return stat_result.st_mtime_ns, stat_result.st_size
+
+    def _read(self, path: str, attempts: int = 3) -> FileVersion:
+        for _ in range(attempts):
+            signature = self.signature(path)
+            if signature[1] > self.max_file_bytes:
+                return FileVersion(signature, file_hash(path), None)
+
+            with open(path, "rb") as f:
+                content = f.read()
+            # Файл переписывали во время чтения — читаем заново
+            if self.signature(path) == signature:
+                break
+        return FileVersion(signature, hashlib.sha256(content).hexdigest(), content)
+
+    def refresh(self, path: str) -> FileVersion:
+        """Перечитывает файл и заменяет его запись в хранилище"""
+        version = self._read(path)
+        with self._lock:
+            self._files[path] = version
+        return version
+
+    def load(self, path: str) -> FileVersion:
+        """
+        Возвращает запись файла, читая его при первом обращении или после изменения
+
+        Args:
+            path: Путь к файлу шаблона
+
+        Returns:
+            Подпись, хэш и содержимое файла
+        """
+        with self._lock:
+            known = self._files.get(path)
+        if known and (self.trusted or known.signature == self.signature(path)):
+            return known
+        return self.refresh(path)
+
+    def content_hash(self, path: str) -> str:
+        """Возвращает SHA-256 текущего содержимого файла"""
+        return self.load(path).content_hash
+
+    def open(self, path: str) -> Union[io.BytesIO, str]:
+        """
+        Возвращает источник для python-docx/openpyxl
+
+        Returns:
+            BytesIO с содержимым шаблона или путь, если файл не хранится в памяти
+        """
+        content = self.load(path).content
+        return io.BytesIO(content) if content is not None else path
+
+    def exists(self, path: str) -> bool:
+        """Проверяет наличие файла; известный файл в режиме trusted не проверяется на диске"""
+        if self.trusted:
+            with self._lock:
+                if path in self._files:
+                    return True
+        return os.path.exists(path)
+
+    def known_hash(self, path: str) -> Optional[str]:
+        """Возвращает последний вычисленный хэш файла без обращения к диску"""
+        with self._lock:
+            known = self._files.get(path)
+        return known.content_hash if known else None
+
+    def forget(self, path: str) -> None:
+        """Удаляет файл из хранилища"""
+        with self._lock:
+            self._files.pop(path, None)
+
+    def template_files(self, directory: str) -> List[str]:
+        """Возвращает пути файлов шаблонов каталога"""
+        return [
+            os.path.join(directory, name) for name in sorted(os.listdir(directory))
+            if name.lower().endswith(TEMPLATE_EXTENSIONS) and not name.startswith("~$")
+        ]
+
+    def load_directory(self, directory: str) -> int:
+        """
+        Загружает в память все шаблоны каталога (при старте приложения)
+
+        Returns:
+            Количество загруженных файлов
+        """
+        loaded = 0
+        for path in self.template_files(directory):
+            try:
+                self.load(path)
+            except OSError:
+                continue
+            loaded += 1
+        return loaded
+
+    def changed(self, directory: str) -> List[str]:
+        """
+        Находит файлы шаблонов, чья подпись отличается от известной (в том числе новые и удаленные)
+
+        Args:
+            directory: Каталог шаблонов
+
+        Returns:
+            Пути измененных файлов
+        """
+        changed = []
+        for path in self.template_files(directory):
+            try:
+                signature = self.signature(path)
+            except OSError:
+                continue
+            with self._lock:
+                known = self._files.get(path)
+            if known is None or known.signature != signature:
+                changed.append(path)
+
+        with self._lock:
+            known_paths = [path for path in self._files if os.path.dirname(path) == directory]
+        changed.extend(path for path in known_paths if not os.path.exists(path))
+        return changed
+
+
+TEMPLATE_VERSIONS = TemplateVersionIndex(settings.TEMPLATE_STORE_MAX_FILE_BYTES)
+
+
+def snapshot_path(content_hash: str, file_type: str) -> str:
+    """Путь к неизменяемой копии версии шаблона"""
+    return os.path.join(SNAPSHOT_DIR, f"{content_hash}.{file_type.lower()}")
+
+
+def store_snapshot(source: str, version: FileVersion, file_type: str) -> str:
+    """
+    Сохраняет копию файла версии; существующая копия не перезаписывается
+
+    Args:
+        source: Путь к файлу шаблона
+        version: Запись хранилища шаблонов для этого файла
+        file_type: Тип файла (docx, xlsx)
+
+    Returns:
+        Путь к копии
+    """
+    target = snapshot_path(version.content_hash, file_type)
+    if os.path.exists(target):
+        return target
+
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    tmp_path = os.path.join(SNAPSHOT_DIR, f".{uuid.uuid4().hex}.tmp")
+    try:
+        if version.content is not None:
+            # Сохраняем те же байты, по которым посчитан хэш
+            with open(tmp_path, "wb") as f:
+                f.write(version.content)
+        else:
+            shutil.copyfile(source, tmp_path)
+            # Файл мог измениться во время копирования — сохраняем только совпадающее содержимое
+            if file_hash(tmp_path) != version.content_hash:
+                raise ValueError(f"Файл {source} изменился во время сохранения версии")
+        os.replace(tmp_path, target)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return target
+
+
+def copy_template_file(file_path: str) -> str:
+    """
+    Копирует файл шаблона в каталоге шаблонов под свободным именем
+
+    Args:
+        file_path: Имя файла шаблона в TEMPLATE_DIR
+
+    Returns:
+        Имя файла копии в TEMPLATE_DIR
+    """
+    stem, extension = os.path.splitext(file_path)
+    suffix = " (копия)"
+    number = 1
+    while os.path.exists(os.path.join(settings.TEMPLATE_DIR, f"{stem}{suffix}{extension}")):
+        number += 1
+        suffix = f" (копия {number})"
+
+    new_file_path = f"{stem}{suffix}{extension}"
+    shutil.copy2(os.path.join(settings.TEMPLATE_DIR, file_path), os.path.join(settings.TEMPLATE_DIR, new_file_path))
+    return new_file_path
+
+
+async def record_version(template: Template) -> TemplateVersion:
+    """
+    Записывает текущее содержимое файла шаблона как новую версию, если оно изменилось
+
+    Args:
+        template: Шаблон
+
+    Returns:
+        Актуальная версия шаблона
+    """
+    path = os.path.join(settings.TEMPLATE_DIR, template.file_path)
+    current = await run_blocking(TEMPLATE_VERSIONS.load, path)
+
+    latest = await TemplateVersion.filter(template_id=template.id).order_by('-version').first()
+    if latest and latest.content_hash == current.content_hash:
+        return latest
+
+    snapshot = await run_blocking(store_snapshot, path, current, template.file_type)
+    try:
+        return await TemplateVersion.create(
+            template_id=template.id,
+            version=(latest.version + 1) if latest else 1,
+            content_hash=current.content_hash,
+            snapshot_path=snapshot
+        )
+    except IntegrityError:
+        # Ту же версию одновременно записал другой воркер
+        return await TemplateVersion.filter(template_id=template.id).order_by('-version').first()
+
+
+async def recompile(template: Template) -> None:
+    """Перекомпилирует план замен и обновляет инвентаризацию шаблона"""
+    path = os.path.join(settings.TEMPLATE_DIR, template.file_path)
+
+    if template.file_type.lower() == 'docx':
+        compiler = await asyncio.to_thread(import_module, "services.template_compiler")
+        await run_blocking(compiler.TEMPLATE_COMPILER.compile_file, path)
+
+    inventory_module = await asyncio.to_thread(import_module, "services.template_inventory")
+    await inventory_module.refresh_inventory(template, settings.TEMPLATE_DIR)
+
+
+async def reload_changed(directory: str) -> int:
+    """
+    Обрабатывает измененные файлы шаблонов: новая версия, план замен и инвентаризация
+
+    Args:
+        directory: Каталог шаблонов
+
+    Returns:
+        Количество шаблонов, получивших новую версию
+    """
+    reloaded = 0
+    for path in await asyncio.to_thread(TEMPLATE_VERSIONS.changed, directory):
+        previous_hash = TEMPLATE_VERSIONS.known_hash(path)
+        try:
+            content_hash = (await run_blocking(TEMPLATE_VERSIONS.refresh, path)).content_hash
+        except FileNotFoundError:
+            TEMPLATE_VERSIONS.forget(path)
+            continue
+        except OSError:
+            continue
+        if content_hash == previous_hash:
+            # Изменилось только время модификации
+            continue
+
+        for template in await Template.filter(file_path=os.path.basename(path)):
+            try:
+                version = await record_version(template)
+                await recompile(template)
+            except Exception:
+                logger.exception("Не удалось обновить шаблон %s", template.file_path)
+                continue
+            if previous_hash is not None:
+                logger.info("Шаблон %s обновлен до версии %s", template.file_path, version.version)
+            reloaded += 1
+    return reloaded
+
+
+async def run_template_watcher(interval: float) -> None:
+    """
+    Фоновая задача, отслеживающая изменения файлов шаблонов
+
+    Пока задача работает, хранилище шаблонов не проверяет файлы на пути запроса:
+    изменения подхватываются не позже чем через interval секунд.
+    """
+    try:
+        while True:
+            try:
+                await reload_changed(settings.TEMPLATE_DIR)
+            except Exception:
+                logger.exception("Ошибка при проверке изменений шаблонов")
+            TEMPLATE_VERSIONS.trusted = True
+            await asyncio.sleep(interval)
+    finally:
+        TEMPLATE_VERSIONS.trusted = False
@@ -1,14 +1,25 @@
+import math
 import os
 import re
-from typing import Dict, Any, List, Optional
+from copy import copy
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime, timedelta
 import openpyxl
 from openpyxl.styles import Font, Alignment
 
+from core.executor import run_blocking
 from services.base_document_service import BaseDocumentService
+from services.journal_store import JOURNAL_STORE, JournalSheet, journal_versions
+from services.output_cache import OutputCache
+from services.rating_engine import (
+    RATING_ENGINE, SUMMARY_HEADERS, RatingResult, ScoreMatrix, due_week, format_score, load_students_matrix
+)
+from services.reference_data import REFERENCE_DATA
+from services.sheet_writer import STYLE_CELL, STYLE_HEADER, STYLE_TITLE, SheetWriter
+from services.template_versions import TEMPLATE_VERSIONS
 from models.models import (
-    Group, Student, Teacher, Discipline, Grade,
-    ScheduleItem, Classroom
+    Group, Student, Teacher, Discipline,
+    ScheduleItem, Classroom, Template, TimeSlot
 )
 
 
@@ -17,6 +28,20 @@ class XlsxService(BaseDocumentService):
     Сервис для обработки XLSX-документов
     """
 
+    TEMPLATE_TYPE_JOURNAL = "journal"
+    TEMPLATE_TYPE_STUDENT_LIST = "student_list"
+    TEMPLATE_TYPE_TEACHER_SCHEDULE = "teacher_schedule_xlsx"
+    TEMPLATE_TYPE_CLASSROOM_SCHEDULE = "classroom_schedule_xlsx"
+    TEMPLATE_TYPE_GENERIC = "generic_xlsx"
+
+    def __init__(self):
+        super().__init__()
+        # Карты ячеек, матрица баллов, версии таблиц и хэш шаблона заполненного журнала оценок
+        self.journal_sheets: List[JournalSheet] = []
+        self.journal_matrix: Optional[ScoreMatrix] = None
+        self.journal_versions: Dict[str, str] = {}
+        self.journal_template_hash: Optional[str] = None
+
     async def load_document(self, template_path: str) -> openpyxl.Workbook:
         """
         Загружает XLSX-документ из файла шаблона
@@ -27,7 +52,10 @@ class XlsxService(BaseDocumentService):
         Returns:
             Объект книги Excel
         """
-        return openpyxl.load_workbook(template_path)
+        return await run_blocking(self._load, template_path)
+
+    def _load(self, template_path: str) -> openpyxl.Workbook:
+        return openpyxl.load_workbook(TEMPLATE_VERSIONS.open(template_path))
 
     async def save_document(self, document: openpyxl.Workbook, output_path: str) -> None:
         """
@@ -37,11 +65,59 @@ class XlsxService(BaseDocumentService):
             document: Объект книги Excel
             output_path: Путь для сохранения
         """
-        document.save(output_path)
+        await run_blocking(document.save, output_path)
+
+    async def generate_document(self, template_id: int, params: Dict[str, Any]) -> str:
+        """
+        Генерирует документ; журнал оценок запоминается для точечного обновления при изменении оценок
+
+        Args:
+            template_id: ID шаблона
+            params: Параметры для генерации документа
+
+        Returns:
+            Путь к сгенерированному файлу
+        """
+        output_path = await super().generate_document(template_id, params)
+        if self.journal_sheets:
+            JOURNAL_STORE.remember(
+                params, output_path, self.journal_sheets, self.journal_matrix, self.journal_versions,
+                self.journal_template_hash
+            )
+        return output_path
+
+    def determine_template_type(self, template_name: str) -> str:
+        """
+        Определяет тип XLSX-шаблона по его имени
+
+        Args:
+            template_name: Имя шаблона
+
+        Returns:
+            Строковый тип шаблона
+        """
+        template_name_lower = template_name.lower()
+
+        if 'журнал' in template_name_lower or 'journal' in template_name_lower:
+            return self.TEMPLATE_TYPE_JOURNAL
+        elif 'список' in template_name_lower or 'list' in template_name_lower or 'студент' in template_name_lower:
+            return self.TEMPLATE_TYPE_STUDENT_LIST
+        elif 'расписание_преподавателя' in template_name_lower or 'teacher_schedule' in template_name_lower:
+            return self.TEMPLATE_TYPE_TEACHER_SCHEDULE
+        elif 'загруженность_аудитории' in template_name_lower or 'classroom_schedule' in template_name_lower:
+            return self.TEMPLATE_TYPE_CLASSROOM_SCHEDULE
+
+        return self.TEMPLATE_TYPE_GENERIC
+
+    async def get_template_type(self, template: Template) -> str:
+        """
+        Возвращает тип XLSX-шаблона для меток метрик
+        """
+        return self.determine_template_type(template.name)
 
     async def fill_grades_journal(self, worksheet: openpyxl.worksheet.worksheet.Worksheet, group_id: int,
                                   discipline_id: int, start_date: Optional[datetime] = None,
-                                  period_weeks: int = 16) -> None:
+                                  period_weeks: int = 16) -> Tuple[JournalSheet, ScoreMatrix]:
         """
         Заполняет журнал оценок для группы по дисциплине
 
@@ -51,11 +127,15 @@ class XlsxService(BaseDocumentService):
             discipline_id: ID дисциплины
             start_date: Начальная дата (по умолчанию текущая)
             period_weeks: Количество недель (по умолчанию 16)
+
+        Returns:
+            Карта ячеек листа и матрица баллов, по которой он заполнен
         """
 
-        group = await Group.get(id=group_id).prefetch_related('students')
+        group = await REFERENCE_DATA.get(Group, group_id)
+        students = await Student.filter(group_id=group_id).order_by('id')
 
-        discipline = await Discipline.get(id=discipline_id).prefetch_related('control_works')
+        discipline = await REFERENCE_DATA.get(Discipline, discipline_id)
 
         if start_date is None:
             start_date = datetime.now()
@@ -86,7 +166,7 @@ class XlsxService(BaseDocumentService):
 
         if not student_cells:
 
-            for row in range(3, min(3 + len(group.students), 30)):
+            for row in range(3, min(3 + len(students), 30)):
                 student_cells.append((row, 1))
 
         if not date_cells:
@@ -97,7 +177,7 @@ class XlsxService(BaseDocumentService):
         if worksheet.cell(row=1, column=1).value:
             worksheet.cell(row=1, column=1).value = f"Журнал оценок - {discipline.name} - Группа {group.code}"
 
-        for i, student in enumerate(group.students):
+        for i, student in enumerate(students):
             if i < len(student_cells):
                 row, col = student_cells[i]
                 cell = worksheet.cell(row=row, column=col)
@@ -120,29 +200,29 @@ class XlsxService(BaseDocumentService):
                 worksheet.column_dimensions[openpyxl.utils.get_column_letter(col)].width = 10
                 current_date += timedelta(days=7)
 
-        for i, student in enumerate(group.students):
-            if i < len(student_cells):
-                student_row, student_col = student_cells[i]
-
-                grades = await Grade.filter(student_id=student.id).prefetch_related('control_work')
-
-                for grade in grades:
-
-                    control_work = grade.control_work
+        # Баллы всей группы загружаются одним запросом в матрицу студенты × контрольные работы
+        matrix = await load_students_matrix(
+            discipline_id, [(student.id, student.full_name) for student in students], [group_id]
+        )
+        # Итоги считаются по работам, срок которых наступил к текущей неделе журнала
+        matrix.due_week = due_week(start_date.date())
 
-                    if control_work.discipline_id == discipline_id:
+        for i in range(min(len(students), len(student_cells))):
+            student_row, _ = student_cells[i]
 
-                        week = control_work.week - 1
+            for j, week in enumerate(matrix.work_weeks):
+                score = matrix.scores[i, j]
+                if week is None or math.isnan(score) or not 0 < week <= len(date_cells):
+                    continue
 
-                        if week < len(date_cells):
-                            _, date_col = date_cells[week]
-                            cell = worksheet.cell(row=student_row, column=date_col)
-                            cell.value = grade.score
+                _, date_col = date_cells[week - 1]
+                cell = worksheet.cell(row=student_row, column=date_col)
+                cell.value = format_score(score)
 
-                            cell.alignment = Alignment(horizontal='center', vertical='center')
+                cell.alignment = Alignment(horizontal='center', vertical='center')
 
         for i in range(len(student_cells)):
-            if i < len(group.students):
+            if i < len(students):
                 student_row, _ = student_cells[i]
                 for j in range(len(date_cells)):
                     _, date_col = date_cells[j]
@@ -152,6 +232,56 @@ class XlsxService(BaseDocumentService):
 
                         cell.alignment = Alignment(horizontal='center', vertical='center')
 
+        summary_col = None
+        if student_cells and date_cells:
+            self.write_journal_summary(worksheet, matrix, RATING_ENGINE.compute(matrix), student_cells, date_cells)
+            summary_col = max(col for _, col in date_cells) + 1
+
+        sheet = JournalSheet(
+            worksheet.title,
+            [student_cells[i][0] for i in range(min(len(students), len(student_cells)))],
+            [
+                date_cells[week - 1][1] if week is not None and 0 < week <= len(date_cells) else None
+                for week in matrix.work_weeks
+            ],
+            summary_col
+        )
+        return sheet, matrix
+
+    def write_journal_summary(self, worksheet: openpyxl.worksheet.worksheet.Worksheet, matrix: ScoreMatrix,
+                              result: RatingResult, student_cells: List[tuple], date_cells: List[tuple]) -> None:
+        """
+        Добавляет справа от колонок дат итоговые колонки БРС: сумму баллов, процент
+        от максимума, количество несданных работ и оценку
+
+        Args:
+            worksheet: Лист Excel
+            matrix: Матрица баллов группы (строки в порядке student_cells)
+            result: Итоги БРС
+            student_cells: Ячейки ФИО студентов
+            date_cells: Ячейки дат
+        """
+        header_row, last_date_col = max(date_cells, key=lambda cell: cell[1])
+        header_border = copy(worksheet.cell(row=header_row, column=last_date_col).border)
+
+        for offset, title in enumerate(SUMMARY_HEADERS, start=1):
+            cell = worksheet.cell(row=header_row, column=last_date_col + offset)
+            cell.value = title
+            cell.font = Font(bold=True)
+            cell.alignment = Alignment(horizontal='center', vertical='center')
+            cell.border = header_border
+            worksheet.column_dimensions[openpyxl.utils.get_column_letter(last_date_col + offset)].width = 12
+
+        for i in range(min(len(matrix.student_ids), len(student_cells))):
+            student_row, _ = student_cells[i]
+            row_border = copy(worksheet.cell(row=student_row, column=last_date_col).border)
+
+            for offset, value in enumerate(result.summary_row(i), start=1):
+                cell = worksheet.cell(row=student_row, column=last_date_col + offset)
+                cell.value = value
+                cell.alignment = Alignment(horizontal='center', vertical='center')
+                cell.border = row_border
+
     async def fill_student_list(self, worksheet: openpyxl.worksheet.worksheet.Worksheet, group_id: int) -> None:
         """
         Заполняет список студентов группы в Excel
@@ -161,7 +291,8 @@ class XlsxService(BaseDocumentService):
             group_id: ID группы
         """
 
-        group = await Group.get(id=group_id).prefetch_related('students')
+        group = await REFERENCE_DATA.get(Group, group_id)
+        students = await Student.filter(group_id=group_id).order_by('id')
 
         for row in range(1, worksheet.max_row + 1):
             for col in range(1, worksheet.max_column + 1):
@@ -220,7 +351,7 @@ class XlsxService(BaseDocumentService):
 
                 if header_row:
 
-                    for i in range(len(group.students)):
+                    for i in range(len(students)):
                         data_rows.append(header_row + 1 + i)
                     break
 
@@ -230,10 +361,10 @@ class XlsxService(BaseDocumentService):
             group_col = group_col or 1
             email_col = email_col or 3
 
-            for i in range(len(group.students)):
+            for i in range(len(students)):
                 data_rows.append(start_row + i)
 
-        for i, student in enumerate(group.students):
+        for i, student in enumerate(students):
             if i < len(data_rows):
                 row = data_rows[i]
 
@@ -276,74 +407,40 @@ class XlsxService(BaseDocumentService):
             Обработанный документ Excel
         """
 
-        teacher = await Teacher.get(id=teacher_id)
+        teacher = await REFERENCE_DATA.get(Teacher, teacher_id)
 
-        schedule_query = ScheduleItem.filter(teacher_id=teacher_id).prefetch_related(
-            'time_slot', 'discipline', 'group', 'classroom'
-        )
+        schedule_query = ScheduleItem.filter(teacher_id=teacher_id)
 
         if day_of_week:
             schedule_query = schedule_query.filter(day_of_week=day_of_week)
 
         schedule_items = await schedule_query.order_by('day_of_week', 'time_slot__number')
+        reference = await REFERENCE_DATA.snapshot()
 
-        schedule_by_day = {}
+        rows_by_day: Dict[str, List[List[Any]]] = {}
         for item in schedule_items:
-            day = item.day_of_week.value
-            if day not in schedule_by_day:
-                schedule_by_day[day] = []
-            schedule_by_day[day].append(item)
+            time_slot = reference.get(TimeSlot, item.time_slot_id)
+            classroom = reference.get_or_none(Classroom, item.classroom_id)
+            rows_by_day.setdefault(item.day_of_week.value, []).append([
+                time_slot.number,
+                f"{time_slot.start_time}-{time_slot.end_time}",
+                reference.get(Discipline, item.discipline_id).name,
+                reference.get(Group, item.group_id).code,
+                classroom.name if classroom else "Нет аудитории",
+            ])
 
         if len(document.worksheets) == 0:
             worksheet = document.create_sheet("Расписание")
         else:
             worksheet = document.worksheets[0]
 
-        for row in range(1, worksheet.max_row + 1):
-            for col in range(1, worksheet.max_column + 1):
-                worksheet.cell(row=row, column=col).value = None
-
-        worksheet.cell(row=1, column=1).value = f"Расписание преподавателя: {teacher.full_name}"
-        worksheet.cell(row=1, column=1).font = Font(bold=True, size=14)
-        worksheet.merge_cells(start_row=1, start_column=1, end_row=1, end_column=5)
-
-        headers = ["День недели", "№ пары", "Время", "Дисциплина", "Группа", "Аудитория"]
-        for i, header in enumerate(headers):
-            cell = worksheet.cell(row=3, column=i + 1)
-            cell.value = header
-            cell.font = Font(bold=True)
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-
-            worksheet.column_dimensions[openpyxl.utils.get_column_letter(i + 1)].width = 15
-
-        row_index = 4
-
-        if schedule_items:
-            for day, items in schedule_by_day.items():
-
-                worksheet.cell(row=row_index, column=1).value = day
-                worksheet.cell(row=row_index, column=1).font = Font(bold=True)
-
-                for item in items:
-                    worksheet.cell(row=row_index, column=2).value = item.time_slot.number
-                    worksheet.cell(row=row_index,
-                                   column=3).value = f"{item.time_slot.start_time}-{item.time_slot.end_time}"
-                    worksheet.cell(row=row_index, column=4).value = item.discipline.name
-                    worksheet.cell(row=row_index, column=5).value = item.group.code
-                    worksheet.cell(row=row_index,
-                                   column=6).value = item.classroom.name if item.classroom else "Нет аудитории"
-
-                    for col in range(1, 7):
-                        worksheet.cell(row=row_index, column=col).alignment = Alignment(horizontal='center',
-                                                                                        vertical='center')
-
-                    row_index += 1
-
-                row_index += 1
-        else:
-
-            worksheet.cell(row=4, column=1).value = "У преподавателя нет занятий в расписании."
-            worksheet.merge_cells(start_row=4, start_column=1, end_row=4, end_column=6)
+        self.write_schedule_sheet(
+            worksheet,
+            f"Расписание преподавателя: {teacher.full_name}",
+            ["День недели", "№ пары", "Время", "Дисциплина", "Группа", "Аудитория"],
+            rows_by_day,
+            "У преподавателя нет занятий в расписании."
+        )
 
         return document
 
@@ -361,75 +458,75 @@ class XlsxService(BaseDocumentService):
             Обработанный документ Excel
         """
 
-        classroom = await Classroom.get(id=classroom_id)
+        classroom = await REFERENCE_DATA.get(Classroom, classroom_id)
 
-        schedule_query = ScheduleItem.filter(classroom_id=classroom_id).prefetch_related(
-            'time_slot', 'discipline', 'group', 'teacher'
-        )
+        schedule_query = ScheduleItem.filter(classroom_id=classroom_id)
 
         if day_of_week:
             schedule_query = schedule_query.filter(day_of_week=day_of_week)
 
         schedule_items = await schedule_query.order_by('day_of_week', 'time_slot__number')
+        reference = await REFERENCE_DATA.snapshot()
 
-        schedule_by_day = {}
+        rows_by_day: Dict[str, List[List[Any]]] = {}
         for item in schedule_items:
-            day = item.day_of_week.value
-            if day not in schedule_by_day:
-                schedule_by_day[day] = []
-            schedule_by_day[day].append(item)
+            time_slot = reference.get(TimeSlot, item.time_slot_id)
+            rows_by_day.setdefault(item.day_of_week.value, []).append([
+                time_slot.number,
+                f"{time_slot.start_time}-{time_slot.end_time}",
+                reference.get(Discipline, item.discipline_id).name,
+                reference.get(Group, item.group_id).code,
+                reference.get(Teacher, item.teacher_id).full_name,
+            ])
 
         if len(document.worksheets) == 0:
             worksheet = document.create_sheet("Загруженность аудитории")
         else:
             worksheet = document.worksheets[0]
 
-        for row in range(1, worksheet.max_row + 1):
-            for col in range(1, worksheet.max_column + 1):
-                worksheet.cell(row=row, column=col).value = None
-
-        worksheet.cell(row=1, column=1).value = f"Загруженность аудитории: {classroom.name}"
-        worksheet.cell(row=1, column=1).font = Font(bold=True, size=14)
-        worksheet.merge_cells(start_row=1, start_column=1, end_row=1, end_column=5)
-
-        headers = ["День недели", "№ пары", "Время", "Дисциплина", "Группа", "Преподаватель"]
-        for i, header in enumerate(headers):
-            cell = worksheet.cell(row=3, column=i + 1)
-            cell.value = header
-            cell.font = Font(bold=True)
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-
-            worksheet.column_dimensions[openpyxl.utils.get_column_letter(i + 1)].width = 15
-
-        row_index = 4
-
-        if schedule_items:
-            for day, items in schedule_by_day.items():
+        self.write_schedule_sheet(
+            worksheet,
+            f"Загруженность аудитории: {classroom.name}",
+            ["День недели", "№ пары", "Время", "Дисциплина", "Группа", "Преподаватель"],
+            rows_by_day,
+            "В аудитории нет занятий в расписании."
+        )
 
-                worksheet.cell(row=row_index, column=1).value = day
-                worksheet.cell(row=row_index, column=1).font = Font(bold=True)
+        return document
 
-                for item in items:
-                    worksheet.cell(row=row_index, column=2).value = item.time_slot.number
-                    worksheet.cell(row=row_index,
-                                   column=3).value = f"{item.time_slot.start_time}-{item.time_slot.end_time}"
-                    worksheet.cell(row=row_index, column=4).value = item.discipline.name
-                    worksheet.cell(row=row_index, column=5).value = item.group.code
-                    worksheet.cell(row=row_index, column=6).value = item.teacher.full_name
+    def write_schedule_sheet(self, worksheet: openpyxl.worksheet.worksheet.Worksheet, title: str,
+                             headers: List[str], rows_by_day: Dict[str, List[List[Any]]],
+                             empty_message: str) -> None:
+        """
+        Записывает расписание на лист: заголовок, шапку и занятия по дням недели
 
-                    for col in range(1, 7):
-                        worksheet.cell(row=row_index, column=col).alignment = Alignment(horizontal='center',
-                                                                                        vertical='center')
+        Прежнее содержимое листа удаляется.
 
-                    row_index += 1
+        Args:
+            worksheet: Лист Excel
+            title: Заголовок листа
+            headers: Названия столбцов
+            rows_by_day: Строки занятий (без столбца дня недели) по дням недели
+            empty_message: Текст на случай, если занятий нет
+        """
+        writer = SheetWriter(worksheet)
+        writer.reset()
 
-                row_index += 1
-        else:
+        writer.merge_row(writer.append([title], STYLE_TITLE), 5)
+        writer.skip()
+        writer.append(headers, STYLE_HEADER)
+        for i in range(len(headers)):
+            worksheet.column_dimensions[openpyxl.utils.get_column_letter(i + 1)].width = 15
 
-            worksheet.cell(row=4, column=1).value = "В аудитории нет занятий в расписании."
-            worksheet.merge_cells(start_row=4, start_column=1, end_row=4, end_column=6)
+        if not rows_by_day:
+            writer.merge_row(writer.append([empty_message]), len(headers))
+            return
 
-        return document
+        # День недели выделен и указывается в первой строке дня, дни разделены пустой строкой
+        row_style = [STYLE_HEADER] + [STYLE_CELL] * (len(headers) - 1)
+        for day, rows in rows_by_day.items():
+            writer.append_rows(([day if i == 0 else None] + row for i, row in enumerate(rows)), row_style)
+            writer.skip()
 
     async def process_document(self, document: openpyxl.Workbook, params: Dict[str, Any]) -> openpyxl.Workbook:
         """
@@ -443,38 +540,32 @@ class XlsxService(BaseDocumentService):
             Обработанный документ Excel
         """
         self.replacements = {}
+        self.journal_sheets = []
 
         template_id = params.get('template_id')
         group_id = params.get('group_id')
         student_id = params.get('student_id')
         teacher_id = params.get('teacher_id')
         discipline_id = params.get('discipline_id')
-        start_date_str = params.get('start_date')
+        start_date = params.get('start_date')
         day_of_week = params.get('day_of_week')
         classroom_id = params.get('classroom_id')
 
-        start_date = None
-        if start_date_str:
+        # Эндпоинты передают datetime, строка допускается для обратной совместимости
+        if isinstance(start_date, str):
             try:
-                start_date = datetime.strptime(start_date_str, "%Y-%m-%d")
-            except (ValueError, TypeError):
+                start_date = datetime.strptime(start_date, "%Y-%m-%d")
+            except ValueError:
                 start_date = datetime.now()
 
         template = await self.get_template(template_id)
 
-        is_journal = False
-        is_student_list = False
-        is_teacher_schedule = False
-        is_classroom_schedule = False
+        template_type = self.determine_template_type(template.name)
 
-        if 'журнал' in template.name.lower() or 'journal' in template.name.lower():
-            is_journal = True
-        elif 'список' in template.name.lower() or 'list' in template.name.lower() or 'студент' in template.name.lower():
-            is_student_list = True
-        elif 'расписание_преподавателя' in template.name.lower() or 'teacher_schedule' in template.name.lower():
-            is_teacher_schedule = True
-        elif 'загруженность_аудитории' in template.name.lower() or 'classroom_schedule' in template.name.lower():
-            is_classroom_schedule = True
+        is_journal = template_type == self.TEMPLATE_TYPE_JOURNAL
+        is_student_list = template_type == self.TEMPLATE_TYPE_STUDENT_LIST
+        is_teacher_schedule = template_type == self.TEMPLATE_TYPE_TEACHER_SCHEDULE
+        is_classroom_schedule = template_type == self.TEMPLATE_TYPE_CLASSROOM_SCHEDULE
 
         if not is_journal and not is_student_list and not is_teacher_schedule and not is_classroom_schedule:
 
@@ -491,7 +582,7 @@ class XlsxService(BaseDocumentService):
                             break
 
         if group_id:
-            group = await Group.get(id=group_id).prefetch_related('students')
+            group = await REFERENCE_DATA.get(Group, group_id)
             self.replacements.update({
                 "group": group.code,
                 "course": group.course,
@@ -499,7 +590,8 @@ class XlsxService(BaseDocumentService):
             })
 
         if student_id:
-            student = await Student.get(id=student_id).prefetch_related('group')
+            student = await Student.get(id=student_id)
+            student_group = await REFERENCE_DATA.get_or_none(Group, student.group_id)
             self.replacements.update({
                 "student_name": student.full_name,
                 "student_email": student.email,
@@ -507,14 +599,14 @@ class XlsxService(BaseDocumentService):
                 "M": student.full_name
             })
 
-            if student.group:
+            if student_group:
                 self.replacements.update({
-                    "group": student.group.code,
-                    "S": student.group.code,
+                    "group": student_group.code,
+                    "S": student_group.code,
                 })
 
         if teacher_id:
-            teacher = await Teacher.get(id=teacher_id)
+            teacher = await REFERENCE_DATA.get(Teacher, teacher_id)
             self.replacements.update({
                 "teacher_name": teacher.full_name,
                 "teacher_email": teacher.email,
@@ -523,7 +615,7 @@ class XlsxService(BaseDocumentService):
             })
 
         if discipline_id:
-            discipline = await Discipline.get(id=discipline_id)
+            discipline = await REFERENCE_DATA.get(Discipline, discipline_id)
             self.replacements.update({
                 "discipline": discipline.name,
                 "N": discipline.name,
@@ -537,12 +629,20 @@ class XlsxService(BaseDocumentService):
             document = await self.process_classroom_schedule_xlsx(document, classroom_id, day_of_week)
         else:
 
+            if is_journal and group_id and discipline_id:
+                # Версии снимаются до чтения данных: изменения во время генерации сделают журнал неактуальным
+                self.journal_versions = journal_versions()
+                self.journal_template_hash = OutputCache.template_hash(template.file_path)
+
             for sheet_name in document.sheetnames:
                 worksheet = document[sheet_name]
 
                 if is_journal and group_id and discipline_id:
 
-                    await self.fill_grades_journal(worksheet, group_id, discipline_id, start_date)
+                    sheet, self.journal_matrix = await self.fill_grades_journal(
+                        worksheet, group_id, discipline_id, start_date
+                    )
+                    self.journal_sheets.append(sheet)
                 elif is_student_list and group_id:
 
                     await self.fill_student_list(worksheet, group_id)
@@ -0,0 +1,96 @@
+"""
+Потоковая сборка zip-архива.
+
+Документы добавляются в архив по мере готовности, а записанные байты сразу
+передаются потребителю (клиенту через StreamingResponse или в файл). В памяти
+одновременно находятся только документы, ожидающие в очереди, и текущий
+фрагмент архива.
+"""
+import asyncio
+import io
+import zipfile
+from typing import AsyncIterable, AsyncIterator, Tuple
+from urllib.parse import quote
+
+ZIP_MEDIA_TYPE = "application/zip"
+
+_DONE = object()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Несмещаемый приемник, накапливающий байты архива до передачи потребителю"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+async def stream_zip(entries: AsyncIterable[Tuple[str, bytes]], prefetch: int = 2) -> AsyncIterator[bytes]:
+    """
+    Собирает zip-архив из асинхронного потока документов
+
+    Документы генерируются в отдельной задаче с опережением не более чем
+    на prefetch штук, поэтому следующий документ рендерится, пока предыдущий
+    передается клиенту. Файлы docx/xlsx уже сжаты и хранятся без сжатия.
+
+    Args:
+        entries: Асинхронный итератор пар (имя файла в архиве, содержимое)
+        prefetch: Максимальное количество готовых документов в очереди
+
+    Yields:
+        Фрагменты zip-архива
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=prefetch)
+
+    async def produce() -> None:
+        try:
+            async for entry in entries:
+                await queue.put(entry)
+        except Exception as e:
+            await queue.put(e)
+            return
+        await queue.put(_DONE)
+
+    producer = asyncio.create_task(produce())
+    sink = _ChunkSink()
+    archive = zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED)
+
+    try:
+        while True:
+            item = await queue.get()
+            if item is _DONE:
+                break
+            if isinstance(item, Exception):
+                raise item
+
+            name, content = item
+            archive.writestr(name, content)
+            yield sink.drain()
+
+        # Центральный каталог архива
+        archive.close()
+        yield sink.drain()
+    finally:
+        producer.cancel()
+
+
+def content_disposition(filename: str) -> str:
+    """Заголовок Content-Disposition для скачивания файла с произвольным (в т.ч. кириллическим) именем"""
+    return f"attachment; filename*=utf-8''{quote(filename)}"